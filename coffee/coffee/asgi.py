@@ -3,6 +3,11 @@ ASGI config for coffee project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Стрим статусов заказов (orders/events/) — асинхронный SSE-view, поэтому
+в проде приложение нужно поднимать через ASGI (uvicorn/daphne), а не WSGI:
+тогда тысячи открытых соединений держатся корутинами одного процесса.
+Стрим включается переменной окружения ORDER_EVENTS_STREAM=1.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -1,18 +1,301 @@
+import atexit
+import secrets
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from main import catalog
+from main.models import SavedCart
+
+
+# Владелец корзины: клиент или гость с токеном в cookie. Ключи владельца
+# нужны кэш-хранилищу и броням остатков (main/reservations.py).
+OWNER_COOKIE = 'cart_token'
+
+
+def guest_token(request, create=False):
+    token = getattr(request, '_cart_owner', None) or request.COOKIES.get(OWNER_COOKIE)
+    if not token and create:
+        # Новый токен запишет в ответ CartMiddleware
+        token = request._cart_owner = secrets.token_urlsafe(16)
+    return token
+
+
+def owner_keys(request):
+    """Ключи владельца корзины: клиент и (если есть) гостевой токен."""
+    keys = []
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        keys.append(f"user:{user.pk}")
+    token = guest_token(request, create=not keys)
+    if token:
+        keys.append(f"guest:{token}")
+    return keys
+
+
+def merge(data, other):
+    """Корзины складываются: одинаковые позиции — суммой количеств."""
+    merged = dict(data)
+    for item_id, quantity in other.items():
+        merged[item_id] = merged.get(item_id, 0) + quantity
+    return merged
+
+
+# Хранилища корзины. Выбирается настройкой CART_STORAGE (путь к классу).
+# Хранилище отдаёт и принимает компактный словарь {id позиции: количество};
+# если ему нужно что-то записать в ответ (cookie), это делает
+# main.middleware.CartMiddleware через process_response(). При входе
+# merge_guest() переносит гостевую корзину в корзину клиента, если они
+# хранятся раздельно.
+
+class SessionCartStorage:
+    """Корзина в сессии: каждое изменение — запись сессии (в БД при db-бэкенде)."""
+
+    def load(self, request):
+        return request.session.get('cart') or {}
+
+    def save(self, request, data):
+        request.session['cart'] = data
+        request.session.modified = True
+
+    def clear(self, request):
+        if 'cart' in request.session:
+            del request.session['cart']
+
+    def process_response(self, request, response):
+        return response
+
+    def merge_guest(self, request, user):
+        # login() сохраняет данные сессии гостя — корзина уже у клиента
+        pass
+
+
+class SignedCookieCartStorage:
+    """Корзина целиком в подписанной cookie: ни сессии, ни БД. Для небольших корзин."""
+    cookie_name = 'cart'
+    salt = 'coffee.cart'
+
+    def max_age(self):
+        return getattr(settings, 'CART_COOKIE_AGE', 60 * 60 * 24 * 30)
+
+    def load(self, request):
+        # Изменения за этот запрос ещё не в cookie — берём их
+        if hasattr(request, '_cart_data'):
+            return request._cart_data
+        value = request.COOKIES.get(self.cookie_name)
+        if not value:
+            return {}
+        try:
+            return signing.loads(value, salt=self.salt, max_age=self.max_age())
+        except signing.BadSignature:
+            return {}
+
+    def save(self, request, data):
+        request._cart_data = dict(data)
+
+    def clear(self, request):
+        request._cart_data = {}
+
+    def merge_guest(self, request, user):
+        # Одна cookie и у гостя, и у клиента
+        pass
+
+    def process_response(self, request, response):
+        if not hasattr(request, '_cart_data'):
+            return response
+        if request._cart_data:
+            response.set_cookie(
+                self.cookie_name,
+                signing.dumps(request._cart_data, salt=self.salt, compress=True),
+                max_age=self.max_age(),
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        else:
+            response.delete_cookie(self.cookie_name, samesite='Lax')
+        return response
+
+
+class CacheCartStorage:
+    """
+    Корзина в кэше. Корзины клиентов раз в CART_WRITE_BEHIND_INTERVAL секунд
+    одной пачкой сбрасываются в SavedCart (write-behind) — оттуда корзина
+    поднимается, если кэш её потерял. Корзина гостя живёт по его токену
+    только в кэше.
+
+    Кэш здесь — единственное актуальное место корзины, поэтому он должен быть
+    общим для всех процессов (Redis, Memcached): с LocMemCache каждый воркер
+    видел бы свою корзину. Это проверяет системная проверка main.E001.
+    """
+
+    def __init__(self):
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def timeout(self):
+        return getattr(settings, 'CART_CACHE_TIMEOUT', 60 * 60 * 24 * 7)
+
+    def _key(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"cart:user:{user.pk}"
+        return f"cart:anon:{guest_token(request, create=True)}"
+
+    def load(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return self._load_user(user.pk)
+        return cache.get(self._key(request)) or {}
+
+    def _load_user(self, user_id):
+        key = f"cart:user:{user_id}"
+        data = cache.get(key)
+        if data is None:
+            saved = SavedCart.objects.filter(user_id=user_id).values_list('items', flat=True).first()
+            data = saved or {}
+            cache.set(key, data, self.timeout())
+        return data
+
+    def save(self, request, data):
+        cache.set(self._key(request), data, self.timeout())
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            self._mark_dirty(user.pk, data)
+
+    def merge_guest(self, request, user):
+        """Гостевая корзина (cart:anon:<токен>) при входе добавляется к корзине клиента."""
+        token = guest_token(request)
+        if not token:
+            return
+        guest_key = f"cart:anon:{token}"
+        guest = cache.get(guest_key)
+        if not guest:
+            return
+        data = merge(self._load_user(user.pk), guest)
+        cache.set(f"cart:user:{user.pk}", data, self.timeout())
+        cache.delete(guest_key)
+        self._mark_dirty(user.pk, data)
+
+    def clear(self, request):
+        self.save(request, {})
+
+    def process_response(self, request, response):
+        return response
+
+    def _mark_dirty(self, user_id, data):
+        with self._lock:
+            self._dirty[user_id] = dict(data)
+            if self._timer is None:
+                self._timer = threading.Timer(getattr(settings, 'CART_WRITE_BEHIND_INTERVAL', 30), self._flush_in_thread)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_in_thread(self):
+        # Из потока таймера: вне запроса никто не закроет его соединение
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        """Сбрасывает накопленные корзины в БД одним upsert'ом."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._timer = None
+        if not dirty:
+            return
+        # Пишем то, что сейчас в общем кэше, а не копию этого процесса: корзину
+        # могли поменять запросы в других воркерах, и старая копия затёрла бы её
+        keys = {user_id: f"cart:user:{user_id}" for user_id in dirty}
+        current = cache.get_many(keys.values())
+        SavedCart.objects.bulk_create(
+            [
+                SavedCart(user_id=user_id, items=current.get(keys[user_id], items))
+                for user_id, items in dirty.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['items', 'updated_at'],
+        )
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = import_string(getattr(settings, 'CART_STORAGE', 'coffee.cart.SessionCartStorage'))()
+    return _storage
+
+
+@receiver(setting_changed)
+def reset_storage(setting, **kwargs):
+    # override_settings(CART_STORAGE=...) в тестах
+    global _storage
+    if setting == 'CART_STORAGE':
+        _storage = None
+
 
-from main.models import MenuItem
 class Cart:
+    """
+    Корзина хранится компактно: {id позиции: количество}, а где — решает
+    хранилище из CART_STORAGE (сессия, подписанная cookie или кэш).
+    Позиции из каталога подтягиваются один раз на объект корзины
+    (то есть на запрос) — и строки, и общий итог считаются за один проход.
+    """
+
     def __init__(self, request):
-        self.session = request.session
-        cart = self.session.get('cart')
-        if not cart:
-            cart = self.session['cart'] = {}
-        self.cart = cart
+        self.request = request
+        self.storage = get_storage()
+        self.cart = {
+            str(item_id): self._quantity(data)
+            for item_id, data in self.storage.load(request).items()
+        }
+        self._lines = None
+        self._total = 0
+        self._adopt_session_cart()
+
+    def _adopt_session_cart(self):
+        # Корзина, собранная ещё в сессии (до CART_STORAGE): при первом
+        # обращении переносим её в текущее хранилище и убираем из сессии
+        if isinstance(self.storage, SessionCartStorage):
+            return
+        session = getattr(self.request, 'session', None)
+        legacy = session.pop('cart', None) if session is not None else None
+        if legacy:
+            self.cart = merge(self.cart, {
+                str(item_id): self._quantity(data) for item_id, data in legacy.items()
+            })
+            self.save()
+
+    @staticmethod
+    def _quantity(data):
+        # Старый формат сессии: {'quantity': n}
+        if isinstance(data, dict):
+            return data.get('quantity', 0)
+        return data
 
     def add(self, item_id, quantity=1):
         item_id = str(item_id)
-        if item_id not in self.cart:
-            self.cart[item_id] = {'quantity': 0}
-        self.cart[item_id]['quantity'] += quantity
+        self.cart[item_id] = self.cart.get(item_id, 0) + quantity
+        self.save()
+
+    def set(self, item_id, quantity):
+        """Задаёт количество позиции; 0 — убрать из корзины."""
+        item_id = str(item_id)
+        if quantity > 0:
+            self.cart[item_id] = quantity
+        else:
+            self.cart.pop(item_id, None)
         self.save()
 
     def remove(self, item_id):
@@ -24,43 +307,59 @@ class Cart:
     def decrement(self, item_id):
         item_id = str(item_id)
         if item_id in self.cart:
-            self.cart[item_id]['quantity'] = max(1, self.cart[item_id]['quantity'] - 1)
+            self.cart[item_id] = max(1, self.cart[item_id] - 1)
             self.save()
 
     def increment(self, item_id):
         item_id = str(item_id)
         if item_id in self.cart:
-            self.cart[item_id]['quantity'] += 1
+            self.cart[item_id] += 1
             self.save()
 
+    @property
+    def owners(self):
+        """Ключи, под которыми корзина держит брони остатков."""
+        return owner_keys(self.request)
+
+    def get_quantity(self, item_id):
+        return self.cart.get(str(item_id), 0)
+
     def save(self):
-        self.session.modified = True
+        self.storage.save(self.request, self.cart)
+        self._lines = None
+
+    def _resolve(self):
+        items = catalog.get_items(self.cart.keys())
+        lines = []
+        total = 0
+        for item_id, quantity in self.cart.items():
+            item = items.get(int(item_id))
+            if item is None or quantity <= 0:
+                continue
+            total_price = item.price * quantity
+            lines.append({'item': item, 'quantity': quantity, 'total_price': total_price})
+            total += total_price
+        self._lines = lines
+        self._total = total
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._resolve()
+        return self._lines
 
     def __iter__(self):
-        item_ids = self.cart.keys()
-        items = MenuItem.objects.filter(id__in=item_ids, in_stock=True)
-        cart = self.cart.copy()
-        
-        for item in items:
-            item_id_str = str(item.id)
-            if item_id_str in cart:
-                quantity = cart[item_id_str]['quantity']
-                cart[item_id_str]['item'] = item
-                cart[item_id_str]['total_price'] = item.price * quantity  
-        
-        for data in cart.values():
-            if 'item' in data and data.get('quantity', 0) > 0:
-                yield data
+        return iter(self.lines)
 
     def __len__(self):
-        return sum(item['quantity'] for item in self.cart.values())
+        return sum(self.cart.values())
 
     def get_total_price(self):
-        return sum(
-            item['quantity'] * item['item'].price
-            for item in self
-        )
+        if self._lines is None:
+            self._resolve()
+        return self._total
 
     def clear(self):
-        del self.session['cart']
-        self.save()
\ No newline at end of file
+        self.storage.clear(self.request)
+        self.cart = {}
+        self._lines = None
@@ -0,0 +1,88 @@
+import contextvars
+from contextlib import contextmanager
+from fnmatch import fnmatch
+
+from django.conf import settings
+from django.db import connections
+
+# Маршрутизация запросов к БД: запись — всегда в основную базу (default),
+# чтение — в реплику (DATABASE_READ_ALIAS), но только внутри запросов к
+# «читающим» страницам (REPLICA_VIEWS) и только если клиент недавно сам
+# ничего не писал. Решение на запрос принимает
+# main.middleware.DatabaseRoutingMiddleware; здесь — сам роутер и его состояние.
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_wrote = contextvars.ContextVar('wrote', default=None)
+
+# Сессии читаются только из основной базы (свежая сессия ещё не доехала бы
+# до реплики), а их запись не считается изменением данных клиентом
+PRIMARY_ONLY = {'sessions'}
+
+
+def read_alias():
+    """Псевдоним реплики или None, если реплика не настроена."""
+    alias = getattr(settings, 'DATABASE_READ_ALIAS', None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def is_replica_view(view_name):
+    return any(fnmatch(view_name or '', pattern) for pattern in getattr(settings, 'REPLICA_VIEWS', ()))
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Разрешает (или запрещает) чтение из реплики внутри блока."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def allow_replica_reads():
+    """До конца текущего блока replica_reads() читать из реплики (для middleware)."""
+    _replica_reads.set(True)
+
+
+def primary():
+    """
+    Чтение только из основной базы внутри блока — для всего, что кладётся
+    в кэш под свежей версией: отставшая реплика не должна туда попасть.
+    """
+    return replica_reads(False)
+
+
+@contextmanager
+def track_writes():
+    """Внутри блока запоминает, была ли запись от имени клиента; отдаёт список-флаг."""
+    flag = []
+    token = _wrote.set(flag)
+    try:
+        yield flag
+    finally:
+        _wrote.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = read_alias()
+        if alias is None or not _replica_reads.get() or model._meta.app_label in PRIMARY_ONLY:
+            return 'default'
+        # Внутри транзакции на основной базе читаем то, что в ней же и пишем
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return alias
+
+    def db_for_write(self, model, **hints):
+        flag = _wrote.get()
+        if flag is not None and not flag and model._meta.app_label not in PRIMARY_ONLY:
+            flag.append(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной базы: объекты из обеих связываются свободно
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему на реплику приносит репликация, мигрируем только основную
+        return db == 'default'
@@ -47,10 +47,13 @@ SILENCED_SYSTEM_CHECKS = ["security.W019"]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.PerformanceMiddleware',  # до SessionMiddleware: сохранение сессии входит в замер
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.middleware.CartMiddleware',
+    'main.middleware.DatabaseRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,24 +70,182 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.context_processors.order_events',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'coffee.wsgi.application'
+ASGI_APPLICATION = 'coffee.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Боевой профиль SQLite (DB_SQLITE_TUNED=0 — стоковые настройки):
+#   WAL — читатели не ждут писателя и наоборот. Режим хранится в файле базы,
+#   его один раз включает миграция main/0020_sqlite_wal (при DB_SQLITE_TUNED=1);
+#   synchronous=NORMAL в WAL не теряет целостность, только последние
+#   транзакции при сбое питания;
+#   busy_timeout — ждать блокировку, а не сразу падать «database is locked»;
+#   BEGIN IMMEDIATE — транзакция берёт блокировку записи сразу: иначе
+#   читающая транзакция, решившая писать, получает SQLITE_BUSY без ожидания.
+SQLITE_TUNED = os.environ.get('DB_SQLITE_TUNED', '1') == '1'
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('DB_SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+
+_SQLITE_PRAGMAS = [
+    f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}',
+    'PRAGMA mmap_size=268435456',   # 256 МБ
+    'PRAGMA cache_size=-32000',     # 32 МБ (отрицательное — в КиБ)
+    'PRAGMA temp_store=MEMORY',
+]
+SQLITE_OPTIONS = {
+    'init_command': '; '.join(['PRAGMA synchronous=NORMAL'] + _SQLITE_PRAGMAS),
+    'transaction_mode': 'IMMEDIATE',
+}
+# Режим журнала хранится в самом файле — реплика на чтение его не меняет
+SQLITE_REPLICA_OPTIONS = {'init_command': '; '.join(_SQLITE_PRAGMAS)}
+
+
+# Основная база и (необязательная) реплика для чтения задаются окружением:
+# DB_* и DB_REPLICA_* (ENGINE, NAME, USER, PASSWORD, HOST, PORT, CONN_MAX_AGE, POOL).
+# CONN_MAX_AGE — сколько секунд держать соединение между запросами;
+# POOL=1 включает пул соединений psycopg (только PostgreSQL, CONN_MAX_AGE тогда 0).
+# Локально реплику можно изобразить второй SQLite-базой или той же, открытой
+# только на чтение: DB_REPLICA_NAME='file:db.sqlite3?mode=ro'.
+def _database(prefix, name=None):
+    def env(key, default=None):
+        return os.environ.get(f'{prefix}_{key}', default)
+
+    config = {
+        'ENGINE': env('ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': env('NAME', name),
+        'CONN_MAX_AGE': int(env('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        if SQLITE_TUNED:
+            config['OPTIONS'] = SQLITE_OPTIONS if prefix == 'DB' else SQLITE_REPLICA_OPTIONS
+    else:
+        config.update({key: env(key, '') for key in ('USER', 'PASSWORD', 'HOST', 'PORT')})
+        if env('POOL') == '1':
+            config.update({'CONN_MAX_AGE': 0, 'OPTIONS': {'pool': True}})
+    return config
+
+
 DATABASES = {
+    'default': _database('DB', BASE_DIR / 'db.sqlite3'),
+}
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {**_database('DB_REPLICA'), 'TEST': {'MIRROR': 'default'}}
+
+# Запись — всегда в default; чтение страниц из REPLICA_VIEWS — из реплики
+# (coffee/db_router.py), кроме клиентов, которые писали последние
+# REPLICA_STICKY_SECONDS секунд (read-your-writes).
+DATABASE_ROUTERS = ['coffee.db_router.PrimaryReplicaRouter']
+DATABASE_READ_ALIAS = 'replica'
+REPLICA_VIEWS = [
+    'menu', 'menu_detail', 'menu_suggest',
+    'profile', 'my_orders', 'orders_more',
+    'api_categories', 'api_menu', 'api_menu_item',
+    'sales_dashboard',
+    'admin:*_changelist',
+]
+REPLICA_STICKY_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# LocMemCache живёт внутри одного процесса. Для снимков каталога и фрагментов
+# это безопасно: данные лежат под ключами с версией, а версии — в БД
+# (main/versions.py), общие для всех веб-воркеров, run_tasks и команд импорта.
+# Данные, которые есть только в кэше (корзины CacheCartStorage), так хранить
+# нельзя — для них нужен общий кэш (Redis, Memcached); см. проверку main.E001.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'coffee',
+        # По умолчанию 300 ключей: фрагменты меню из сотен позиций вытесняли бы друг друга
+        'OPTIONS': {'MAX_ENTRIES': 20000},
     }
 }
 
+# Как часто (сек) процесс сверяет версии кэша с БД: столько максимум
+# он может отдавать снимок, устаревший из-за изменения в другом процессе
+CACHE_VERSION_CHECK_INTERVAL = 1.0
+# Снимки каталога инвалидируются по версии, таймаут — лишь страховка
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+# HTML карточек и страниц позиций (main/fragments.py) — тоже по версии позиции
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Где живёт корзина (coffee/cart.py):
+#   SessionCartStorage      — в сессии, каждое изменение пишет django_session;
+#   SignedCookieCartStorage — в подписанной cookie, без записи на сервере;
+#   CacheCartStorage        — в кэше, корзины клиентов сбрасываются в SavedCart
+#                             раз в CART_WRITE_BEHIND_INTERVAL секунд. Только с
+#                             общим кэшем (Redis, Memcached), не с LocMemCache.
+# Просроченные сессии чистит команда purge_sessions (по cron).
+CART_STORAGE = 'coffee.cart.SignedCookieCartStorage'
+CART_COOKIE_AGE = 60 * 60 * 24 * 30
+CART_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+CART_WRITE_BEHIND_INTERVAL = 30
+
+# Сколько секунд корзина держит бронь остатков после последнего изменения
+# (main/reservations.py). Истёкшие брони снимает команда sweep_reservations
+# (по cron, раз в минуту-пять).
+CART_RESERVATION_TTL = 15 * 60
+
+# Подтверждение заказа (main/checkout.py): 'recent' — пароль, только если
+# клиент не входил и не вводил его последние CHECKOUT_REAUTH_WINDOW секунд;
+# 'password' — пароль на каждый заказ; 'none' — без пароля.
+CHECKOUT_CONFIRMATION = 'recent'
+CHECKOUT_REAUTH_WINDOW = 15 * 60
+
+# SSE-стрим заказов (main/views.order_events) работает только под ASGI
+# (uvicorn/daphne, coffee.asgi): под WSGI/runserver бесконечный ответ держит
+# поток воркера. Включать ORDER_EVENTS_STREAM=1 только при запуске через ASGI,
+# иначе страницы не подписываются на стрим.
+ORDER_EVENTS_STREAM = os.environ.get('ORDER_EVENTS_STREAM', '0') == '1'
+
+# Как часто (сек) лента заказов опрашивает БД для SSE-подписчиков
+ORDER_EVENTS_POLL_INTERVAL = 1.0
+
+
+# Почта. Письма отправляет только воркер фоновых задач (manage.py run_tasks),
+# одним SMTP-соединением на пачку. По умолчанию письма пишутся в файлы
+# EMAIL_FILE_PATH; для проверки через SMTP — локальная заглушка, например
+# `python -m aiosmtpd -n -l localhost:1025` и EMAIL_BACKEND=...smtp.EmailBackend.
+
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails'))
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 1025))
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = 'НЕ ФИЛЬТР <noreply@nefiltr.local>'
+
+
+# Замеры запросов (main.middleware.PerformanceMiddleware)
+
+PERF_SERVER_TIMING = True  # заголовок Server-Timing в ответе
+# JSON-строка на запрос в лог main.perf — включается окружением (PERF_LOG=1):
+# по умолчанию не засоряет ни runserver, ни вывод manage.py test
+PERF_LOG = os.environ.get('PERF_LOG', '0') == '1'
+PERF_WINDOW = 500          # сколько последних запросов на view держать для admin/performance/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'main.perf': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -0,0 +1,17 @@
+// Кнопки «Добавить» — формы POST в карточках и на странице позиции. Эти
+// куски HTML берутся из общего для всех кэша фрагментов (main/fragments.py),
+// поэтому токена CSRF в них нет: он подставляется из cookie при отправке.
+document.addEventListener('submit', (event) => {
+    const form = event.target;
+    if (!form.matches('form[data-cart-add]')) return;
+
+    const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+    let input = form.querySelector('input[name="csrfmiddlewaretoken"]');
+    if (!input) {
+        input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = 'csrfmiddlewaretoken';
+        form.append(input);
+    }
+    input.value = match ? decodeURIComponent(match[1]) : '';
+});
@@ -0,0 +1,49 @@
+// Подсказки в поиске по меню: запрос на каждый ввод с задержкой,
+// устаревшие ответы отбрасываются.
+(function () {
+    const input = document.getElementById('menu-search');
+    const box = document.getElementById('menu-suggest');
+    if (!input || !box) return;
+
+    let timer = null;
+    let controller = null;
+
+    function hide() {
+        box.classList.add('d-none');
+        box.innerHTML = '';
+    }
+
+    async function suggest() {
+        const q = input.value.trim();
+        if (q.length < 2) return hide();
+
+        if (controller) controller.abort();
+        controller = new AbortController();
+        try {
+            const res = await fetch(input.dataset.suggestUrl + '?' + new URLSearchParams({ q }), { signal: controller.signal });
+            const { results } = await res.json();
+            box.innerHTML = '';
+            results.forEach((item) => {
+                const link = document.createElement('a');
+                link.href = item.url;
+                link.className = 'list-group-item list-group-item-action d-flex justify-content-between';
+                link.textContent = item.name;
+                const price = document.createElement('span');
+                price.className = 'text-muted';
+                price.textContent = `${item.price} ₽`;
+                link.append(price);
+                box.append(link);
+            });
+            box.classList.toggle('d-none', results.length === 0);
+        } catch (e) {
+            if (e.name !== 'AbortError') hide();
+        }
+    }
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(suggest, 150);
+    });
+    input.addEventListener('keydown', (e) => { if (e.key === 'Escape') hide(); });
+    document.addEventListener('click', (e) => { if (!box.contains(e.target) && e.target !== input) hide(); });
+})();
@@ -0,0 +1,36 @@
+// Живые статусы заказов: одно SSE-соединение на страницу.
+// Бейджи ищутся по .order-status[data-order-id], цвета — как в шаблонах.
+const ORDER_STATUS_STYLES = {
+    new: ['#FFD700', '#333'],
+    pending: ['#87CEFA', '#333'],
+    ready: ['#90EE90', '#333'],
+    completed: ['#32CD32', 'white'],
+    cancelled: ['#FF6347', 'white'],
+};
+
+function subscribeOrderEvents(url, onEvent) {
+    const source = new EventSource(url);
+    source.addEventListener('order', (e) => onEvent(JSON.parse(e.data)));
+    return source;
+}
+
+function applyOrderStatus(event) {
+    document.querySelectorAll(`.order-status[data-order-id="${event.id}"]`).forEach((badge) => {
+        const [background, color] = ORDER_STATUS_STYLES[event.status] || ['#eee', '#333'];
+        badge.textContent = event.status_display;
+        badge.style.background = background;
+        badge.style.color = color;
+
+        // Удалять можно только новые заказы
+        if (event.status !== 'new') {
+            document.querySelectorAll(`.delete-form[data-order-id="${event.id}"]`).forEach((f) => f.remove());
+        }
+        if (event.status === 'cancelled' && event.cancellation_reason) {
+            const reason = document.createElement('div');
+            reason.className = 'alert alert-warning mt-2';
+            reason.innerHTML = '<strong>Причина отмены:</strong> ';
+            reason.append(event.cancellation_reason);
+            badge.parentElement.append(reason);
+        }
+    });
+}
@@ -17,13 +17,17 @@ Including another URLconf
 from django.contrib import admin
 from django.contrib.auth.views import LoginView, LogoutView
 from django.urls import path
-from main import views
+from main import api, views
 from main.views import CustomLoginView
 urlpatterns = [
+    path('admin/performance/', views.performance_dashboard, name='performance_dashboard'),
+    path('admin/sales/', views.sales_dashboard, name='sales_dashboard'),
+    path('admin/orders/export/', views.orders_export, name='orders_export'),
     path('admin/', admin.site.urls),
     path('', views.home, name='home'), 
     path('menu/', views.menu, name='menu'),
     path('menu/<int:item_id>/', views.menu_detail, name='menu_detail'),
+    path('menu/suggest/', views.menu_suggest, name='menu_suggest'),
     path('contacts/', views.contacts, name='contacts'),
     path('register/', views.register_view, name='register'),
     path('login/', CustomLoginView.as_view(), name='login'),
@@ -35,5 +39,18 @@ urlpatterns = [
     path('cart/update/', views.cart_update, name='cart_update'),
     path('order/create/', views.order_create, name='order_create'),
     path('profile/', views.profile, name='profile'),
+    path('orders/more/', views.orders_more, name='orders_more'),
+    path('orders/events/', views.order_events, name='order_events'),
+    path('bar/', views.barista_queue, name='barista_queue'),
+    path('bar/transition/', views.barista_transition, name='barista_transition'),
     path('order/delete/<int:order_id>/', views.delete_order, name='delete_order'),
+
+    # JSON API для киосков и приложения (main/api.py)
+    path('api/v1/me/', api.me, name='api_me'),
+    path('api/v1/categories/', api.categories, name='api_categories'),
+    path('api/v1/menu/', api.menu, name='api_menu'),
+    path('api/v1/menu/<int:item_id>/', api.menu_item, name='api_menu_item'),
+    path('api/v1/cart/', api.cart, name='api_cart'),
+    path('api/v1/orders/', api.orders, name='api_orders'),
+    path('api/v1/orders/<int:order_id>/', api.order, name='api_order'),
 ]
@@ -1,7 +1,16 @@
+import time
+
+from django import forms
 from django.contrib import admin
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
-from django.urls import reverse
+from django.core.exceptions import PermissionDenied
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.urls import path, reverse
+from django.utils import timezone
 from django.utils.html import format_html
 
 #Попытка удалить Theme (без ошибки, если не установлен)
@@ -14,26 +23,37 @@ except:
 admin.site.unregister(Group)
 
 #Импорт моделей
-from .models import CustomUser, MenuItem, Order, OrderItem, Category
+from .models import CustomUser, MenuItem, Order, OrderItem, OrderStatusHistory, Category, Task
+from . import catalog_io, counters, order_status, search
 
 #Заголовок админки 
 admin.site.site_header = "Админка «НЕ ФИЛЬТР»"
 admin.site.site_title = "НЕ ФИЛЬТР"
 admin.site.index_title = "Управление кофейней"
 
+def _save_without_counters(obj, change):
+    # Счётчики меняют F()-обновления (main/counters.py) — объект из формы
+    # со старым значением не должен их перетирать
+    if change:
+        obj.save(update_fields=counters.save_fields(type(obj)))
+    else:
+        obj.save()
+
 #Кастомный пользователь 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'name', 'surname', 'patronymic', 'is_staff', 'date_joined')
+    list_display = ('username', 'email', 'name', 'surname', 'patronymic', 'is_staff', 'order_count', 'total_spent', 'date_joined')
     list_filter = ('is_staff', 'is_active', 'date_joined')
     search_fields = ('username', 'email', 'name', 'surname')
     ordering = ('-date_joined',)
+    readonly_fields = ('order_count', 'total_spent')
     
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
         ('Личные данные', {'fields': ('name', 'surname', 'patronymic', 'email')}),
         ('Права', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Даты', {'fields': ('last_login', 'date_joined')}),
+        ('Заказы', {'fields': ('order_count', 'total_spent')}),
     )
     add_fieldsets = (
         (None, {
@@ -42,24 +62,86 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        _save_without_counters(obj, change)
+
 #Категории 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
+    # item_count — счётчик в самой строке (main/counters.py), ничего не считаем
     list_display = ('name', 'item_count')
     search_fields = ('name',)
-    
-    def item_count(self, obj):
-        return obj.menuitem_set.count()
-    item_count.short_description = "Товаров"
+    readonly_fields = ('item_count',)
+
+    def save_model(self, request, obj, form, change):
+        _save_without_counters(obj, change)
 
 #Меню (товары)
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'price', 'in_stock', 'stock', 'volume_ml', 'calories', 'is_vegan_icon')
+    list_display = ('name', 'category', 'price', 'in_stock', 'stock', 'reserved', 'volume_ml', 'calories', 'is_vegan_icon')
     list_filter = ('category', 'in_stock', 'is_vegan')
     search_fields = ('name', 'description')
     list_editable = ('price', 'in_stock', 'stock')
+    list_select_related = ('category',)
+    readonly_fields = ('reserved',)
     list_per_page = 20
+    actions = ['export_csv']
+    change_list_template = 'admin_menuitem_changelist.html'
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='main_menuitem_import'),
+            path('export/', self.admin_site.admin_view(self.export_view), name='main_menuitem_export'),
+        ] + super().get_urls()
+
+    # Загрузка прайса: пачками через main/catalog_io.py, ошибки — списком
+    def import_view(self, request):
+        if not self.has_change_permission(request) or not self.has_add_permission(request):
+            raise PermissionDenied
+        context = {**self.admin_site.each_context(request), 'title': "Импорт каталога", 'opts': self.model._meta}
+        upload = request.FILES.get('file')
+        if request.method == 'POST' and upload:
+            started = time.perf_counter()
+            result = catalog_io.import_catalog(
+                catalog_io.text_stream(upload.file),
+                request.POST.get('format') or catalog_io.guess_format(upload.name),
+                dry_run=bool(request.POST.get('dry_run')),
+            )
+            context.update(result=result, errors=result.errors[:200], seconds=time.perf_counter() - started)
+        return render(request, 'admin_menu_import.html', context)
+
+    def export_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        fmt = request.GET.get('format', 'csv')
+        return self._export_response(catalog_io.export_rows(), fmt if fmt in catalog_io.FORMATS else 'csv')
+
+    @admin.action(description="Выгрузить выбранные в CSV")
+    def export_csv(self, request, queryset):
+        return self._export_response(catalog_io.export_rows(queryset), 'csv')
+
+    def _export_response(self, rows, fmt):
+        content_type = 'text/csv' if fmt == 'csv' else 'application/json'
+        response = StreamingHttpResponse(catalog_io.export_lines(rows, fmt), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="menu.{fmt}"'
+        return response
+
+    def save_model(self, request, obj, form, change):
+        # reserved меняют корзины условным UPDATE — форма со старым
+        # значением не должна его перетирать
+        if change:
+            obj.save(update_fields=[
+                f.attname for f in MenuItem._meta.concrete_fields if not f.primary_key and f.name != 'reserved'
+            ])
+        else:
+            obj.save()
+
+    # Вместо LIKE '%…%' по каждому полю — полнотекстовый индекс (main/search.py)
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.matching(queryset, search_term), False
 
     @admin.display(description="🌱", boolean=True)
     def is_vegan_icon(self, obj):
@@ -77,19 +159,95 @@ class OrderItemInline(admin.TabularInline):
     total_display.short_description = "Итого"
 
 #Заказы 
+class OrderAdminForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        old = self.instance.status if self.instance.pk else 'new'
+        if not order_status.can_transition(old, status):
+            raise forms.ValidationError(
+                f"Из «{self.instance.get_status_display()}» нельзя перейти в «{dict(Order.STATUS_CHOICES)[status]}»."
+            )
+        return status
+
+
+class OrderStatusHistoryInline(admin.TabularInline):
+    model = OrderStatusHistory
+    extra = 0
+    can_delete = False
+    fields = ('created_at', 'from_status', 'to_status', 'changed_by', 'reason')
+    readonly_fields = fields
+    ordering = ('created_at',)
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'client_fio', 'status_badge', 'item_count', 'total', 'created_at')
+    form = OrderAdminForm
+    list_display = ('id', 'client_fio', 'status_badge', 'line_count', 'unit_count', 'total', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('client__username', 'client__name', 'client__surname')
-    readonly_fields = ('created_at', 'cancellation_reason_display')
-    inlines = [OrderItemInline]
-    
+    readonly_fields = ('created_at', 'line_count', 'unit_count', 'cancellation_reason_display')
+    inlines = [OrderItemInline, OrderStatusHistoryInline]
+    list_select_related = ('client',)
+    # Сортировка совпадает с индексом по created_at — фильтр по дате идёт по нему
+    ordering = ('-created_at', '-id')
+    change_list_template = 'admin_order_changelist.html'
+    # Смена статуса пачкой — один UPDATE (main/order_status.py), без открытия каждого заказа
+    actions = ['mark_pending', 'mark_ready', 'mark_completed', 'cancel']
+
+    def save_model(self, request, obj, form, change):
+        obj._changed_by = request.user  # для журнала статусов (main/signals.py)
+        _save_without_counters(obj, change)
+
+    def _transition(self, request, queryset, status, reason=''):
+        selected = list(queryset.values_list('pk', flat=True))
+        changed = order_status.transition(selected, status, user=request.user, reason=reason)
+        skipped = len(selected) - len(changed)
+        message = f"«{dict(Order.STATUS_CHOICES)[status]}»: {len(changed)}"
+        if skipped:
+            message += f", пропущено (нельзя из текущего статуса): {skipped}"
+        self.message_user(request, message)
+
+    @admin.action(description="В работу")
+    def mark_pending(self, request, queryset):
+        self._transition(request, queryset, 'pending')
+
+    @admin.action(description="Готов")
+    def mark_ready(self, request, queryset):
+        self._transition(request, queryset, 'ready')
+
+    @admin.action(description="Выдан")
+    def mark_completed(self, request, queryset):
+        self._transition(request, queryset, 'completed')
+
+    @admin.action(description="Отменить с причиной")
+    def cancel(self, request, queryset):
+        # Промежуточная страница: одна причина на все выбранные заказы
+        if 'apply' in request.POST:
+            reason = request.POST.get('reason', '').strip()
+            if reason:
+                self._transition(request, queryset, 'cancelled', reason)
+                return None
+            self.message_user(request, "Укажите причину отмены.", level='error')
+        return render(request, 'admin_order_cancel.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Отмена заказов',
+            'opts': self.model._meta,
+            'orders': queryset.select_related('client'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+    @admin.display(description="Клиент", ordering='client__surname')
     def client_fio(self, obj):
         if obj.client:
             return f"{obj.client.surname} {obj.client.name}"
         return "Гость"
-    client_fio.short_description = "Клиент"
 
     def status_badge(self, obj):
         colors = {
@@ -107,10 +265,6 @@ class OrderAdmin(admin.ModelAdmin):
         )
     status_badge.short_description = "Статус"
 
-    def item_count(self, obj):
-        return obj.items.count()
-    item_count.short_description = "Товаров"
-
     def cancellation_reason_display(self, obj):
         if obj.cancellation_reason:
             return format_html(
@@ -121,6 +275,23 @@ class OrderAdmin(admin.ModelAdmin):
         return "-"
     cancellation_reason_display.short_description = "Причина отмены"
 
+# Журнал статусов: только чтение, строки пишет main/order_status.py и сигнал сохранения заказа
+@admin.register(OrderStatusHistory)
+class OrderStatusHistoryAdmin(admin.ModelAdmin):
+    list_display = ('order_id', 'from_status', 'to_status', 'changed_by', 'reason', 'created_at')
+    list_filter = ('to_status', 'created_at')
+    search_fields = ('order__id', 'reason')
+    list_select_related = ('changed_by',)
+    ordering = ('-created_at', '-id')
+    # Удаляются только вместе с заказом (каскад требует права на удаление)
+    actions = None
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # Позиции заказа (отдельно)
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -128,19 +299,47 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_filter = ('order__status',)  # фильтр по статусу заказа
     search_fields = ('order__id', 'menu_item__name')  # поиск по ID заказа или названию товара
     list_per_page = 20
-    
-    #Ссылка на заказ
+    list_select_related = ('menu_item',)
+
+    def get_queryset(self, request):
+        # Сумма строки считается в SQL, чтобы по ней можно было сортировать
+        return super().get_queryset(request).annotate(
+            _total=ExpressionWrapper(
+                F('quantity') * F('price_per_unit'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            )
+        )
+
+    #Ссылка на заказ (хватает order_id, сам заказ не загружаем)
+    @admin.display(description="Заказ", ordering='order_id')
     def order_link(self, obj):
-        url = reverse('admin:main_order_change', args=[obj.order.pk])
-        return format_html('<a href="{}">Заказ #{}<a>', url, obj.order.id)
-    order_link.short_description = "Заказ"
-    
+        url = reverse('admin:main_order_change', args=[obj.order_id])
+        return format_html('<a href="{}">Заказ #{}<a>', url, obj.order_id)
+
     #Название товара (чтобы не было menu_item.object)
+    @admin.display(description="Menu Item", ordering='menu_item__name')
     def menu_item_name(self, obj):
         return obj.menu_item.name if obj.menu_item else "Товар удалён"
-    menu_item_name.short_description = "Menu Item"
-    
+
     #Итого
+    @admin.display(description="Итого", ordering='_total')
     def total(self, obj):
-        return f"{obj.quantity * obj.price_per_unit} ₽"
-    total.short_description = "Итого"
\ No newline at end of file
+        return f"{obj._total} ₽"
+
+
+# Очередь фоновых задач
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_after', 'locked_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'last_error')
+    readonly_fields = ('created_at', 'finished_at', 'locked_by', 'locked_until', 'last_error')
+    ordering = ('-id',)
+    actions = ['retry']
+
+    @admin.action(description="Повторить сейчас")
+    def retry(self, request, queryset):
+        count = queryset.exclude(status='running').update(
+            status='pending', run_after=timezone.now(), attempts=0, finished_at=None,
+        )
+        self.message_user(request, f"Снова в очереди: {count}")
@@ -0,0 +1,304 @@
+"""
+JSON API для киосков и мобильного приложения: /api/v1/…
+
+Ответы собираются из values()/values_list() вручную — без моделей на
+строку и без шаблонов. Списки листаются курсором (id последней позиции
+или подписанный курсор истории заказов), поле ?fields= сужает набор
+полей. GET-ответы несут ETag: меню — от состояния каталога
+(catalog.get_state), поэтому на совпадение 304 отдаётся без запросов
+за позициями; остальное — от тела ответа.
+
+Авторизация — сессия сайта; запросы на запись требуют CSRF-токен
+(cookie csrftoken выставляет GET /api/v1/me/, заголовок X-CSRFToken).
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import parse_etags, quote_etag
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_http_methods
+from django.views.decorators.vary import vary_on_cookie
+
+from coffee.cart import Cart
+
+from . import catalog, checkout, reservations, search
+from .history import decode_cursor, encode_cursor
+from .models import MenuItem, Order, OrderItem
+from .orders import OutOfStock, place_order
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# ?q= отдаёт не больше стольких лучших совпадений (по всем страницам)
+SEARCH_LIMIT = 500
+
+ITEM_FIELDS = ('id', 'name', 'category_id', 'price', 'description', 'volume_ml', 'calories', 'is_vegan')
+ORDER_FIELDS = ('id', 'created_at', 'status', 'total', 'items')
+
+
+# --- Общее ------------------------------------------------------------------
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5(':'.join(str(p) for p in parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def _not_modified(request, etag):
+    """304, если у клиента уже есть ответ с этим ETag."""
+    matches = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in matches or '*' in matches:
+        return HttpResponseNotModified(headers={'ETag': etag})
+    return None
+
+
+def _response(request, payload, etag=None, status=200):
+    """JSON-ответ; для GET — с ETag (по умолчанию от тела) и 304 на совпадение."""
+    body = json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+    if request.method == 'GET' and status == 200:
+        etag = etag or _etag(body)
+        not_modified = _not_modified(request, etag)
+        if not_modified:
+            return not_modified
+    response = HttpResponse(body, status=status, content_type='application/json')
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def _error(message, status=400, **extra):
+    return JsonResponse({'error': message, **extra}, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def _body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _fields(request, allowed):
+    """Поля из ?fields=a,b (только разрешённые, id всегда); без параметра — все."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(allowed)
+    names = {name.strip() for name in requested.split(',')}
+    return ['id'] + [name for name in allowed if name in names and name != 'id']
+
+
+def _limit(request):
+    try:
+        return max(1, min(MAX_PAGE_SIZE, int(request.GET.get('limit', PAGE_SIZE))))
+    except ValueError:
+        return PAGE_SIZE
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _login_required(view):
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error("Нужно войти", status=401)
+        return view(request, *args, **kwargs)
+    wrapper.__name__ = view.__name__
+    return wrapper
+
+
+# --- Каталог ----------------------------------------------------------------
+
+def _catalog_etag(request):
+    state = catalog.get_state()
+    return _etag(state['last_modified'], state['items'], state['categories'], request.get_full_path())
+
+
+@require_GET
+def categories(request):
+    etag = _catalog_etag(request)
+    return _not_modified(request, etag) or _response(
+        request, {'results': [{'id': c.id, 'name': c.name} for c in catalog.get_categories()]}, etag,
+    )
+
+
+@require_GET
+def menu(request):
+    """
+    Позиции в наличии по возрастанию id. ?category=, ?q= (полнотекстовый
+    поиск), ?fields=, ?limit=, ?cursor= (из next прошлой страницы).
+    """
+    # ETag от состояния каталога: на совпадение — 304 без чтения позиций
+    etag = _catalog_etag(request)
+    not_modified = _not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    fields = _fields(request, ITEM_FIELDS)
+    limit = _limit(request)
+    items = MenuItem.objects.filter(in_stock=True).order_by('id')
+    category_id = _int(request.GET.get('category'))
+    if category_id is not None:
+        items = items.filter(category_id=category_id)
+    query = request.GET.get('q', '').strip()
+    if query:
+        items = search.matching(items, query, limit=SEARCH_LIMIT)
+    after = _int(request.GET.get('cursor'))
+    if after is not None:
+        items = items.filter(id__gt=after)
+
+    rows = list(items.values(*fields)[:limit + 1])
+    next_cursor = str(rows[limit - 1]['id']) if len(rows) > limit else None
+    return _response(request, {'results': rows[:limit], 'next': next_cursor}, etag)
+
+
+@require_GET
+def menu_item(request, item_id):
+    row = MenuItem.objects.filter(id=item_id, in_stock=True).values(*_fields(request, ITEM_FIELDS), 'updated_at').first()
+    if row is None:
+        return _error("Позиция не найдена", status=404)
+    changed = row.pop('updated_at')
+    return _response(request, row, etag=_etag(item_id, changed.timestamp(), request.get_full_path()))
+
+
+# --- Корзина ----------------------------------------------------------------
+
+def _cart_payload(cart):
+    return {
+        'items': [
+            {
+                'id': line['item'].id,
+                'name': line['item'].name,
+                'price': line['item'].price,
+                'quantity': line['quantity'],
+                'total': line['total_price'],
+            }
+            for line in cart
+        ],
+        'count': len(cart),
+        'total': cart.get_total_price(),
+    }
+
+
+@require_http_methods(['GET', 'POST', 'DELETE'])
+@vary_on_cookie
+def cart(request):
+    """
+    GET — корзина. POST {"item_id": 5, "quantity": 2} — задать количество
+    (0 — убрать), с бронью остатка. DELETE — очистить корзину.
+    """
+    current = Cart(request)
+    if request.method == 'POST':
+        data = _body(request)
+        item_id = _int(data.get('item_id')) if data else None
+        quantity = _int(data.get('quantity')) if data else None
+        if item_id is None or quantity is None or not 0 <= quantity <= 99:
+            return _error("Ожидается {\"item_id\": число, \"quantity\": 0…99}")
+        if quantity and not catalog.get_items([item_id]):
+            return _error("Позиция не найдена", status=404)
+        if not reservations.reserve(current.owners, item_id, quantity):
+            return _error("Столько нет в наличии", status=409)
+        current.set(item_id, quantity)
+    elif request.method == 'DELETE':
+        reservations.release(current.owners)
+        current.clear()
+    return _response(request, _cart_payload(current))
+
+
+# --- Заказы -----------------------------------------------------------------
+
+def _order_rows(orders, fields):
+    """Словари заказов; позиции — одним запросом на страницу."""
+    lines = {}
+    if 'items' in fields:
+        rows = OrderItem.objects.filter(order_id__in=[o['id'] for o in orders]).order_by('order_id', 'id')
+        for order_id, item_id, name, quantity, price in rows.values_list(
+            'order_id', 'menu_item_id', 'menu_item__name', 'quantity', 'price_per_unit'
+        ):
+            lines.setdefault(order_id, []).append(
+                {'id': item_id, 'name': name, 'quantity': quantity, 'price': price}
+            )
+    result = []
+    for order in orders:
+        row = {field: order[field] for field in fields if field != 'items'}
+        if 'items' in fields:
+            row['items'] = lines.get(order['id'], [])
+        result.append(row)
+    return result
+
+
+@require_http_methods(['GET', 'POST'])
+@vary_on_cookie
+@_login_required
+def orders(request):
+    """
+    GET — заказы клиента, новые сверху (?cursor=, ?limit=, ?fields=).
+    POST {"password": "…"} — оформить заказ из корзины; пароль нужен,
+    только если его требует политика подтверждения (main/checkout.py).
+    """
+    if request.method == 'POST':
+        return _create_order(request)
+
+    fields = _fields(request, ORDER_FIELDS)
+    limit = _limit(request)
+    queryset = Order.objects.filter(client=request.user).order_by('-created_at', '-id')
+    cursor = request.GET.get('cursor')
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, order_id = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+
+    page = list(queryset.values('id', 'created_at', 'status', 'total')[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(Order(id=page[-1]['id'], created_at=page[-1]['created_at']))
+    return _response(request, {'results': _order_rows(page, fields), 'next': next_cursor})
+
+
+def _create_order(request):
+    data = _body(request)
+    if data is None:
+        return _error("Ожидается JSON")
+    current = Cart(request)
+    if not current:
+        return _error("Корзина пуста")
+    if not checkout.confirm(request, data.get('password')):
+        return _error("Нужен пароль", status=403, password_required=True)
+    try:
+        order = place_order(request.user, current, current.owners)
+    except OutOfStock as e:
+        return _error("Не хватает на складе", status=409, items=e.names)
+    current.clear()
+    return _response(request, {'id': order.id, 'status': order.status, 'total': order.total}, status=201)
+
+
+@require_GET
+@vary_on_cookie
+@_login_required
+def order(request, order_id):
+    """Один заказ клиента — для опроса статуса; ETag от времени последнего изменения."""
+    fields = _fields(request, ORDER_FIELDS)
+    row = Order.objects.filter(id=order_id, client=request.user).values(
+        'id', 'created_at', 'status', 'total', 'updated_at'
+    ).first()
+    if row is None:
+        return _error("Заказ не найден", status=404)
+    etag = _etag(order_id, row['updated_at'].timestamp(), request.get_full_path())
+    return _not_modified(request, etag) or _response(request, _order_rows([row], fields)[0], etag)
+
+
+# --- Сессия -----------------------------------------------------------------
+
+@require_GET
+@vary_on_cookie
+@ensure_csrf_cookie
+def me(request):
+    """Кто вошёл (или null) и заодно cookie csrftoken для запросов на запись."""
+    user = request.user
+    if not user.is_authenticated:
+        return _response(request, {'user': None})
+    return _response(request, {'user': {'id': user.id, 'username': user.username, 'name': user.name}})
@@ -0,0 +1,122 @@
+"""
+Общие кирпичики для нагрузочных замеров (manage.py benchmark и др.).
+
+Замер — это список Sample: длительность запроса, число SQL-запросов
+(если удалось посчитать) и признак ошибки. summarize() сворачивает его
+в пропускную способность и перцентили латентности.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.db.models import IntegerField, Max
+from django.db.models.functions import Cast, Substr
+
+from .models import CustomUser
+
+# Клиенты, которых создаёт seed_data: user-0, user-1, …
+SEEDED_PREFIX = 'user-'
+
+
+@dataclass
+class Sample:
+    queries: int = None
+    error: bool = False
+    seconds: float = 0
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def run_concurrent(make_worker, requests, concurrency):
+    """
+    Выполняет `requests` вызовов в `concurrency` потоках.
+
+    make_worker() вызывается один раз в каждом потоке и возвращает функцию
+    одного запроса → Sample (так у каждого потока свой клиент и соединение с БД).
+    Возвращает (samples, wall_seconds).
+    """
+    samples = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def loop():
+        request = make_worker()
+        local = []
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            started = time.perf_counter()
+            try:
+                sample = request()
+            except Exception:
+                sample = Sample(error=True)
+            sample.seconds = time.perf_counter() - started
+            local.append(sample)
+        with lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(loop) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, wall_seconds):
+    ok = [s for s in samples if not s.error]
+    latencies = [s.seconds * 1000 for s in ok]
+    queries = [s.queries for s in ok if s.queries is not None]
+    return {
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'throughput_rps': round(len(ok) / wall_seconds, 1) if wall_seconds else None,
+        'p50_ms': _round(percentile(latencies, 50)),
+        'p95_ms': _round(percentile(latencies, 95)),
+        'p99_ms': _round(percentile(latencies, 99)),
+        'queries_avg': _round(sum(queries) / len(queries)) if queries else None,
+    }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def save(path, payload):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def compare(previous, current, stdout):
+    """Печатает изменение p95 и пропускной способности относительно прошлого прогона."""
+    for name, result in current.items():
+        before = previous.get(name)
+        if not before or not result.get('p95_ms') or not before.get('p95_ms'):
+            continue
+        p95 = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        rps = ((result['throughput_rps'] or 0) - (before['throughput_rps'] or 0)) / (before['throughput_rps'] or 1) * 100
+        stdout.write(f"  {name:<24} p95 {p95:+6.1f}%   rps {rps:+6.1f}%")
+
+
+def seeded_clients():
+    """Клиенты seed_data с номером из логина в поле seed_number."""
+    return CustomUser.objects.filter(username__regex=rf'^{SEEDED_PREFIX}[0-9]+$').annotate(
+        seed_number=Cast(Substr('username', len(SEEDED_PREFIX) + 1), IntegerField()),
+    )
+
+
+def last_seed_number():
+    """Наибольший номер user-N в базе или None, если seed_data ещё не запускали."""
+    return seeded_clients().aggregate(last=Max('seed_number'))['last']
+
+
+def first_seeded_client():
+    return seeded_clients().order_by('seed_number').first()
@@ -0,0 +1,143 @@
+"""
+Снимок каталога меню.
+
+Сгруппированное и отсортированное меню строится один раз на пару
+(категория, сортировка) и хранится в кэше под текущей версией каталога.
+Версия увеличивается при каждом сохранении или удалении MenuItem/Category
+(см. main/signals.py), так что старые снимки просто перестают читаться.
+Версия хранится в БД (main/versions.py): её увеличение из команды импорта,
+воркера задач или соседнего веб-процесса видят все процессы.
+Снимки собираются из основной базы, а не из реплики: отставшая реплика
+положила бы старые данные под новую версию.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from coffee import db_router
+
+from . import versions
+from .models import MenuItem, Category
+
+VERSION_KEY = 'catalog'
+
+DEFAULT_SORT = '-created_at'
+VALID_SORTS = [
+    '-created_at', 'name', '-name',
+    'price', '-price',
+    'volume_ml', '-volume_ml',
+    'calories', '-calories',
+    'is_vegan',  # False (0) → True (1): сначала веганские
+]
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def get_version():
+    return versions.get(VERSION_KEY)
+
+
+def bump_version():
+    return versions.bump([VERSION_KEY])
+
+
+def bump_version_on_commit():
+    # Пока транзакция не закрыта, читатель может собрать снимок из старых
+    # данных и положить его уже под новой версией — поэтому ждём коммита.
+    transaction.on_commit(bump_version)
+
+
+def _key(version, *parts):
+    return ':'.join(['catalog', str(version)] + [str(p) for p in parts])
+
+
+def normalize_sort(sort):
+    return sort if sort in VALID_SORTS else DEFAULT_SORT
+
+
+def _build_menu(category_id, sort):
+    with db_router.primary():
+        return _group(category_id, sort)
+
+
+def _group(category_id, sort):
+    items = MenuItem.objects.filter(in_stock=True).select_related('category')
+    if category_id is not None:
+        items = items.filter(category_id=category_id)
+    items = items.order_by(sort)
+
+    # Группировка по категориям
+    menu_dict = {}
+    for item in items:
+        cat_name = item.category.name if item.category else "Без категории"
+        menu_dict.setdefault(cat_name, []).append(item)
+    return menu_dict
+
+
+def get_menu(category_id=None, sort=DEFAULT_SORT):
+    """Меню {название категории: [позиции]} для пары (категория, сортировка)."""
+    sort = normalize_sort(sort)
+    key = _key(get_version(), 'menu', category_id or 'all', sort)
+    return cache.get_or_set(key, lambda: _build_menu(category_id, sort), _timeout())
+
+
+def get_categories():
+    key = _key(get_version(), 'categories')
+    def build():
+        with db_router.primary():
+            return list(Category.objects.all())
+    return cache.get_or_set(key, build, _timeout())
+
+
+def _build_state():
+    with db_router.primary():
+        return _state()
+
+
+def _state():
+    items = MenuItem.objects.aggregate(changed=Max('updated_at'), count=Count('id'))
+    categories = Category.objects.aggregate(changed=Max('updated_at'), count=Count('id'))
+    changed = [value for value in (items['changed'], categories['changed']) if value]
+    return {
+        'last_modified': max(changed) if changed else None,
+        'items': items['count'],
+        'categories': categories['count'],
+    }
+
+
+def get_state():
+    """
+    Когда каталог менялся в последний раз и сколько в нём позиций/категорий —
+    основа ETag и Last-Modified меню. Два агрегата на версию каталога;
+    от версии зависит только ключ кэша, сами значения одинаковы во всех процессах.
+    """
+    key = _key(get_version(), 'state')
+    return cache.get_or_set(key, _build_state, _timeout())
+
+
+def get_items(ids):
+    """Позиции в наличии по id: {id: MenuItem}. Чего нет в кэше — одним запросом."""
+    ids = {int(item_id) for item_id in ids}
+    if not ids:
+        return {}
+
+    version = get_version()
+    keys = {_key(version, 'item', item_id): item_id for item_id in ids}
+    items = {keys[key]: item for key, item in cache.get_many(keys).items()}
+
+    missing = ids - items.keys()
+    if missing:
+        with db_router.primary():
+            fetched = {
+                item.id: item
+                for item in MenuItem.objects.filter(id__in=missing, in_stock=True)
+            }
+        cache.set_many(
+            {_key(version, 'item', item_id): item for item_id, item in fetched.items()},
+            _timeout(),
+        )
+        items.update(fetched)
+    return items
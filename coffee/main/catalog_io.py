@@ -0,0 +1,370 @@
+"""
+Импорт и экспорт каталога (позиции и категории) в CSV, JSON и JSON Lines.
+
+Импорт читает файл потоком и применяет строки пачками: в каждой пачке
+недостающие категории создаются одним bulk_create, существующие позиции
+находятся одним запросом по ключу (категория, название), новые
+добавляются bulk_create, изменившиеся — одним UPDATE через executemany
+(только присланные поля, неизменившиеся строки не пишутся).
+Ошибочная строка попадает в отчёт и пропускается, остальные применяются;
+если пачку отвергла сама база, в отчёт попадают все её строки, а импорт
+идёт дальше со следующей.
+
+Строка без названия, но с категорией, лишь заводит категорию — так
+выгружаются категории без позиций. Массовые операции идут в обход
+сигналов, поэтому версию каталога, фрагменты и поисковый индекс
+обновляем сами.
+"""
+import csv
+import io
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from . import catalog, counters, fragments, search
+from .models import Category, MenuItem
+
+FORMATS = ('csv', 'json', 'jsonl')
+COLUMNS = ['category', 'name', 'price', 'stock', 'in_stock', 'description', 'volume_ml', 'calories', 'is_vegan']
+BATCH_SIZE = 1000
+READ_SIZE = 64 * 1024  # сколько символов JSON-массива читаем за раз
+
+TRUE = {'1', 'true', 'yes', 'да', '+'}
+FALSE = {'0', 'false', 'no', 'нет', '-', ''}
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    categories: int = 0
+    errors: list = field(default_factory=list)  # [(номер строки, текст ошибки)]
+
+
+def guess_format(filename):
+    ext = filename.rsplit('.', 1)[-1].lower()
+    return ext if ext in FORMATS else 'csv'
+
+
+# --- Разбор и проверка строк ------------------------------------------------
+
+def read_rows(stream, fmt):
+    """(номер строки, словарь) из текстового потока — все форматы читаются потоком."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as e:
+                    yield number, e
+    else:
+        yield from _json_array(stream)
+
+
+def _json_array(stream, read_size=READ_SIZE):
+    # Массив JSON по элементам: в памяти — только текущий кусок файла.
+    # Номер строки — номер элемента; на битом месте отдаём ошибку и
+    # останавливаемся (дальше границы элементов уже не найти)
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    state, number = 'start', 0   # start → first → (after → value)* → done
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                if state != 'done':
+                    yield number + 1, ValueError("файл оборвался внутри массива JSON")
+                return
+            chunk = stream.read(read_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+
+        char = buffer[pos]
+        if state == 'start':
+            if char != '[':
+                yield 1, ValueError("ожидался массив JSON")
+                return
+            pos, state = pos + 1, 'first'
+        elif state == 'done':
+            yield number + 1, ValueError("лишние данные после массива JSON")
+            return
+        elif char == ']' and state in ('first', 'after'):
+            pos, state = pos + 1, 'done'
+        elif state == 'after':
+            if char != ',':
+                yield number + 1, ValueError(f"ожидалась «,» или «]», получено «{char}»")
+                return
+            pos, state = pos + 1, 'value'
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except ValueError as e:
+                value, end = e, None
+            # Элемент мог оборваться на границе куска (или число — продолжиться):
+            # дочитываем и разбираем заново
+            if (end is None or end == len(buffer)) and not eof:
+                chunk = stream.read(read_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            number += 1
+            yield number, value
+            if end is None:
+                return
+            pos, state = end, 'after'
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _bool(value):
+    text = _text(value).lower()
+    if text in TRUE:
+        return True
+    if text in FALSE:
+        return False
+    raise ValueError(f"ожидалось да/нет, получено «{value}»")
+
+
+def _int(value, maximum, optional=False):
+    text = _text(value)
+    if not text and optional:
+        return None
+    number = int(text)
+    if not 0 <= number <= maximum:
+        raise ValueError(f"число вне диапазона 0…{maximum}: {number}")
+    return number
+
+
+def _price(value):
+    try:
+        price = Decimal(_text(value).replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"некорректная цена «{value}»")
+    if not Decimal('0') <= price < Decimal('10000') or price.as_tuple().exponent < -2:
+        raise ValueError(f"цена вне диапазона или больше двух знаков после запятой: {value}")
+    return price
+
+
+FIELDS = {
+    'price': _price,
+    'stock': lambda value: _int(value, 2147483647),
+    'in_stock': _bool,
+    'description': _text,
+    'volume_ml': lambda value: _int(value, 32767, optional=True),
+    'calories': lambda value: _int(value, 32767, optional=True),
+    'is_vegan': _bool,
+}
+
+
+def clean_row(row):
+    """Проверенная строка: (категория, название, {поле: значение}) или ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError(f"строка не разобрана: {row}")
+    category = _text(row.get('category'))
+    name = _text(row.get('name'))
+    if not category:
+        raise ValueError("не указана категория")
+    if len(category) > 100 or len(name) > 100:
+        raise ValueError("название длиннее 100 символов")
+
+    values = {}
+    for column, parse in FIELDS.items():
+        # Пустая или отсутствующая колонка не меняет поле (кроме описания)
+        if column not in row or (row[column] in (None, '') and column != 'description'):
+            continue
+        try:
+            values[column] = parse(row[column])
+        except ValueError as e:
+            raise ValueError(f"{column}: {e}")
+    return category, name, values
+
+
+# --- Импорт -----------------------------------------------------------------
+
+def import_catalog(stream, fmt='csv', batch_size=BATCH_SIZE, dry_run=False):
+    result = ImportResult()
+    batch = []
+    for number, row in read_rows(stream, fmt):
+        try:
+            batch.append((number, *clean_row(row)))
+        except ValueError as e:
+            result.errors.append((number, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            _apply(batch, result, dry_run)
+            batch = []
+    _apply(batch, result, dry_run)
+    result.errors.sort()
+
+    if not dry_run and (result.created or result.updated or result.categories):
+        catalog.bump_version_on_commit()
+    return result
+
+
+def _apply(batch, result, dry_run):
+    # Пачка считается в свой отчёт и попадает в общий, только если база её
+    # приняла; иначе (ограничение, блокировка) — ошибка на каждую её строку
+    partial = ImportResult()
+    try:
+        _apply_batch(batch, partial, dry_run)
+    except DatabaseError as e:
+        result.errors.extend((number, f"пачка не записана: {e}") for number, *_ in batch)
+        return
+    result.created += partial.created
+    result.updated += partial.updated
+    result.unchanged += partial.unchanged
+    result.categories += partial.categories
+    result.errors.extend(partial.errors)
+
+
+def _apply_batch(batch, result, dry_run):
+    if not batch:
+        return
+    with transaction.atomic():
+        categories = _categories({category for _, category, _, _ in batch}, result, dry_run)
+
+        # Повтор ключа внутри пачки — побеждает последняя строка
+        rows = {}
+        for number, category, name, values in batch:
+            if name:
+                key = (category, name)
+                rows[key] = (number, {**rows.get(key, (None, {}))[1], **values})
+
+        existing = {}
+        if rows:
+            category_ids = {categories[c].pk for c, _ in rows if categories[c].pk}
+            for item in MenuItem.objects.filter(category_id__in=category_ids, name__in={n for _, n in rows}):
+                existing.setdefault((item.category_id, item.name), item)
+
+        to_create, to_update, changed_fields = [], [], set()
+        for (category, name), (number, values) in rows.items():
+            item = existing.get((categories[category].pk, name))
+            if item is None:
+                if 'price' not in values:
+                    result.errors.append((number, "новая позиция без цены"))
+                    continue
+                to_create.append(MenuItem(category=categories[category], name=name, **values))
+            else:
+                # Неизменившиеся строки (обычно большая часть прайса) не пишем
+                changed = {column for column, value in values.items() if getattr(item, column) != value}
+                if not changed:
+                    result.unchanged += 1
+                    continue
+                for column in changed:
+                    setattr(item, column, values[column])
+                item.category = categories[category]
+                to_update.append(item)
+                changed_fields.update(changed)
+
+        result.created += len(to_create)
+        result.updated += len(to_update)
+        if dry_run:
+            return
+        MenuItem.objects.bulk_create(to_create, batch_size=500)
+        # Категория у найденной позиции не меняется (ищем по ней же) — считаем только новые
+        counters.add_category_items(Counter(item.category_id for item in to_create))
+        # auto_now работает только в save(); в обход него ставим updated_at сами
+        now = timezone.now()
+        for item in to_update:
+            item.updated_at = now
+        _update(to_update, sorted(changed_fields | {'updated_at'}))
+        fragments.bump_on_commit(item.pk for item in to_update)
+        if 'description' in changed_fields or to_create:
+            search.index_items(to_create + to_update)
+
+
+def _update(items, fields):
+    # bulk_update собирает CASE WHEN на каждую строку и поле — на 20 тыс.
+    # позиций это десятки секунд в Python. Один подготовленный UPDATE
+    # через executemany делает то же за доли секунды.
+    if not items:
+        return
+    connection = connections[router.db_for_write(MenuItem)]
+    model_fields = [MenuItem._meta.get_field(name) for name in fields]
+    qn = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        qn(MenuItem._meta.db_table),
+        ', '.join(f'{qn(f.column)} = %s' for f in model_fields),
+        qn(MenuItem._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [f.get_db_prep_save(getattr(item, f.attname), connection) for f in model_fields] + [item.pk]
+            for item in items
+        ])
+
+
+def _categories(names, result, dry_run):
+    """{название: Category}; недостающие создаются (в dry_run — только считаются)."""
+    found = {c.name: c for c in Category.objects.filter(name__in=names)}
+    missing = names - found.keys()
+    result.categories += len(missing)
+    if missing and not dry_run:
+        Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+        found.update({c.name: c for c in Category.objects.filter(name__in=missing)})
+    for name in missing - found.keys():
+        found[name] = Category(name=name)  # dry_run: pk нет, позиции пойдут в «новые»
+    return found
+
+
+# --- Экспорт ----------------------------------------------------------------
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Словари строк каталога; из БД читается кусками по chunk_size."""
+    items = (queryset if queryset is not None else MenuItem.objects.all()).order_by('category__name', 'name')
+    values = items.values_list(
+        'category__name', 'name', 'price', 'stock', 'in_stock', 'description',
+        'volume_ml', 'calories', 'is_vegan',
+    )
+    for row in values.iterator(chunk_size=chunk_size):
+        yield dict(zip(COLUMNS, row))
+
+    if queryset is None:
+        for name in Category.objects.filter(menuitem__isnull=True).order_by('name').values_list('name', flat=True):
+            yield {'category': name, 'name': ''}
+
+
+class Echo:
+    """Псевдофайл для csv.writer: writerow() просто возвращает готовую строку."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return int(value)
+    return '' if value is None else value
+
+
+def export_lines(rows, fmt='csv'):
+    """Строки файла выгрузки — для StreamingHttpResponse или записи в файл."""
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(COLUMNS)
+        for row in rows:
+            yield writer.writerow([_csv_value(row.get(column)) for column in COLUMNS])
+    elif fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False, default=str) + '\n'
+    else:
+        yield '['
+        for index, row in enumerate(rows):
+            yield (',\n' if index else '\n') + json.dumps(row, ensure_ascii=False, default=str)
+        yield '\n]\n'
+
+
+def text_stream(binary):
+    """Текстовый поток поверх загруженного файла (UTF-8, BOM от Excel допускается)."""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
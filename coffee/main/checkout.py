@@ -0,0 +1,74 @@
+"""
+Подтверждение заказа.
+
+Раньше каждый заказ требовал пароль, а check_password — это полный
+прогон PBKDF2 (сотни миллисекунд процессора на запрос). Теперь пароль
+нужен, только если клиент давно не подтверждал личность: вход или
+верный пароль при оформлении кладут в сессию подписанную отметку
+времени, и в течение CHECKOUT_REAUTH_WINDOW секунд повторные заказы
+проходят без хеширования.
+
+Отметка привязана к пользователю и хешу его пароля
+(get_session_auth_hash): после смены пароля она недействительна.
+Политика задаётся настройкой CHECKOUT_CONFIRMATION:
+  'recent'   — пароль, только если отметка старше окна (по умолчанию);
+  'password' — пароль на каждый заказ, как раньше;
+  'none'     — достаточно быть залогиненным.
+"""
+from django.conf import settings
+from django.core import signing
+
+SESSION_KEY = 'checkout_confirmed'
+SALT = 'coffee.checkout'
+POLICIES = ('recent', 'password', 'none')
+
+
+def policy():
+    value = getattr(settings, 'CHECKOUT_CONFIRMATION', 'recent')
+    return value if value in POLICIES else 'recent'
+
+
+def window():
+    return getattr(settings, 'CHECKOUT_REAUTH_WINDOW', 15 * 60)
+
+
+def mark_confirmed(request, user=None):
+    """Клиент только что подтвердил личность (вход или пароль при оформлении)."""
+    user = user or request.user
+    request.session[SESSION_KEY] = signing.dumps(
+        {'user': user.pk, 'hash': user.get_session_auth_hash()}, salt=SALT,
+    )
+
+
+def recently_confirmed(request):
+    token = request.session.get(SESSION_KEY)
+    if not token:
+        return False
+    try:
+        data = signing.loads(token, salt=SALT, max_age=window())
+    except signing.BadSignature:
+        return False
+    user = request.user
+    return data.get('user') == user.pk and data.get('hash') == user.get_session_auth_hash()
+
+
+def password_required(request):
+    current = policy()
+    if current == 'none':
+        return False
+    if current == 'password':
+        return True
+    return not recently_confirmed(request)
+
+
+def confirm(request, password):
+    """
+    Можно ли оформлять заказ. Пароль проверяется (и хешируется) только
+    когда политика его требует; верный пароль продлевает окно.
+    """
+    if not password_required(request):
+        return True
+    if password and request.user.check_password(password):
+        mark_confirmed(request)
+        return True
+    return False
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.utils.module_loading import import_string
+
+# Бэкенды, которые держат данные внутри одного процесса
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def cart_cache_is_shared(app_configs, **kwargs):
+    """CacheCartStorage хранит корзину только в кэше — кэш должен быть общим."""
+    from coffee.cart import CacheCartStorage
+
+    storage = import_string(getattr(settings, 'CART_STORAGE', 'coffee.cart.SessionCartStorage'))
+    if not issubclass(storage, CacheCartStorage):
+        return []
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f"CART_STORAGE={settings.CART_STORAGE} требует общего для всех процессов кэша, а не {backend}.",
+        hint="Подключите Redis или Memcached в CACHES['default'] либо выберите "
+             "SessionCartStorage/SignedCookieCartStorage.",
+        id='main.E001',
+    )]
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def order_events(request):
+    """Флаг для шаблонов: подписываться ли на SSE-стрим заказов."""
+    return {'order_events_stream': settings.ORDER_EVENTS_STREAM}
@@ -0,0 +1,154 @@
+"""
+Денормализованные счётчики — чтобы страницы не считали связанные строки:
+
+- Order.line_count / unit_count — строк и штук в заказе;
+- Category.item_count — позиций в категории;
+- CustomUser.order_count / total_spent — заказов клиента и сумма выданных.
+
+Меняются только относительными F()-обновлениями в той же транзакции, что
+и сами данные: одиночные сохранения и удаления — из сигналов
+(main/signals.py), массовые пути (оформление заказа, импорт прайса, смена
+статусов пачкой) вызывают функции отсюда сами. Если счётчики всё же
+разошлись с данными, recount() пересчитывает их с нуля (команда
+recount_counters).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.apps import apps as django_apps
+from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Category, CustomUser, Order, OrderItem
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+FIELDS = {
+    Order: ('line_count', 'unit_count'),
+    Category: ('item_count',),
+    CustomUser: ('order_count', 'total_spent'),
+}
+
+# Сколько строк в одном UPDATE: у SQLite ограничено число параметров запроса
+CHUNK = 300
+
+
+def save_fields(model):
+    """Поля для save(update_fields=…) без счётчиков: форма со старым значением их не перетирает."""
+    return [
+        f.attname for f in model._meta.concrete_fields
+        if not f.primary_key and f.name not in FIELDS[model]
+    ]
+
+
+def spent(status, total):
+    """Сколько заказ добавляет к total_spent клиента: в сумму идут только выданные."""
+    return total if status == 'completed' else 0
+
+
+def add(model, deltas, using=None):
+    """
+    deltas: {pk: {поле: прибавка}}. Один UPDATE с CASE на поле на каждую пачку
+    строк; поля без ненулевых прибавок в пачке не пишутся вовсе. Уменьшение не
+    опускает счётчик ниже нуля: если он разошёлся с данными, запись заказа не
+    должна упасть на CHECK — расхождение исправит recount().
+    """
+    deltas = {
+        pk: {name: delta for name, delta in changes.items() if delta}
+        for pk, changes in deltas.items() if pk is not None
+    }
+    deltas = {pk: changes for pk, changes in deltas.items() if changes}
+    pks = list(deltas)
+    for start in range(0, len(pks), CHUNK):
+        chunk = pks[start:start + CHUNK]
+        fields = {name for pk in chunk for name in deltas[pk]}
+        model.objects.using(using).filter(pk__in=chunk).update(**{
+            name: Case(
+                *[
+                    When(pk=pk, then=_added(model, name, deltas[pk][name]))
+                    for pk in chunk if name in deltas[pk]
+                ],
+                default=F(name),
+                output_field=model._meta.get_field(name),
+            )
+            for name in fields
+        })
+
+
+def _added(model, name, delta):
+    value = F(name) + Value(delta)
+    if delta > 0:
+        return value
+    return Greatest(value, Value(0), output_field=model._meta.get_field(name))
+
+
+def add_category_items(counts, using=None):
+    """counts: {id категории: сколько позиций прибавилось (или убыло)}."""
+    add(Category, {pk: {'item_count': n} for pk, n in counts.items()}, using)
+
+
+def add_client_orders(changes, using=None):
+    """changes: [(id клиента, заказов, сумма выданных)] — суммируются по клиенту."""
+    totals = defaultdict(lambda: {'order_count': 0, 'total_spent': Decimal(0)})
+    for client_id, orders, amount in changes:
+        totals[client_id]['order_count'] += orders
+        totals[client_id]['total_spent'] += amount
+    add(CustomUser, totals, using)
+
+
+def remove_item_lines(item_id, using=None):
+    """Позиция удаляется вместе со строками заказов — вычитаем их из заказов одним UPDATE."""
+    rows = (
+        OrderItem.objects.using(using).filter(menu_item_id=item_id)
+        .values('order_id').annotate(lines=Count('id'), units=Sum('quantity')).order_by()
+    )
+    add(Order, {
+        row['order_id']: {'line_count': -row['lines'], 'unit_count': -row['units']}
+        for row in rows
+    }, using)
+
+
+def _recount(queryset, expressions):
+    # Переписываем только разошедшиеся строки; возвращаем, сколько их было
+    stale = queryset.annotate(**{f'_{name}': expr for name, expr in expressions.items()}).exclude(
+        **{name: F(f'_{name}') for name in expressions}
+    )
+    return queryset.filter(pk__in=stale.values('pk')).update(**expressions)
+
+
+def _aggregate(queryset, key, aggregate, output_field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{key: OuterRef('pk')}).order_by().values(key)
+            .annotate(value=aggregate).values('value')[:1]
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def recount(apps=None, using=None):
+    """
+    Пересчитывает все счётчики по данным. Возвращает {модель: исправлено строк}.
+    apps — реестр исторических моделей, когда вызывается из миграции.
+    """
+    get_model = (apps or django_apps).get_model
+    order, item, line = get_model('main', 'Order'), get_model('main', 'MenuItem'), get_model('main', 'OrderItem')
+    lines = line.objects.using(using)
+    orders = order.objects.using(using)
+    return {
+        'Order': _recount(orders, {
+            'line_count': _aggregate(lines, 'order', Count('id'), models.IntegerField()),
+            'unit_count': _aggregate(lines, 'order', Sum('quantity'), models.IntegerField()),
+        }),
+        'Category': _recount(get_model('main', 'Category').objects.using(using), {
+            'item_count': _aggregate(item.objects.using(using), 'category', Count('id'), models.IntegerField()),
+        }),
+        'CustomUser': _recount(get_model('main', 'CustomUser').objects.using(using), {
+            'order_count': _aggregate(orders, 'client', Count('id'), models.IntegerField()),
+            'total_spent': _aggregate(
+                orders, 'client', Sum('total', filter=Q(status='completed')), MONEY,
+            ),
+        }),
+    }
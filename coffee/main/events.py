@@ -0,0 +1,136 @@
+"""
+Поток изменений заказов для Server-Sent Events.
+
+На процесс — одна лента: фоновая корутина раз в ORDER_EVENTS_POLL_INTERVAL
+секунд читает заказы, изменённые с прошлого опроса (по индексу на
+Order.updated_at), и раскладывает события по очередям подписчиков.
+Сколько бы ни было открытых соединений, запрос к БД один на тик, а
+простаивающее соединение — это только корутина и пустая asyncio.Queue.
+
+Лента и очереди привязаны к циклу событий, в котором созданы, поэтому
+лента своя у каждого цикла (get_feed). Под ASGI цикл один на процесс.
+"""
+import asyncio
+import contextvars
+import weakref
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Order, OrderItem
+
+# Запись видна только после коммита, а updated_at ставится раньше —
+# поэтому каждый опрос немного захватывает прошлое и отбрасывает уже отправленное.
+LOOKBACK = timedelta(seconds=5)
+QUEUE_SIZE = 100
+
+
+def _poll_interval():
+    return getattr(settings, 'ORDER_EVENTS_POLL_INTERVAL', 1.0)
+
+
+class Subscription:
+    def __init__(self, client_id, bar=False):
+        self.client_id = client_id
+        self.bar = bar
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def wants(self, event):
+        return self.bar or event['client_id'] == self.client_id
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать — пропускаем, он получит следующий статус
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class OrderFeed:
+    def __init__(self):
+        self.subscribers = set()
+        self._task = None
+        self._since = None
+        self._sent = {}  # id заказа → updated_at последнего отправленного события
+
+    def subscribe(self, client_id, bar=False):
+        subscription = Subscription(client_id, bar)
+        self.subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._since = timezone.now()
+            self._sent = {}
+            # Пустой контекст: лента переживёт запрос, который её запустил
+            self._task = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    async def _run(self):
+        # Лента живёт, пока есть хоть один подписчик
+        while self.subscribers:
+            await asyncio.sleep(_poll_interval())
+            try:
+                events = await self._poll()
+            except Exception:
+                continue
+            for event in events:
+                for subscription in list(self.subscribers):
+                    if subscription.wants(event):
+                        subscription.push(event)
+
+    async def _poll(self):
+        rows = Order.objects.filter(updated_at__gte=self._since - LOOKBACK).order_by('updated_at')
+        changed = [
+            order async for order in rows
+            if self._sent.get(order.id) != order.updated_at
+        ]
+        if not changed:
+            return []
+
+        self._since = max(self._since, changed[-1].updated_at)
+        for order in changed:
+            self._sent[order.id] = order.updated_at
+        horizon = self._since - LOOKBACK
+        self._sent = {pk: ts for pk, ts in self._sent.items() if ts >= horizon}
+
+        # Состав нужен только бару и только для новых заказов — один запрос на пачку
+        lines = {}
+        new_ids = [order.id for order in changed if order.status == 'new']
+        if new_ids and any(s.bar for s in self.subscribers):
+            items = OrderItem.objects.filter(order_id__in=new_ids).values_list(
+                'order_id', 'quantity', 'menu_item__name'
+            )
+            async for order_id, quantity, name in items:
+                lines.setdefault(order_id, []).append(f"{quantity}× {name}")
+
+        return [self.serialize(order, lines.get(order.id, [])) for order in changed]
+
+    @staticmethod
+    def serialize(order, lines):
+        return {
+            'id': order.id,
+            'client_id': order.client_id,
+            'status': order.status,
+            'status_display': order.get_status_display(),
+            'cancellation_reason': order.cancellation_reason,
+            'total': str(order.total),
+            'created_at': order.created_at.isoformat(),
+            'items': lines,
+        }
+
+
+_feeds = weakref.WeakKeyDictionary()  # цикл событий → его лента
+
+
+def get_feed():
+    """Лента текущего цикла событий (вызывать из корутины)."""
+    loop = asyncio.get_running_loop()
+    feed = _feeds.get(loop)
+    if feed is None:
+        feed = _feeds[loop] = OrderFeed()
+    return feed
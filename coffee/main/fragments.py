@@ -0,0 +1,90 @@
+"""
+Кэш HTML-фрагментов позиций: карточка в меню и тело страницы позиции.
+
+У каждой позиции своя версия (item:<id> в main/versions.py — общая для
+всех процессов); фрагмент хранится в кэше под ключом с этой версией.
+Сохранение или удаление позиции, переименование её категории и готовые
+копии картинки (их делает воркер run_tasks) увеличивают версию (см.
+main/signals.py) — старые фрагменты просто перестают читаться, остальные
+позиции остаются в кэше. Меню из N карточек — это версии из памяти
+процесса, один get_many HTML и рендер только того, чего в кэше нет.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from coffee import db_router
+
+from . import versions
+from .models import MenuItem
+
+
+def _timeout():
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _version_key(item_id):
+    return f"item:{item_id}"
+
+
+def get_versions(ids):
+    """{id позиции: версия}."""
+    found = versions.get_many([_version_key(item_id) for item_id in ids])
+    return {item_id: found[_version_key(item_id)] for item_id in ids}
+
+
+def bump(ids):
+    versions.bump([_version_key(item_id) for item_id in ids])
+
+
+def bump_image(name):
+    """
+    После нарезки копий картинки name: у позиций с ней в srcset появились
+    новые ширины. Версии общие — пересоберут и веб-процессы, а не только тот,
+    кто резал (воркер run_tasks или команда build_image_variants).
+    """
+    bump(MenuItem.objects.filter(image=name).values_list('id', flat=True))
+
+
+def bump_on_commit(ids):
+    # Как и снимок каталога: до коммита читатель отрендерил бы старые данные под новой версией
+    ids = list(ids)
+    transaction.on_commit(lambda: bump(ids))
+
+
+def cards(items, next_url):
+    """HTML карточек меню в порядке items. next_url — куда вернуться после «Добавить»."""
+    current = get_versions([item.id for item in items])
+    keys = {item.id: f"fragment:card:{item.id}:{current[item.id]}" for item in items}
+    cached = cache.get_many(keys.values())
+
+    fresh = {}
+    result = []
+    for item in items:
+        key = keys[item.id]
+        html = cached.get(key) or fresh.get(key)
+        if html is None:
+            html = fresh[key] = render_to_string('menu_card.html', {'item': item, 'next_url': next_url})
+        result.append(mark_safe(html))
+    if fresh:
+        cache.set_many(fresh, _timeout())
+    return result
+
+
+def detail(item_id, load_item):
+    """
+    Страница позиции: (название, HTML тела). load_item() нужен только при
+    промахе — при попадании страница собирается без запросов к БД.
+    """
+    version = get_versions([item_id])[item_id]
+    key = f"fragment:detail:{item_id}:{version}"
+    cached = cache.get(key)
+    if cached is None:
+        with db_router.primary():
+            item = load_item()
+        cached = (item.name, render_to_string('menu_detail_body.html', {'item': item}))
+        cache.set(key, cached, _timeout())
+    name, html = cached
+    return name, mark_safe(html)
@@ -0,0 +1,51 @@
+"""
+История заказов клиента с keyset-пагинацией по (created_at, id).
+
+Курсор — подписанная пара (created_at, id) последнего заказа на странице,
+так что следующая страница читается по индексу без OFFSET, а позиции
+заказов и товары подтягиваются двумя запросами на страницу.
+"""
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Prefetch, Q
+
+from .models import Order, OrderItem
+
+PAGE_SIZE = 20
+CURSOR_SALT = 'main.history.cursor'
+
+
+def encode_cursor(order):
+    return signing.dumps([order.created_at.isoformat(), order.id], salt=CURSOR_SALT)
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, order_id = signing.loads(cursor, salt=CURSOR_SALT)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def order_history(client, cursor=None, page_size=PAGE_SIZE):
+    """Страница заказов клиента (новые сверху) и курсор следующей страницы."""
+    orders = (
+        Order.objects.filter(client=client)
+        .order_by('-created_at', '-id')
+        .prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+        )
+    )
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, order_id = position
+        orders = orders.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+        )
+
+    # Берём на один больше, чтобы понять, есть ли следующая страница
+    page = list(orders[:page_size + 1])
+    next_cursor = encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
@@ -0,0 +1,111 @@
+"""
+Уменьшенные копии картинок (JPEG и WebP фиксированной ширины).
+
+Имена детерминированы: menu/474_kofe.jpg → menu/variants/474_kofe-640.webp,
+поэтому шаблону не нужно ничего хранить в БД — достаточно знать, какие
+ширины уже нарезаны (это кэшируется). Копий шире оригинала нет: вместо
+них одна копия в его настоящую ширину, чтобы srcset не обещал 1024w за
+картинку в 500 пикселей. Нарезка идёт вне запроса: после
+сохранения MenuItem — фоновой задачей (main/tasks.py), для старых
+картинок — командой build_image_variants.
+"""
+import posixpath
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+WIDTHS = (320, 640, 1024)
+FORMATS = {
+    'jpg': {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 75, 'method': 6},
+}
+
+def variant_name(name, width, ext):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', f"{stem}-{width}.{ext}")
+
+
+def _cache_key(storage, name):
+    return f"images:variants:{getattr(storage, 'location', '')}:{name}"
+
+
+def is_complete(widths):
+    """Нарезано всё: есть самая крупная ширина или копия в ширину узкого оригинала."""
+    return bool(widths) and (widths[-1] >= WIDTHS[-1] or widths[-1] not in WIDTHS)
+
+
+def _variant_widths(name, storage):
+    # Ширина копии узкого оригинала заранее неизвестна — берём ширины из имён файлов
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    try:
+        files = set(storage.listdir(posixpath.join(directory, 'variants'))[1])
+    except FileNotFoundError:
+        return []
+    found = {}
+    for file in files:
+        base, ext = posixpath.splitext(file)
+        prefix, _, width = base.rpartition('-')
+        if prefix == stem and width.isdigit() and ext[1:] in FORMATS:
+            found.setdefault(int(width), set()).add(ext[1:])
+    return sorted(width for width, exts in found.items() if exts == set(FORMATS))
+
+
+def available_widths(name, storage=default_storage):
+    """Ширины по возрастанию, для которых нарезаны обе копии (JPEG и WebP)."""
+    key = _cache_key(storage, name)
+    widths = cache.get(key)
+    if widths is None:
+        widths = _variant_widths(name, storage)
+        # Пока копий нет, перепроверяем чаще: их может дорезать другой процесс
+        cache.set(key, widths, 60 * 60 if is_complete(widths) else 60)
+    return widths
+
+
+def target_widths(original_width):
+    """Какие копии нужны: стандартные уже оригинала и (если он не шире крупнейшей) он сам."""
+    widths = [width for width in WIDTHS if width < original_width]
+    if original_width <= WIDTHS[-1]:
+        widths.append(original_width)
+    return widths
+
+
+def build_variants(name, storage=default_storage, force=False):
+    """Нарезает копии для одной картинки. Возвращает число созданных файлов."""
+    from PIL import Image
+
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    created = 0
+    widths = target_widths(image.width)
+    # Копии «шире оригинала», которые раньше растягивались под имя, — удаляем
+    for width in set(WIDTHS) - set(widths):
+        for ext in FORMATS:
+            path = variant_name(name, width, ext)
+            if storage.exists(path):
+                storage.delete(path)
+
+    for width in widths:
+        resized = image if width == image.width else image.resize(
+            (width, round(image.height * width / image.width)), Image.LANCZOS
+        )
+        for ext, options in FORMATS.items():
+            path = variant_name(name, width, ext)
+            if not force and storage.exists(path):
+                continue
+            buffer = BytesIO()
+            resized.save(buffer, **options)
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, ContentFile(buffer.getvalue()))
+            created += 1
+
+    cache.delete(_cache_key(storage, name))
+    return created
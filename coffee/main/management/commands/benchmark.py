@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import string
+import tempfile
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+
+from main import benchmark
+from main.models import CustomUser, MenuItem
+
+# Эти адреса меняют состояние клиента или не заканчиваются — их не гоняем
+SKIP = {
+    'logout': "разлогинит клиента",
+    'delete_order': "удаляет заказы",
+    'order_events': "бесконечный SSE-стрим",
+    'order_create': "создаёт заказы — это замеряет benchmark_checkout",
+    'barista_transition': "меняет статусы заказов, только для сотрудников",
+}
+
+# Эти пишут в БД (брони остатков). В процессе прогон идёт на копии
+# SQLite-базы; если скопировать нельзя — их не гоняем
+STATEFUL = {
+    'cart_add': "ставит брони остатков",
+    'cart_remove': "снимает брони остатков",
+    'cart_update': "меняет брони остатков",
+}
+
+SQL_COUNT = re.compile(r'sql;[^,]*desc="(\d+) queries')
+
+ADMIN_PATHS = [
+    '/admin/main/order/',
+    '/admin/main/orderitem/',
+    '/admin/main/menuitem/',
+    '/admin/main/category/',
+]
+
+
+def build_scenarios(item_id, skip=SKIP):
+    """name → (метод, путь, данные) для каждого именованного URL из coffee/urls.py."""
+    args = {
+        'menu_detail': [item_id],
+        'cart_add': [item_id],
+        'cart_remove': [item_id],
+        'api_menu_item': [item_id],
+    }
+    posts = {
+        'cart_add': {},
+        'cart_remove': {},
+        'cart_update': {'item_id': item_id, 'action': 'inc'},
+    }
+
+    scenarios = {}
+    skipped = {}
+    for pattern in get_resolver().url_patterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        name = pattern.name
+        if name in skip:
+            skipped[name] = skip[name]
+            continue
+        try:
+            path = reverse(name, args=args.get(name, []))
+        except Exception:
+            skipped[name] = "нужны аргументы URL"
+            continue
+        if name in posts:
+            scenarios[name] = ('post', path, posts[name])
+        else:
+            scenarios[name] = ('get', path, {})
+    return scenarios, skipped
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный прогон по всем URL из coffee/urls.py: пропускная способность, "
+        "p50/p95/p99 и число SQL-запросов (по HTTP — из Server-Timing). Результат сохраняется в JSON. "
+        "В процессе прогон идёт на копии SQLite-базы — брони и корзины прогона в неё не попадают."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', help="Гонять по HTTP против запущенного сервера (иначе — в процессе)")
+        parser.add_argument('--requests', type=int, default=200, help="Запросов на каждый URL")
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--user', help="Логин клиента, от имени которого идут запросы (по умолчанию — первый из seed_data)")
+        parser.add_argument('--admin-user', help="Логин сотрудника — добавит в прогон списки админки")
+        parser.add_argument('--only', nargs='*', help="Имена URL, которые гонять")
+        parser.add_argument('--output', help="Куда сохранить результаты (JSON)")
+        parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+
+    def handle(self, *args, **options):
+        # Построчный лог замеров на каждый запрос прогона только мешает
+        logging.getLogger('main.perf').setLevel(logging.WARNING)
+
+        item = MenuItem.objects.filter(in_stock=True).only('id').first()
+        if item is None:
+            raise CommandError("В меню нет позиций — сначала запустите seed_data.")
+        user = self.get_user(options['user']) if options['user'] else benchmark.first_seeded_client()
+        if user is None:
+            raise CommandError("Нет клиентов seed_data — запустите seed_data или укажите --user.")
+        admin = self.get_user(options['admin_user']) if options['admin_user'] else None
+
+        if options['base_url']:
+            results = self.run_all(options, item, user, admin, SKIP)
+        else:
+            with self.database_copy() as copied:
+                if not copied:
+                    self.stdout.write("  база не SQLite-файл — прогон без копии, без адресов, что пишут в БД")
+                results = self.run_all(options, item, user, admin, SKIP if copied else {**SKIP, **STATEFUL})
+
+        payload = {
+            'started_at': datetime.now(dt_timezone.utc).isoformat(),
+            'mode': 'http' if options['base_url'] else 'in-process',
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'results': results,
+        }
+        if options['output']:
+            benchmark.save(options['output'], payload)
+            self.stdout.write(f"Сохранено в {options['output']}")
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                previous = json.load(f)['results']
+            self.stdout.write("Сравнение с прошлым прогоном:")
+            benchmark.compare(previous, results, self.stdout)
+
+    def run_all(self, options, item, user, admin, skip):
+        scenarios, skipped = build_scenarios(item.id, skip)
+        if options['only']:
+            scenarios = {name: s for name, s in scenarios.items() if name in options['only']}
+        for name, reason in skipped.items():
+            self.stdout.write(f"  пропуск {name}: {reason}")
+
+        runs = [(name, user, scenario) for name, scenario in scenarios.items()]
+        if admin is not None:
+            runs += [(f"admin {path}", admin, ('get', path, {})) for path in ADMIN_PATHS]
+
+        results = {}
+        for name, run_user, (method, path, data) in runs:
+            if options['base_url']:
+                make_worker = self.http_worker(options['base_url'], run_user, method, path, data)
+            else:
+                make_worker = self.local_worker(run_user, method, path, data)
+            samples, wall = benchmark.run_concurrent(make_worker, options['requests'], options['concurrency'])
+            results[name] = {'method': method.upper(), 'path': path, **benchmark.summarize(samples, wall)}
+            self.report(name, results[name])
+        return results
+
+    @contextmanager
+    def database_copy(self):
+        """
+        Внутри блока default (и SQLite-реплика) смотрят на временную копию
+        базы. Потоки прогона открывают свои соединения, поэтому откатить их
+        одной транзакцией, как в benchmark_checkout, нельзя. Отдаёт False,
+        если база не SQLite-файл — тогда ничего не подменяется.
+        """
+        default = connections['default']
+        source = default.settings_dict['NAME']
+        if default.vendor != 'sqlite' or default.is_in_memory_db():
+            yield False
+            return
+        aliases = [alias for alias in connections if connections[alias].vendor == 'sqlite']
+        names = {alias: connections[alias].settings_dict['NAME'] for alias in aliases}
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as directory:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            connections.close_all()
+            with sqlite3.connect(source) as src, sqlite3.connect(path) as dst:
+                src.backup(dst)
+                # Режим журнала (WAL у боевой базы) копия не наследует
+                mode = src.execute('PRAGMA journal_mode').fetchone()[0]
+                dst.execute(f'PRAGMA journal_mode={mode}')
+            # settings_dict — общий для соединений всех потоков
+            for alias in aliases:
+                connections[alias].settings_dict['NAME'] = path if alias == 'default' else f"file:{path}?mode=ro"
+            try:
+                yield True
+            finally:
+                connections.close_all()
+                for alias, name in names.items():
+                    connections[alias].settings_dict['NAME'] = name
+
+    def get_user(self, username):
+        try:
+            return CustomUser.objects.get(username=username)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"Нет пользователя {username}.")
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<28} {result['throughput_rps'] or 0:>8} rps  "
+            f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  "
+            f"SQL {result['queries_avg']}  ошибок {result['errors']}"
+        )
+
+    def local_worker(self, user, method, path, data):
+        def make_worker():
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+
+            def request():
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(client, method)(path, data)
+                return benchmark.Sample(queries=len(queries), error=response.status_code >= 400)
+            return request
+        return make_worker
+
+    def http_worker(self, base_url, user, method, path, data):
+        # Сессию создаём прямо в общей БД, CSRF — парой cookie/заголовок
+        session = Client()
+        session.force_login(user)
+        csrf = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
+        headers = {
+            'Cookie': f"sessionid={session.cookies['sessionid'].value}; csrftoken={csrf}",
+            'X-CSRFToken': csrf,
+        }
+        url = base_url.rstrip('/') + path
+        body = urlencode(data).encode() if method == 'post' else None
+
+        def make_worker():
+            opener = urllib.request.build_opener(NoRedirect)
+
+            def request():
+                req = urllib.request.Request(url, data=body, headers=headers, method=method.upper())
+                try:
+                    with opener.open(req) as response:
+                        response.read()
+                        status, timing = response.status, response.headers.get('Server-Timing', '')
+                except urllib.error.HTTPError as e:
+                    status, timing = e.code, e.headers.get('Server-Timing', '')
+                # Число запросов сервер отдаёт в Server-Timing (PerformanceMiddleware)
+                match = SQL_COUNT.search(timing)
+                return benchmark.Sample(queries=int(match.group(1)) if match else None, error=status >= 400)
+            return request
+        return make_worker
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Меряем сам запрос, а не страницу, на которую он перенаправляет
+    def redirect_request(self, *args, **kwargs):
+        return None
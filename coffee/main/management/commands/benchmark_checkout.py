@@ -0,0 +1,96 @@
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main import benchmark, checkout
+from main.models import CustomUser, MenuItem
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер оформления заказа при разных политиках подтверждения (CHECKOUT_CONFIRMATION): "
+        "заказов в секунду и латентность POST order_create. Всё, что создал прогон, откатывается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Логин клиента (по умолчанию — первый из seed_data, user-N)")
+        parser.add_argument('--password', default='benchmark', help="Его пароль")
+        parser.add_argument('--orders', type=int, default=30, help="Заказов на каждую политику")
+        parser.add_argument('--policies', nargs='*', default=['password', 'recent'], choices=checkout.POLICIES)
+        parser.add_argument('--output', help="Куда сохранить результаты (JSON)")
+
+    def handle(self, *args, **options):
+        logging.getLogger('main.perf').setLevel(logging.WARNING)
+        if options['user']:
+            try:
+                user = CustomUser.objects.get(username=options['user'])
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"Нет пользователя {options['user']}.")
+        else:
+            user = benchmark.first_seeded_client()
+            if user is None:
+                raise CommandError("Нет клиентов seed_data — запустите seed_data или укажите --user.")
+        if not user.check_password(options['password']):
+            raise CommandError("Неверный пароль клиента.")
+        item = MenuItem.objects.filter(in_stock=True).only('id').first()
+        if item is None:
+            raise CommandError("В меню нет позиций — сначала запустите seed_data.")
+
+        results = {}
+        try:
+            # Заказы, списания и задачи прогона не должны остаться в БД
+            with transaction.atomic():
+                MenuItem.objects.filter(pk=item.pk).update(stock=10 ** 6)
+                for policy in options['policies']:
+                    with override_settings(CHECKOUT_CONFIRMATION=policy):
+                        results[policy] = self.run(user, options['password'], item.id, options['orders'])
+                    self.report(policy, results[policy])
+                raise Rollback
+        except Rollback:
+            pass
+
+        if 'password' in results and 'recent' in results and results['password']['throughput_rps']:
+            speedup = results['recent']['throughput_rps'] / results['password']['throughput_rps']
+            self.stdout.write(f"recent быстрее password в {speedup:.1f} раза")
+        if options['output']:
+            benchmark.save(options['output'], {
+                'started_at': datetime.now(dt_timezone.utc).isoformat(),
+                'orders': options['orders'],
+                'results': results,
+            })
+            self.stdout.write(f"Сохранено в {options['output']}")
+
+    def run(self, user, password, item_id, orders):
+        client = Client(HTTP_HOST='localhost')
+        # Вход паролем, как у настоящего клиента: он и открывает окно подтверждения
+        client.login(username=user.username, password=password)
+        add_url, order_url = reverse('cart_add', args=[item_id]), reverse('order_create')
+
+        samples = []
+        for _ in range(orders):
+            client.post(add_url)
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(order_url, {'password': password})
+            sample = benchmark.Sample(queries=len(queries), error=not response.json().get('success'))
+            sample.seconds = time.perf_counter() - started
+            samples.append(sample)
+        # Пропускная способность — по времени самих заказов, без наполнения корзины
+        return benchmark.summarize(samples, sum(s.seconds for s in samples))
+
+    def report(self, policy, result):
+        self.stdout.write(
+            f"{policy:<10} {result['throughput_rps'] or 0:>8} заказов/с  "
+            f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  SQL {result['queries_avg']}  "
+            f"ошибок {result['errors']}"
+        )
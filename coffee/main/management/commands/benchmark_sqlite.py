@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import queue
+import random
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from main import reservations
+from main.models import CustomUser, MenuItem
+from main.orders import OutOfStock, place_order
+
+# Стоковый SQLite — как до боевого профиля: журнал DELETE, отложенные транзакции
+STOCK_OPTIONS = {'init_command': 'PRAGMA journal_mode=DELETE'}
+# Сколько (сек) сверх --seconds ждать итогов воркеров
+WORKER_GRACE = 60
+
+
+def _tuned_options():
+    # На боевой базе WAL включает миграция; копии для замера включаем сами
+    options = dict(settings.SQLITE_OPTIONS)
+    options['init_command'] = 'PRAGMA journal_mode=WAL; ' + options['init_command']
+    return options
+
+
+def _worker(role, path, options, seconds, user_id, item_ids, results):
+    # Процесс-потомок: своё соединение к копии базы с нужными настройками.
+    # Итог отправляется всегда, даже если процесс упал: родитель его ждёт
+    ok = locked = failed = 0
+    error = None
+    connection = connections['default']
+    try:
+        connection.close()
+        connection.settings_dict.update({'NAME': path, 'OPTIONS': options, 'CONN_MAX_AGE': None})
+
+        user = CustomUser.objects.get(pk=user_id)
+        owners = [f"bench:{os.getpid()}"]
+        items = list(MenuItem.objects.filter(pk__in=item_ids))
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            try:
+                if role == 'writer':
+                    # Как настоящий клиент: бронь в корзине (чтение, затем запись
+                    # в одной транзакции), потом оформление
+                    item = random.choice(items)
+                    reservations.reserve(owners, item.id, 1)
+                    place_order(user, [{'item': item, 'quantity': 1}], owners)
+                else:
+                    list(MenuItem.objects.filter(in_stock=True).values_list('id', 'price')[:200])
+                ok += 1
+            except OperationalError as e:
+                if 'locked' in str(e) or 'busy' in str(e):
+                    locked += 1
+                else:
+                    failed += 1
+            except OutOfStock:
+                failed += 1
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        try:
+            connection.close()
+        finally:
+            results.put((role, ok, locked, failed, error))
+
+
+class Command(BaseCommand):
+    help = (
+        "Конкуренция за SQLite: несколько процессов-писателей оформляют заказы, "
+        "процессы-читатели читают меню. Сравнивает стоковый и боевой (SQLITE_OPTIONS) профили "
+        "на копии базы: заказов и чтений в секунду и сколько запросов упало с «database is locked»."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--profiles', nargs='*', default=['stock', 'tuned'], choices=['stock', 'tuned'])
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError("Замер только для SQLite.")
+        user = CustomUser.objects.order_by('pk').first()
+        item_ids = list(MenuItem.objects.filter(in_stock=True).values_list('pk', flat=True)[:20])
+        if user is None or not item_ids:
+            raise CommandError("Нужны клиент и позиции в меню — сначала запустите seed_data.")
+
+        source = connections['default'].settings_dict['NAME']
+        profiles = {'stock': ('DELETE', STOCK_OPTIONS), 'tuned': ('WAL', _tuned_options())}
+        for name in options['profiles']:
+            journal_mode, profile = profiles[name]
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.copy(source, path, item_ids, journal_mode)
+                summary = self.run(path, profile, options, user.pk, item_ids)
+            self.report(name, summary, options['seconds'])
+
+    def copy(self, source, path, item_ids, journal_mode):
+        # Заказы прогона пишутся в копию; остатка хватает на весь прогон
+        connections.close_all()
+        with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(path)) as dst:
+            src.backup(dst)
+            with dst:
+                dst.execute(
+                    f"UPDATE main_menuitem SET stock = 1000000000, reserved = 0 "
+                    f"WHERE id IN ({','.join('?' * len(item_ids))})", item_ids,
+                )
+            # Режим журнала меняется только под монопольной блокировкой: ставим его
+            # здесь, до старта воркеров, — их init_command тогда ничего не меняет
+            # и не упирается в «database is locked» при одновременном старте
+            dst.execute(f'PRAGMA journal_mode={journal_mode}')
+
+    def run(self, path, profile, options, user_id, item_ids):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        connections.close_all()
+        processes = [
+            context.Process(target=_worker, args=(role, path, profile, options['seconds'], user_id, item_ids, results))
+            for role in ['writer'] * options['writers'] + ['reader'] * options['readers']
+        ]
+        for process in processes:
+            process.start()
+        summary = {'writer': [0, 0, 0], 'reader': [0, 0, 0]}
+        # Последняя операция воркера может ждать блокировку и после конца прогона
+        deadline = time.monotonic() + options['seconds'] + WORKER_GRACE
+        pending = len(processes)
+        while pending:
+            try:
+                role, *counts, error = results.get(timeout=1)
+            except queue.Empty:
+                # Процесс, убитый до отправки итога (OOM, сигнал), не пришлёт его никогда
+                dead = [process for process in processes if process.exitcode not in (None, 0)]
+                if dead or time.monotonic() > deadline:
+                    for process in processes:
+                        if process.is_alive():
+                            process.terminate()
+                    codes = ', '.join(str(process.exitcode) for process in dead) or "нет"
+                    raise CommandError(f"Воркеры не прислали итог: осталось {pending}, коды выхода упавших — {codes}.")
+                continue
+            pending -= 1
+            if error:
+                self.stderr.write(f"  {role} упал: {error}")
+            summary[role] = [total + count for total, count in zip(summary[role], counts)]
+        for process in processes:
+            process.join()
+        return summary
+
+    def report(self, name, summary, seconds):
+        orders, orders_locked, orders_failed = summary['writer']
+        reads, reads_locked, reads_failed = summary['reader']
+        self.stdout.write(
+            f"{name:<6} заказов {orders / seconds:>8.1f}/с  locked {orders_locked:>5}  ошибок {orders_failed:>3}  |  "
+            f"чтений {reads / seconds:>8.1f}/с  locked {reads_locked:>5}  ошибок {reads_failed:>3}"
+        )
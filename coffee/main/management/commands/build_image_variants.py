@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from main import fragments, images
+from main.models import MenuItem
+from main.templatetags.menu_images import static_storage
+
+STATIC_IMAGES = ['images/slide1.jpg', 'images/slide2.jpg', 'images/slide3.jpg']
+
+
+def _init_worker():
+    # При spawn/forkserver дочерний процесс стартует без настроенного Django
+    if not apps.ready:
+        django.setup()
+
+
+def _build(name, static, force):
+    storage = static_storage() if static else default_storage
+    return name, images.build_variants(name, storage, force=force)
+
+
+class Command(BaseCommand):
+    help = "Нарезает JPEG/WebP-копии для уже загруженных фото меню (и слайдов с --static) в пуле процессов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--static', action='store_true', help="Слайды главной из coffee/static")
+        parser.add_argument('--force', action='store_true', help="Пересоздать существующие копии")
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        if options['static']:
+            names = STATIC_IMAGES
+        else:
+            names = list(
+                MenuItem.objects.exclude(image='').exclude(image__isnull=True)
+                .values_list('image', flat=True).distinct()
+            )
+
+        created = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [pool.submit(_build, name, options['static'], options['force']) for name in names]
+            for future in as_completed(futures):
+                try:
+                    name, count = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"✖ {e}")
+                    continue
+                created += count
+                if count and not options['static']:
+                    # Как и задача image_variants: карточки с картинкой — с новым srcset
+                    fragments.bump_image(name)
+                self.stdout.write(f"✔ {name}: {count} файлов")
+
+        self.stdout.write(f"Готово: {created} файлов, ошибок {failed}")
@@ -0,0 +1,69 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from main.models import MenuItem, Order, OrderItem
+
+# «SCAN таблица» без USING INDEX — полный проход по таблице
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def hot_queries():
+    """Горячие запросы приложения: название → queryset."""
+    now = timezone.now()
+    cursor_at = now - timedelta(days=30)
+    menu = MenuItem.objects.filter(in_stock=True).select_related('category')
+
+    return {
+        'menu': menu.order_by('-created_at'),
+        'menu по категории': menu.filter(category_id=1).order_by('-created_at'),
+        'menu по цене': menu.order_by('price'),
+        'menu по названию': menu.order_by('name'),
+        'корзина': MenuItem.objects.filter(id__in=[1, 2, 3], in_stock=True),
+        'история заказов': Order.objects.filter(client_id=1).order_by('-created_at', '-id')[:21],
+        'история заказов, курсор': Order.objects.filter(client_id=1).filter(
+            Q(created_at__lt=cursor_at) | Q(created_at=cursor_at, id__lt=1000)
+        ).order_by('-created_at', '-id')[:21],
+        'состав заказов': OrderItem.objects.filter(order_id__in=[1, 2, 3]).select_related('menu_item'),
+        'админка: заказы по статусу': Order.objects.filter(status='new').order_by('-created_at', '-id')[:100],
+        'админка: заказы за дату': Order.objects.filter(
+            created_at__gte=now - timedelta(days=1), created_at__lt=now
+        ).order_by('-created_at', '-id')[:100],
+        'бар: активные заказы': Order.objects.filter(status__in=('new', 'pending', 'ready')).order_by('created_at'),
+        'лента изменений заказов': Order.objects.filter(updated_at__gte=now).order_by('updated_at'),
+    }
+
+
+class Command(BaseCommand):
+    help = "Проверяет EXPLAIN QUERY PLAN горячих запросов: падает, если какой-то читает таблицу целиком"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError("Проверка планов написана под SQLite (EXPLAIN QUERY PLAN).")
+
+        failures = []
+        with connection.cursor() as cursor:
+            for name, queryset in hot_queries().items():
+                sql, params = queryset.using(options['database']).query.sql_with_params()
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                scans = [step for step in plan if FULL_SCAN.match(step)]
+
+                if scans:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"✖ {name}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"✔ {name}"))
+                for step in plan:
+                    self.stdout.write(f"    {step}")
+
+        if failures:
+            raise CommandError("Полный проход по таблице: " + ', '.join(failures))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main import catalog_io
+
+
+class Command(BaseCommand):
+    help = "Выгружает каталог в CSV/JSON/JSONL потоком (в файл или stdout)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=catalog_io.FORMATS, default='csv')
+        parser.add_argument('--output', help="Файл; по умолчанию stdout")
+
+    def handle(self, *args, **options):
+        lines = catalog_io.export_lines(catalog_io.export_rows(), options['format'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
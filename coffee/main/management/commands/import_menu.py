@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import catalog_io
+
+
+class Command(BaseCommand):
+    help = "Загружает позиции и категории из CSV/JSON/JSONL пачками (ключ — категория + название)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=catalog_io.FORMATS, help="По умолчанию — по расширению файла")
+        parser.add_argument('--batch-size', type=int, default=catalog_io.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Только проверить, ничего не записывать")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or catalog_io.guess_format(options['path'])
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as f:
+                result = catalog_io.import_catalog(f, fmt, options['batch_size'], options['dry_run'])
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        for number, error in result.errors:
+            self.stderr.write(f"строка {number}: {error}")
+        self.stdout.write(
+            f"{'Проверка' if options['dry_run'] else 'Готово'} за {time.perf_counter() - started:.1f} с: "
+            f"новых {result.created}, обновлено {result.updated}, без изменений {result.unchanged}, "
+            f"новых категорий {result.categories}, ошибок {len(result.errors)}"
+        )
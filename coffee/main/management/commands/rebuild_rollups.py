@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import rollups
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Дата должна быть в формате ГГГГ-ММ-ДД: {value}")
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает сводки продаж по дням из сырых заказов (по умолчанию — за всё время)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=_date, help="Первый день, ГГГГ-ММ-ДД")
+        parser.add_argument('--to', dest='date_to', type=_date, help="Последний день, ГГГГ-ММ-ДД")
+
+    def handle(self, *args, **options):
+        first, last = rollups.date_range()
+        date_from = options['date_from'] or first
+        date_to = options['date_to'] or last
+        if date_from > date_to:
+            raise CommandError("--from позже --to")
+
+        items, categories = rollups.rebuild(date_from, date_to)
+        self.stdout.write(f"{date_from} — {date_to}: строк по позициям {items}, по категориям {categories}")
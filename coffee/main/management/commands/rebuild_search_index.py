@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main import search
+
+
+class Command(BaseCommand):
+    help = "Пересобирает полнотекстовый индекс меню (после массовых правок в обход сигналов)"
+
+    def handle(self, *args, **options):
+        count = search.rebuild()
+        self.stdout.write(f"Проиндексировано позиций: {count}")
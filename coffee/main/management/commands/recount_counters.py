@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main import counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает денормализованные счётчики (строки и штуки в заказах, позиции "
+        "в категориях, заказы и сумма выданных у клиентов) и исправляет разошедшиеся"
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = counters.recount()
+        for name, count in fixed.items():
+            self.stdout.write(f"{name}: исправлено строк {count}")
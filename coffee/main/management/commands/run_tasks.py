@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main import tasks
+
+
+class Command(BaseCommand):
+    help = "Воркер фоновых задач: забирает созревшие задачи пачками и выполняет их"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--sleep', type=float, default=2.0, help="Пауза, когда очередь пуста, секунд")
+        parser.add_argument('--once', action='store_true', help="Выполнить всё созревшее и выйти (для cron и тестов)")
+        parser.add_argument('--worker', default=tasks.worker_name(), help="Имя воркера в locked_by")
+
+    def handle(self, *args, **options):
+        worker = options['worker']
+        self.stdout.write(f"Воркер {worker} запущен")
+        try:
+            while True:
+                close_old_connections()
+                batch = tasks.claim(worker, options['batch_size'])
+                if not batch:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                done, retried, failed = tasks.run_batch(batch)
+                self.stdout.write(f"Пачка {len(batch)}: выполнено {done}, отложено {retried}, ошибок {failed}")
+        except KeyboardInterrupt:
+            self.stdout.write("Остановлен")
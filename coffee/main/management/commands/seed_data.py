@@ -0,0 +1,134 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from main import benchmark, catalog, counters, rollups, search
+from main.models import Category, CustomUser, MenuItem, Order, OrderItem
+
+CATEGORY_NAMES = [
+    'Эспрессо', 'Фильтр', 'Молочные', 'Авторские', 'Чай', 'Какао',
+    'Лимонады', 'Смузи', 'Выпечка', 'Десерты', 'Завтраки', 'Сэндвичи',
+]
+WORDS = [
+    'кофе', 'молоко', 'карамель', 'ваниль', 'корица', 'мёд', 'апельсин', 'миндаль',
+    'кокос', 'фисташка', 'шоколад', 'малина', 'лаванда', 'имбирь', 'мята', 'сливки',
+]
+STATUSES = [code for code, _ in Order.STATUS_CHOICES]
+
+
+class Command(BaseCommand):
+    help = "Заполняет БД синтетическими данными для нагрузочных тестов (bulk insert пачками)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--max-lines', type=int, default=5, help="Максимум позиций в заказе")
+        parser.add_argument('--days', type=int, default=365, help="За сколько дней раскидать заказы")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        categories = self.seed_categories()
+        items = self.seed_items(categories, options['items'])
+        users = self.seed_users(options['users'])
+        self.seed_orders(users, items, options['orders'], options['max_lines'], options['days'])
+
+        # bulk_create идёт в обход сигналов: индекс, сводки и снимок каталога — вручную
+        self.log(f"Поисковый индекс: {search.rebuild()}")
+        self.log("Сводки продаж: строк по позициям {}, по категориям {}".format(*rollups.rebuild(*rollups.date_range())))
+        self.log("Счётчики: " + ", ".join(f"{name} {count}" for name, count in counters.recount().items()))
+        catalog.bump_version()
+
+    def log(self, message):
+        self.stdout.write(message)
+        self.stdout.flush()
+
+    def seed_categories(self):
+        Category.objects.bulk_create(
+            [Category(name=name) for name in CATEGORY_NAMES], ignore_conflicts=True
+        )
+        return list(Category.objects.filter(name__in=CATEGORY_NAMES))
+
+    def seed_items(self, categories, count):
+        start = MenuItem.objects.count()
+        batch = []
+        for n in range(start, start + count):
+            words = self.rng.sample(WORDS, 3)
+            batch.append(MenuItem(
+                name=f"{words[0].capitalize()} {words[1]} №{n}",
+                category=self.rng.choice(categories),
+                price=Decimal(self.rng.randrange(90, 650, 10)),
+                description=' '.join(self.rng.choices(WORDS, k=self.rng.randint(8, 40))),
+                stock=self.rng.randint(0, 999),
+                in_stock=self.rng.random() > 0.05,
+                volume_ml=self.rng.choice([None, 200, 300, 400]),
+                calories=self.rng.choice([None, self.rng.randint(50, 600)]),
+                is_vegan=self.rng.random() < 0.2,
+            ))
+        MenuItem.objects.bulk_create(batch, batch_size=self.batch_size)
+        self.log(f"Позиций меню: +{count}")
+        return list(MenuItem.objects.values_list('id', 'price'))
+
+    def seed_users(self, count):
+        # Хэш один на всех: PBKDF2 на каждого пользователя занял бы часы
+        password = make_password('benchmark')
+        # Продолжаем нумерацию user-N: по числу пользователей нельзя — есть и
+        # не сгенерированные, и номер совпал бы с уже занятым логином
+        last = benchmark.last_seed_number()
+        start = 0 if last is None else last + 1
+        for offset in range(0, count, self.batch_size):
+            CustomUser.objects.bulk_create([
+                CustomUser(
+                    username=f"{benchmark.SEEDED_PREFIX}{n}",
+                    email=f"{benchmark.SEEDED_PREFIX}{n}@example.com",
+                    name='Иван',
+                    surname='Тестов',
+                    password=password,
+                )
+                for n in range(start + offset, start + min(offset + self.batch_size, count))
+            ])
+            self.log(f"Пользователи: {min(offset + self.batch_size, count)}/{count}")
+        return list(benchmark.seeded_clients().values_list('id', flat=True))
+
+    def seed_orders(self, users, items, count, max_lines, days):
+        now = timezone.now()
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            with transaction.atomic():
+                orders = []
+                lines = []
+                for _ in range(size):
+                    picked = self.rng.sample(items, self.rng.randint(1, max_lines))
+                    quantities = [self.rng.randint(1, 3) for _ in picked]
+                    orders.append(Order(
+                        client_id=self.rng.choice(users),
+                        total=sum(price * qty for (_, price), qty in zip(picked, quantities)),
+                        status=self.rng.choices(STATUSES, weights=[2, 2, 2, 90, 4])[0],
+                    ))
+                    lines.append(list(zip(picked, quantities)))
+
+                # bulk_create возвращает id на SQLite/PostgreSQL
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order_id=order.id, menu_item_id=item_id, quantity=qty, price_per_unit=price)
+                    for order, order_lines in zip(orders, lines)
+                    for (item_id, price), qty in order_lines
+                ], batch_size=self.batch_size)
+
+                # created_at — auto_now_add, поэтому даты раскидываем отдельным UPDATE
+                for order in orders:
+                    order.created_at = now - timedelta(seconds=self.rng.randint(0, days * 86400))
+                Order.objects.bulk_update(orders, ['created_at'], batch_size=self.batch_size)
+
+            created += size
+            self.log(f"Заказы: {created}/{count}")
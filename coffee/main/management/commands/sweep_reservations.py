@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from main import reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Снимает истёкшие брони остатков из корзин и возвращает их в продажу. "
+        "Запускать по cron, например раз в минуту"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released = reservations.sweep(options['batch_size'])
+        self.stdout.write(f"Снято истёкших броней: {released}")
@@ -0,0 +1,178 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from coffee import db_router
+from coffee.cart import OWNER_COOKIE, get_storage
+
+from . import perf
+
+logger = logging.getLogger('main.perf')
+
+
+class PerformanceMiddleware:
+    """
+    Замеры на каждый запрос: SQL (число, время, дубли), рендер шаблонов,
+    загрузка/сохранение сессии. Отдаются заголовком Server-Timing, строкой
+    JSON в лог main.perf и копятся по view для admin/performance/.
+
+    Ставится до SessionMiddleware, чтобы сохранение сессии попало в замер.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        perf.install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        stats = perf.RequestStats()
+        token = perf.current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            perf.current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = perf.RequestStats()
+        token = perf.current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            perf.current.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def finish(self, request, response, stats, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else request.path
+        perf.view_stats.record(view, total, stats)
+
+        if getattr(settings, 'PERF_SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(stats, total)
+        if getattr(settings, 'PERF_LOG', False) and logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'view': view,
+                'method': request.method,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                'sql_count': stats.sql_count,
+                'sql_ms': round(stats.sql_time * 1000, 2),
+                'sql_duplicates': stats.sql_duplicates,
+                'template_ms': round(stats.template_time * 1000, 2),
+                'session_ms': round(stats.session_time * 1000, 2),
+            }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = perf.current.get()
+        session = getattr(request, 'session', None)
+        if stats is not None and session is not None:
+            session.load = stats.timed_session(session.load)
+            session.save = stats.timed_session(session.save)
+
+
+def server_timing(stats, total):
+    return ', '.join([
+        f'sql;dur={stats.sql_time * 1000:.2f};desc="{stats.sql_count} queries, {stats.sql_duplicates} dup"',
+        f'tpl;dur={stats.template_time * 1000:.2f}',
+        f'session;dur={stats.session_time * 1000:.2f}',
+        f'total;dur={total * 1000:.2f}',
+    ])
+
+
+class CartMiddleware:
+    """
+    Даёт хранилищу корзины (CART_STORAGE) записать в ответ свою cookie
+    и выдаёт гостю cookie с токеном владельца корзины, если он появился.
+
+    Гибридный, как PerformanceMiddleware: под ASGI цепочка до async-view
+    (стрим order_events) не прыгает между потоками. process_response
+    хранилищ только ставит cookie, в БД не ходит.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.finish(request, await self.get_response(request))
+
+    def finish(self, request, response):
+        token = getattr(request, '_cart_owner', None)
+        if token and request.COOKIES.get(OWNER_COOKIE) != token:
+            response.set_cookie(
+                OWNER_COOKIE, token, max_age=getattr(settings, 'CART_COOKIE_AGE', 60 * 60 * 24 * 30),
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return get_storage().process_response(request, response)
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Включает чтение из реплики (coffee/db_router.py) для GET к страницам
+    из REPLICA_VIEWS. После собственной записи клиент на REPLICA_STICKY_SECONDS
+    получает cookie, и его чтения идут в основную базу — он сразу видит
+    свой заказ или изменения, даже если реплика отстаёт.
+
+    Гибридный: состояние роутера — contextvars, они одинаково работают
+    и в потоке, и в корутине.
+    """
+    cookie_name = 'db_primary'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Реплику включает process_view; на выходе состояние сбрасывается
+        with db_router.replica_reads(False), db_router.track_writes() as wrote:
+            response = self.get_response(request)
+        return self.finish(request, response, wrote)
+
+    async def __acall__(self, request):
+        with db_router.replica_reads(False), db_router.track_writes() as wrote:
+            response = await self.get_response(request)
+        return self.finish(request, response, wrote)
+
+    def finish(self, request, response, wrote):
+        if wrote and db_router.read_alias():
+            response.set_cookie(
+                self.cookie_name, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ('GET', 'HEAD')
+            and self.cookie_name not in request.COOKIES
+            and db_router.is_replica_view(request.resolver_match.view_name)
+        ):
+            db_router.allow_replica_reads()
@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 13:00
+
+from django.db import migrations
+
+# Схема и заполнение — здесь, а не из main/search.py: миграция должна
+# применяться одинаково, как бы ни менялся живой код. Текст кладётся как
+# есть; основы слов считает стеммер из main/search.py — индекс пересобирается
+# им сразу после миграции (stem_search_index в main/signals.py)
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS main_menuitem_search USING fts5("
+    "name, description, category, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+)
+POPULATE_SQL = (
+    "INSERT INTO main_menuitem_search (rowid, name, description, category) "
+    "SELECT item.id, item.name, item.description, COALESCE(category.name, '') "
+    "FROM main_menuitem item LEFT JOIN main_category category ON category.id = item.category_id"
+)
+DROP_SQL = "DROP TABLE IF EXISTS main_menuitem_search"
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других СУБД поиск идёт через icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(POPULATE_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_savedcart'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
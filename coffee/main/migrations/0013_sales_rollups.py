@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_menuitem_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('units', models.IntegerField(default=0, verbose_name='Продано, шт')),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('cancelled_orders', models.IntegerField(default=0, verbose_name='Отменено заказов')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Продажи категории за день',
+                'verbose_name_plural': 'Продажи категорий по дням',
+                'constraints': [models.UniqueConstraint(fields=('date', 'category'), name='dailycategorysales_date_category')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('units', models.IntegerField(default=0, verbose_name='Продано, шт')),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('cancelled_orders', models.IntegerField(default=0, verbose_name='Отменено заказов')),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.menuitem', verbose_name='Позиция')),
+            ],
+            options={
+                'verbose_name': 'Продажи позиции за день',
+                'verbose_name_plural': 'Продажи позиций по дням',
+                'constraints': [models.UniqueConstraint(fields=('date', 'menu_item'), name='dailyitemsales_date_item')],
+            },
+        ),
+    ]
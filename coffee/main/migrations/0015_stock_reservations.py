@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_task_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, verbose_name='В резерве'),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.CharField(max_length=64, verbose_name='Владелец корзины')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('expires_at', models.DateTimeField(verbose_name='Истекает')),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.menuitem', verbose_name='Позиция')),
+            ],
+            options={
+                'verbose_name': 'Бронь',
+                'verbose_name_plural': 'Брони',
+                'indexes': [models.Index(fields=['expires_at'], name='reservation_expires'), models.Index(fields=['menu_item', 'expires_at'], name='reservation_item_expires')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'menu_item'), name='reservation_owner_item')],
+            },
+        ),
+    ]
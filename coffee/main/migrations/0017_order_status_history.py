@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('new', 'Новый'), ('pending', 'Принят'), ('ready', 'Готов'), ('completed', 'Выдан'), ('cancelled', 'Отменён')], max_length=20, verbose_name='Был')),
+                ('to_status', models.CharField(choices=[('new', 'Новый'), ('pending', 'Принят'), ('ready', 'Готов'), ('completed', 'Выдан'), ('cancelled', 'Отменён')], max_length=20, verbose_name='Стал')),
+                ('reason', models.TextField(blank=True, verbose_name='Причина')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Когда')),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Кто изменил')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_history', to='main.order', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Смена статуса',
+                'verbose_name_plural': 'История статусов',
+                'indexes': [models.Index(fields=['order', 'created_at'], name='status_history_order')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 6.0 on 2026-10-18 19:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def _aggregate(queryset, key, aggregate, output_field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{key: OuterRef('pk')}).order_by().values(key)
+            .annotate(value=aggregate).values('value')[:1]
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    # Копия main.counters.recount на момент миграции: живой код может
+    # разойтись с этой схемой
+    using = schema_editor.connection.alias
+    Order = apps.get_model('main', 'Order')
+    lines = apps.get_model('main', 'OrderItem').objects.using(using)
+    items = apps.get_model('main', 'MenuItem').objects.using(using)
+    orders = Order.objects.using(using)
+    orders.update(
+        line_count=_aggregate(lines, 'order', Count('id'), models.IntegerField()),
+        unit_count=_aggregate(lines, 'order', Sum('quantity'), models.IntegerField()),
+    )
+    apps.get_model('main', 'Category').objects.using(using).update(
+        item_count=_aggregate(items, 'category', Count('id'), models.IntegerField()),
+    )
+    apps.get_model('main', 'CustomUser').objects.using(using).update(
+        order_count=_aggregate(orders, 'client', Count('id'), models.IntegerField()),
+        total_spent=_aggregate(
+            orders, 'client', Sum('total', filter=Q(status='completed')),
+            models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_order_status_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Товаров'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Заказов'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='total_spent',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Потрачено'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Позиций'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='unit_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Штук'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 21:00
+
+from django.conf import settings
+from django.db import migrations
+
+
+def set_journal_mode(mode):
+    # Режим журнала хранится в самом файле базы — включаем его один раз здесь,
+    # а не в init_command каждого соединения (тот переписывал бы файл и при
+    # manage.py check). В транзакции режим не меняется — миграция не атомарна.
+    def apply(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            return
+        if mode == 'wal' and not getattr(settings, 'SQLITE_TUNED', False):
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0] != mode:
+                cursor.execute(f'PRAGMA journal_mode={mode}')
+    return apply
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('main', '0019_cache_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_journal_mode('wal'), set_journal_mode('delete')),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 import re
+from django.utils import timezone
 
 class CustomUser(AbstractUser):
     # Валидаторы
@@ -36,6 +37,10 @@ class CustomUser(AbstractUser):
     )
     
     email = models.EmailField('Email', unique=True)
+
+    # Счётчики для профиля и админки — ведутся F()-обновлениями (main/counters.py)
+    order_count = models.PositiveIntegerField('Заказов', default=0, editable=False)
+    total_spent = models.DecimalField('Потрачено', max_digits=12, decimal_places=2, default=0, editable=False)
     
     # Отключаем старые поля
     first_name = None
@@ -47,6 +52,10 @@ class CustomUser(AbstractUser):
         return f"{self.surname} {self.name} {self.patronymic}".strip() or self.username
 class Category(models.Model):
     name = models.CharField("Название", max_length=100, unique=True)
+    # Для ETag/Last-Modified страниц каталога
+    updated_at = models.DateTimeField("Изменено", auto_now=True)
+    # Позиций в категории (main/counters.py)
+    item_count = models.PositiveIntegerField("Товаров", default=0, editable=False)
 
     def __str__(self):
             return self.name
@@ -68,6 +77,8 @@ class MenuItem(models.Model):
     
     #когда добавили
     created_at = models.DateTimeField("Добавлено", auto_now_add=True)
+    # когда меняли (ETag/Last-Modified каталога); массовые UPDATE ставят его сами
+    updated_at = models.DateTimeField("Изменено", auto_now=True)
     
     # git add .в наличии ли?
     in_stock = models.BooleanField("В наличии", default=True)
@@ -75,19 +86,35 @@ class MenuItem(models.Model):
     # фото
     image = models.ImageField("Фото", upload_to="menu/", blank=True, null=True)
     stock = models.PositiveIntegerField("Остаток", default=999)  # 999 = "много"
+    # Сколько из остатка держат корзины (сумма активных StockReservation,
+    # ведётся через F()-обновления в main/reservations.py)
+    reserved = models.PositiveIntegerField("В резерве", default=0)
     volume_ml = models.PositiveSmallIntegerField("Объём, мл", blank=True, null=True)
     calories = models.PositiveSmallIntegerField("Калории, ккал", blank=True, null=True)
     is_vegan = models.BooleanField("Веганский", default=False, blank=True)
-    # Метод: сколько можно добавить в корзину
+    @property
+    def available(self):
+        return max(0, self.stock - self.reserved)
+
+    # Метод: сколько можно добавить в корзину (своя бронь уже входит в reserved)
     def max_addable(self, already_in_cart=0):
         if not self.in_stock:
             return 0
-        return max(0, self.stock - already_in_cart)
+        return max(0, self.available - already_in_cart)
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['-created_at']  # новые — первыми
+        # Меню читает только позиции в наличии, поэтому индексы частичные:
+        # Django пишет фильтр как WHERE "in_stock", и по составному индексу
+        # (in_stock, ...) SQLite искать не умеет, а частичный подхватывает.
+        indexes = [
+            models.Index(fields=['category', '-created_at'], condition=models.Q(in_stock=True), name='menuitem_cat_created_live'),
+            models.Index(fields=['-created_at'], condition=models.Q(in_stock=True), name='menuitem_created_live'),
+            models.Index(fields=['price'], condition=models.Q(in_stock=True), name='menuitem_price_live'),
+            models.Index(fields=['name'], condition=models.Q(in_stock=True), name='menuitem_name_live'),
+        ]
     
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -102,10 +129,24 @@ class Order(models.Model):
     total = models.DecimalField("Итого", max_digits=8, decimal_places=2, default=0)
     status = models.CharField("Статус", max_length=20, choices=STATUS_CHOICES, default='new')
     cancellation_reason = models.TextField("Причина отмены", blank=True)
+    # по нему лента изменений (main/events.py) находит свежие заказы
+    updated_at = models.DateTimeField("Изменён", auto_now=True, db_index=True)
+    # Строк и штук в заказе (main/counters.py)
+    line_count = models.PositiveIntegerField("Позиций", default=0, editable=False)
+    unit_count = models.PositiveIntegerField("Штук", default=0, editable=False)
 
     def __str__(self):
         return f"Заказ #{self.id} от {self.created_at.strftime('%d.%m %H:%M')}"
 
+    class Meta:
+        indexes = [
+            # История клиента: keyset по (created_at, id)
+            models.Index(fields=['client', '-created_at', '-id'], name='order_client_created'),
+            # Админка и бар: фильтр по статусу и дате
+            models.Index(fields=['status', 'created_at'], name='order_status_created'),
+            models.Index(fields=['created_at'], name='order_created'),
+        ]
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
@@ -119,3 +160,149 @@ class OrderItem(models.Model):
     )
     def __str__(self):
         return f"{self.quantity}× {self.menu_item.name}"
+
+    class Meta:
+        indexes = [
+            # Состав заказа сразу с товаром — без обращения к таблице
+            models.Index(fields=['order', 'menu_item'], name='orderitem_order_menuitem'),
+        ]
+
+
+class OrderStatusHistory(models.Model):
+    """Журнал смены статусов заказа: строки только добавляются (main/order_status.py)."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history', verbose_name="Заказ")
+    from_status = models.CharField("Был", max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField("Стал", max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Кто изменил",
+    )
+    reason = models.TextField("Причина", blank=True)
+    created_at = models.DateTimeField("Когда", auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.order_id}: {self.from_status} → {self.to_status}"
+
+    class Meta:
+        verbose_name = "Смена статуса"
+        verbose_name_plural = "История статусов"
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='status_history_order'),
+        ]
+
+
+class SavedCart(models.Model):
+    """Копия корзины клиента в БД для кэш-хранилища корзин (пишется пачками, см. coffee/cart.py)."""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='saved_cart', verbose_name="Клиент")
+    items = models.JSONField("Позиции", default=dict)  # {id позиции: количество}
+    updated_at = models.DateTimeField("Изменена", auto_now=True)
+
+    class Meta:
+        verbose_name = "Сохранённая корзина"
+        verbose_name_plural = "Сохранённые корзины"
+
+
+# Сводки продаж по дням (main/rollups.py). Считаются только выданные заказы;
+# отменённые — отдельным счётчиком. День — дата создания заказа.
+class DailyItemSales(models.Model):
+    date = models.DateField("День")
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, verbose_name="Позиция")
+    revenue = models.DecimalField("Выручка", max_digits=12, decimal_places=2, default=0)
+    units = models.IntegerField("Продано, шт", default=0)
+    orders = models.IntegerField("Заказов", default=0)
+    cancelled_orders = models.IntegerField("Отменено заказов", default=0)
+
+    class Meta:
+        verbose_name = "Продажи позиции за день"
+        verbose_name_plural = "Продажи позиций по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'menu_item'], name='dailyitemsales_date_item'),
+        ]
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField("День")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name="Категория")
+    revenue = models.DecimalField("Выручка", max_digits=12, decimal_places=2, default=0)
+    units = models.IntegerField("Продано, шт", default=0)
+    orders = models.IntegerField("Заказов", default=0)
+    cancelled_orders = models.IntegerField("Отменено заказов", default=0)
+
+    class Meta:
+        verbose_name = "Продажи категории за день"
+        verbose_name_plural = "Продажи категорий по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='dailycategorysales_date_category'),
+        ]
+
+
+class Task(models.Model):
+    """
+    Фоновая задача (outbox). Ставится в той же транзакции, что и данные,
+    выполняется воркером manage.py run_tasks — см. main/tasks.py.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнена'),
+        ('failed', 'Ошибка'),
+    ]
+    name = models.CharField("Задача", max_length=100)
+    payload = models.JSONField("Параметры", default=dict)
+    status = models.CharField("Статус", max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField("Попыток", default=0)
+    max_attempts = models.PositiveSmallIntegerField("Максимум попыток", default=5)
+    run_after = models.DateTimeField("Не раньше", default=timezone.now)
+    locked_by = models.CharField("Воркер", max_length=100, blank=True)
+    locked_until = models.DateTimeField("Занята до", null=True, blank=True)
+    last_error = models.TextField("Последняя ошибка", blank=True)
+    created_at = models.DateTimeField("Создана", auto_now_add=True)
+    finished_at = models.DateTimeField("Завершена", null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            # Воркер берёт созревшие задачи из очереди по порядку run_after
+            models.Index(fields=['status', 'run_after'], name='task_status_run_after'),
+        ]
+
+
+class StockReservation(models.Model):
+    """Бронь позиции корзиной на время (main/reservations.py)."""
+    owner = models.CharField("Владелец корзины", max_length=64)  # user:<id> или guest:<токен>
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, verbose_name="Позиция")
+    quantity = models.PositiveIntegerField("Количество")
+    expires_at = models.DateTimeField("Истекает")
+
+    class Meta:
+        verbose_name = "Бронь"
+        verbose_name_plural = "Брони"
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'menu_item'], name='reservation_owner_item'),
+        ]
+        indexes = [
+            # Чистильщик выбирает истёкшие брони по диапазону времени
+            models.Index(fields=['expires_at'], name='reservation_expires'),
+            # Истёкшие брони конкретной позиции — когда её не хватает
+            models.Index(fields=['menu_item', 'expires_at'], name='reservation_item_expires'),
+        ]
+
+
+class CacheVersion(models.Model):
+    """
+    Версии кэша (каталог, фрагменты позиций) — в БД, чтобы их видели все
+    процессы: веб-воркеры, run_tasks, команды импорта. См. main/versions.py.
+    """
+    name = models.CharField("Ключ", max_length=100, primary_key=True)
+    version = models.BigIntegerField("Версия")
+
+    class Meta:
+        verbose_name = "Версия кэша"
+        verbose_name_plural = "Версии кэша"
+        indexes = [
+            # Процесс догоняет чужие изменения: всё, что новее виденного
+            models.Index(fields=['version'], name='cacheversion_version'),
+        ]
@@ -0,0 +1,113 @@
+"""
+Выгрузка заказов с позициями для бухгалтерии (CSV и JSON Lines).
+
+Заказы читаются серверным итератором (values_list().iterator()) и
+копятся кусками; позиции подтягиваются одним запросом на кусок. Строки
+отдаются генератором, поэтому память не растёт с объёмом выгрузки.
+Первый кусок маленький, чтобы первые байты ушли клиенту сразу.
+Модели не создаются вовсе: на миллионах строк это главный расход времени.
+"""
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from .catalog_io import Echo
+from .models import Order, OrderItem
+
+FORMATS = ('csv', 'jsonl')
+CHUNK_SIZE = 2000
+FIRST_CHUNK_SIZE = 100
+
+CSV_COLUMNS = [
+    'order_id', 'created_at', 'status', 'client_id', 'client_username', 'client_fio', 'order_total',
+    'menu_item_id', 'menu_item_name', 'quantity', 'price_per_unit', 'line_total',
+]
+ORDER_FIELDS = (
+    'id', 'created_at', 'status', 'client_id', 'client__username',
+    'client__surname', 'client__name', 'client__patronymic', 'total',
+)
+
+
+def orders(date_from=None, date_to=None, statuses=None):
+    """Заказы за дни [date_from, date_to] (включительно), по времени создания."""
+    tz = timezone.get_current_timezone()
+    queryset = Order.objects.all()
+    if date_from:
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min), tz))
+    if date_to:
+        queryset = queryset.filter(
+            created_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min), tz)
+        )
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset.order_by('created_at', 'id')
+
+
+def chunks(queryset, chunk_size=CHUNK_SIZE):
+    """Куски [(заказ, [позиции])]: заказ — кортеж ORDER_FIELDS, позиция — (id, название, кол-во, цена)."""
+    buffer = []
+    limit = min(FIRST_CHUNK_SIZE, chunk_size)
+    for row in queryset.values_list(*ORDER_FIELDS).iterator(chunk_size=chunk_size):
+        buffer.append(row)
+        if len(buffer) >= limit:
+            yield _with_lines(buffer)
+            buffer = []
+            limit = chunk_size
+    if buffer:
+        yield _with_lines(buffer)
+
+
+def _with_lines(orders):
+    lines = defaultdict(list)
+    rows = OrderItem.objects.filter(order_id__in=[order[0] for order in orders]).order_by('order_id', 'id')
+    for order_id, *line in rows.values_list(
+        'order_id', 'menu_item_id', F('menu_item__name'), 'quantity', 'price_per_unit'
+    ):
+        lines[order_id].append(line)
+    return [(order, lines[order[0]]) for order in orders]
+
+
+def _fio(surname, name, patronymic):
+    return ' '.join(part for part in (surname, name, patronymic) if part)
+
+
+def export_lines(queryset, fmt='csv', chunk_size=CHUNK_SIZE):
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(CSV_COLUMNS)
+        for chunk in chunks(queryset, chunk_size):
+            out = []
+            for (order_id, created_at, status, client_id, username, *fio, total), lines in chunk:
+                head = [order_id, created_at.isoformat(), status, client_id or '', username or '', _fio(*fio), total]
+                # Одна строка на позицию; заказ без позиций — одна строка без них
+                for item_id, name, quantity, price in lines:
+                    out.append(writer.writerow(head + [item_id, name, quantity, price, quantity * price]))
+                if not lines:
+                    out.append(writer.writerow(head + [''] * 5))
+            yield ''.join(out)
+    else:
+        for chunk in chunks(queryset, chunk_size):
+            yield ''.join(
+                json.dumps({
+                    'id': order_id,
+                    'created_at': created_at.isoformat(),
+                    'status': status,
+                    'client': client_id and {'id': client_id, 'username': username, 'fio': _fio(*fio)},
+                    'total': str(total),
+                    'items': [
+                        {
+                            'menu_item_id': item_id,
+                            'name': name,
+                            'quantity': quantity,
+                            'price_per_unit': str(price),
+                            'total': str(quantity * price),
+                        }
+                        for item_id, name, quantity, price in lines
+                    ],
+                }, ensure_ascii=False) + '\n'
+                for (order_id, created_at, status, client_id, username, *fio, total), lines in chunk
+            )
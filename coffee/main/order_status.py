@@ -0,0 +1,73 @@
+"""
+Статусы заказа как конечный автомат и массовые переходы.
+
+Разрешённые переходы — TRANSITIONS. transition() переводит пачку заказов
+одним условным UPDATE: строки не в том исходном статусе не меняются и
+не попадают в результат. В той же транзакции одним bulk-insert'ом
+пишется журнал OrderStatusHistory, обновляются сводки продаж и счётчики
+клиентов, ставятся уведомления, отменённые заказы возвращают остатки на
+склад — то, что при сохранении одного заказа делают сигналы
+(main/signals.py), которые UPDATE не вызывает.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, orders, rollups, tasks
+from .models import Order, OrderStatusHistory
+
+TRANSITIONS = {
+    'new': {'pending', 'cancelled'},
+    'pending': {'ready', 'cancelled'},
+    'ready': {'completed', 'cancelled'},
+    'completed': set(),
+    'cancelled': set(),
+}
+
+
+def can_transition(old_status, new_status):
+    return old_status == new_status or new_status in TRANSITIONS.get(old_status, ())
+
+
+def sources(new_status):
+    """Статусы, из которых можно перейти в new_status."""
+    return [status for status, targets in TRANSITIONS.items() if new_status in targets]
+
+
+def transition(order_ids, new_status, user=None, reason=''):
+    """Переводит заказы в new_status; возвращает id тех, что действительно перешли."""
+    allowed = sources(new_status)
+    with transaction.atomic():
+        # Старые статусы нужны журналу и сводкам; блокировка — чтобы они
+        # не поменялись до UPDATE (на SQLite её даёт BEGIN IMMEDIATE)
+        rows = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status__in=allowed)
+            .values_list('id', 'status', 'created_at', 'client_id', 'total')
+        )
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+
+        fields = {'status': new_status, 'updated_at': timezone.now()}
+        if new_status == 'cancelled':
+            fields['cancellation_reason'] = reason
+        Order.objects.filter(pk__in=ids, status__in=allowed).update(**fields)
+
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(
+                order_id=order_id, from_status=old_status, to_status=new_status, changed_by=user, reason=reason,
+            )
+            for order_id, old_status, *_ in rows
+        ])
+        rollups.apply_transitions([
+            (order_id, created_at, old_status, new_status) for order_id, old_status, created_at, *_ in rows
+        ])
+        counters.add_client_orders([
+            (client_id, 0, counters.spent(new_status, total) - counters.spent(old_status, total))
+            for _, old_status, _, client_id, total in rows
+        ])
+        if new_status == 'cancelled':
+            orders.return_stock(ids)
+        if new_status == 'ready':
+            tasks.enqueue_many('order_ready', [{'order_id': order_id} for order_id in ids])
+    return ids
@@ -0,0 +1,179 @@
+"""
+Оформление заказа.
+
+Весь заказ — одна транзакция: условное списание остатков одним UPDATE,
+создание Order и всех OrderItem одним bulk-insert'ом, письмо-подтверждение
+в очередь фоновых задач. Если хотя бы одной позиции не хватает,
+транзакция откатывается целиком.
+
+Отменённый заказ и удалённый невыданный возвращают списанное на склад
+(return_stock) тем же относительным UPDATE.
+"""
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from . import catalog, fragments, reservations, tasks
+from .models import MenuItem, Order, OrderItem
+
+
+class OutOfStock(Exception):
+    """Каких-то позиций не хватает на складе (или их сняли с продажи)."""
+
+    def __init__(self, names):
+        self.names = names
+        super().__init__(', '.join(names))
+
+
+def _write_off_stock(quantities, held=None):
+    # Строка обновляется, только если остатка хватает; в том же UPDATE
+    # позиция снимается с продажи, когда остаток доходит до нуля.
+    # Выражения в SET видят старые значения, поэтому stock=qty значит «станет 0».
+    # Своя бронь (held) превращается в продажу: она уже вычтена из
+    # свободного остатка, поэтому ей нужно только уйти из reserved.
+    held = held or {}
+    now = timezone.now()
+    enough = Q()
+    for item_id, quantity in quantities.items():
+        enough |= Q(pk=item_id, stock__gte=F('reserved') + (quantity - held.get(item_id, 0)))
+
+    return MenuItem.objects.filter(enough, in_stock=True).update(
+        reserved=Case(
+            *[When(pk=item_id, then=F('reserved') - quantity) for item_id, quantity in held.items()],
+            default=F('reserved'),
+            output_field=models.PositiveIntegerField(),
+        ),
+        stock=Case(
+            *[When(pk=item_id, then=F('stock') - quantity) for item_id, quantity in quantities.items()],
+            default=F('stock'),
+            output_field=models.PositiveIntegerField(),
+        ),
+        in_stock=Case(
+            *[When(pk=item_id, stock=quantity, then=Value(False)) for item_id, quantity in quantities.items()],
+            default=F('in_stock'),
+            output_field=models.BooleanField(),
+        ),
+        # Снятая с продажи позиция меняет меню — для ETag/Last-Modified
+        updated_at=Case(
+            *[When(pk=item_id, stock=quantity, then=Value(now)) for item_id, quantity in quantities.items()],
+            default=F('updated_at'),
+            output_field=models.DateTimeField(),
+        ),
+    )
+
+
+def return_stock(order_ids, using=None):
+    """
+    Возвращает на склад всё, что списали заказы (отмена, удаление невыданного):
+    одним UPDATE по позициям. Позиция, которую продажа сняла с продажи
+    (остаток дошёл до нуля), снова в наличии — как обратный шаг _write_off_stock.
+    """
+    quantities = dict(
+        OrderItem.objects.using(using).filter(order_id__in=order_ids)
+        .values('menu_item_id').annotate(quantity=Sum('quantity')).order_by()
+        .values_list('menu_item_id', 'quantity')
+    )
+    if not quantities:
+        return
+    items = MenuItem.objects.using(using).filter(pk__in=quantities.keys())
+    with transaction.atomic(using=using):
+        restocked = list(items.filter(stock=0, in_stock=False).values_list('id', flat=True))
+        now = timezone.now()
+        items.update(
+            stock=Case(
+                *[When(pk=item_id, then=F('stock') + quantity) for item_id, quantity in quantities.items()],
+                default=F('stock'),
+                output_field=models.PositiveIntegerField(),
+            ),
+            in_stock=Case(
+                When(pk__in=restocked, then=Value(True)),
+                default=F('in_stock'),
+                output_field=models.BooleanField(),
+            ),
+            updated_at=Case(
+                When(pk__in=restocked, then=Value(now)),
+                default=F('updated_at'),
+                output_field=models.DateTimeField(),
+            ),
+        )
+        if restocked:
+            # Позиция вернулась в меню — меню и её страницу нужно пересобрать
+            catalog.bump_version_on_commit()
+            fragments.bump_on_commit(restocked)
+
+
+def _shortages(quantities, held=None):
+    held = held or {}
+    items = MenuItem.objects.filter(pk__in=quantities.keys()).values_list('id', 'name', 'stock', 'reserved', 'in_stock')
+    found = {
+        item_id: (name, stock - reserved + held.get(item_id, 0), in_stock)
+        for item_id, name, stock, reserved, in_stock in items
+    }
+    names = []
+    for item_id, quantity in quantities.items():
+        if item_id not in found:
+            names.append(f"#{item_id}")
+            continue
+        name, stock, in_stock = found[item_id]
+        if not in_stock or stock < quantity:
+            names.append(name)
+    return names
+
+
+def place_order(client, cart, owners=()):
+    """
+    Создаёт заказ по корзине и списывает остатки; брони владельцев
+    корзины (owners) превращаются в продажу. Бросает OutOfStock.
+    """
+    quantities = {line['item'].id: line['quantity'] for line in cart}
+    if not quantities:
+        raise OutOfStock([])
+
+    with transaction.atomic():
+        # Сначала пишем: так транзакция сразу берёт блокировку на запись
+        # и параллельный заказ не сможет продать те же остатки.
+        # Бронь больше корзины не засчитываем — лишнее снимется ниже.
+        held = {
+            item_id: min(quantity, quantities[item_id])
+            for item_id, quantity in reservations.held(owners, quantities.keys()).items()
+        }
+        if _write_off_stock(quantities, held) != len(quantities):
+            raise OutOfStock(_shortages(quantities, held))
+        reservations.convert(owners, held)
+
+        # Цены — из БД, а не из кэша корзины
+        rows = MenuItem.objects.filter(pk__in=quantities.keys()).values_list('id', 'price', 'in_stock')
+        prices = {}
+        sold_out = []
+        for item_id, price, in_stock in rows:
+            prices[item_id] = price
+            if not in_stock:
+                sold_out.append(item_id)
+
+        # Строки идут bulk_create'ом мимо сигналов — счётчики заказа ставим сразу
+        order = Order.objects.create(
+            client=client,
+            total=sum(prices[item_id] * quantity for item_id, quantity in quantities.items()),
+            status='new',
+            line_count=len(quantities),
+            unit_count=sum(quantities.values()),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                menu_item_id=item_id,
+                quantity=quantity,
+                price_per_unit=prices[item_id],
+            )
+            for item_id, quantity in quantities.items()
+        ])
+
+        # Письмо уйдёт из воркера, только если заказ закоммитится
+        tasks.enqueue('order_confirmation', {'order_id': order.pk})
+
+        if sold_out:
+            # Позиция пропала из наличия — меню и её страницу нужно пересобрать
+            catalog.bump_version_on_commit()
+            fragments.bump_on_commit(sold_out)
+
+    return order
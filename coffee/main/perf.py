@@ -0,0 +1,154 @@
+"""
+Замеры производительности запросов (см. main.middleware.PerformanceMiddleware).
+
+RequestStats собирает на время запроса: число и время SQL, дубли запросов,
+время рендера шаблонов и работы с сессией. ViewStats хранит скользящее
+окно последних замеров по каждому view — его показывает страница
+admin/performance/. Окно живёт в памяти процесса: у каждого воркера своё.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template as DjangoTemplate
+
+from .benchmark import percentile
+
+current = ContextVar('perf_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = (
+        'sql_count', 'sql_time', 'sql_seen', 'sql_duplicates',
+        'template_time', 'template_depth', 'session_time',
+    )
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.sql_seen = set()
+        self.sql_duplicates = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.session_time = 0.0
+
+    # обёртка вокруг выполнения SQL (см. record_sql)
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+            key = hash((sql, repr(params)))
+            if key in self.sql_seen:
+                self.sql_duplicates += 1
+            else:
+                self.sql_seen.add(key)
+
+    def timed_session(self, method):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.session_time += time.perf_counter() - started
+        return wrapper
+
+
+def record_sql(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def install_sql_hook(sender=None, connection=None, **kwargs):
+    # Обёртка ставится на само соединение один раз, а запрос находит через
+    # contextvar — так SQL виден и из потоков sync_to_async под ASGI.
+    # В начало списка: execute_wrapper() снимает обёртки с конца.
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_sql)
+
+
+def install():
+    connection_created.connect(install_sql_hook)
+    for connection in connections.all(initialized_only=True):
+        install_sql_hook(connection=connection)
+    _instrument_templates()
+
+
+def _instrument_templates():
+    # Считаем только внешний рендер: вложенный render_to_string уже внутри него
+    if getattr(DjangoTemplate.render, 'perf_instrumented', False):
+        return
+    original = DjangoTemplate.render
+
+    def render(self, context=None, request=None):
+        stats = current.get()
+        if stats is None:
+            return original(self, context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            stats.template_depth -= 1
+            if stats.template_depth == 0:
+                stats.template_time += time.perf_counter() - started
+
+    render.perf_instrumented = True
+    DjangoTemplate.render = render
+
+
+class ViewStats:
+    """Скользящее окно замеров по view (в памяти процесса)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(self._window)
+        self.counts = defaultdict(int)
+
+    @staticmethod
+    def _window():
+        return deque(maxlen=getattr(settings, 'PERF_WINDOW', 500))
+
+    def record(self, view, total, stats):
+        sample = (total, stats.sql_count, stats.sql_time, stats.sql_duplicates, stats.template_time, stats.session_time)
+        with self.lock:
+            self.samples[view].append(sample)
+            self.counts[view] += 1
+
+    def snapshot(self):
+        with self.lock:
+            data = {view: list(window) for view, window in self.samples.items()}
+            counts = dict(self.counts)
+
+        rows = []
+        for view, window in data.items():
+            totals = [s[0] * 1000 for s in window]
+            n = len(window)
+            rows.append({
+                'view': view,
+                'requests': counts[view],
+                'p50_ms': percentile(totals, 50),
+                'p95_ms': percentile(totals, 95),
+                'sql_count': sum(s[1] for s in window) / n,
+                'sql_ms': sum(s[2] for s in window) * 1000 / n,
+                'sql_duplicates': sum(s[3] for s in window) / n,
+                'template_ms': sum(s[4] for s in window) * 1000 / n,
+                'session_ms': sum(s[5] for s in window) * 1000 / n,
+            })
+        return sorted(rows, key=lambda row: row['p95_ms'] or 0, reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.counts.clear()
+
+
+view_stats = ViewStats()
@@ -0,0 +1,169 @@
+"""
+Бронь остатков корзинами.
+
+Корзина держит столько единиц позиции, сколько в ней лежит, в течение
+CART_RESERVATION_TTL; каждое изменение корзины продлевает бронь. Сумма
+активных броней хранится прямо в MenuItem.reserved, поэтому «сколько
+можно купить» — это stock - reserved из одной строки, без SUM по броням.
+
+Бронь ставится условным UPDATE: reserved растёт, только если свободного
+остатка хватает, — две корзины не могут взять последний круассан.
+Оформление заказа (main/orders.py) списывает остаток и снимает свою
+бронь в той же транзакции. Истёкшие брони снимает пачками sweep()
+(команда sweep_reservations), а при нехватке — release_expired() для
+одной позиции прямо в запросе.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
+
+from .models import MenuItem, StockReservation
+
+
+def ttl():
+    return timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 15 * 60))
+
+
+def _release_counts(totals):
+    """Уменьшает reserved по позициям одним UPDATE: totals — {id позиции: сколько}."""
+    if not totals:
+        return
+    MenuItem.objects.filter(pk__in=totals.keys()).update(
+        reserved=Case(
+            *[When(pk=item_id, then=F('reserved') - quantity) for item_id, quantity in totals.items()],
+            default=F('reserved'),
+            output_field=models.PositiveIntegerField(),
+        )
+    )
+
+
+def _remove(reservations, expired_before=None):
+    """
+    Удаляет брони (queryset); возвращает (сколько броней, {id позиции: единиц}).
+    expired_before — удалять только истёкшие к этому моменту: между выборкой
+    и DELETE корзина могла продлить бронь, такую не трогаем и не считаем.
+    """
+    rows = {
+        pk: (item_id, quantity)
+        for pk, item_id, quantity in reservations.select_for_update().values_list('id', 'menu_item_id', 'quantity')
+    }
+    doomed = StockReservation.objects.filter(pk__in=rows)
+    if expired_before is not None:
+        doomed = doomed.filter(expires_at__lt=expired_before)
+    deleted, _ = doomed.delete()
+    if deleted < len(rows):
+        # Считаем только то, что действительно удалили
+        kept = set(StockReservation.objects.filter(pk__in=rows).values_list('id', flat=True))
+        rows = {pk: row for pk, row in rows.items() if pk not in kept}
+
+    totals = defaultdict(int)
+    for item_id, quantity in rows.values():
+        totals[item_id] += quantity
+    return len(rows), totals
+
+
+def _delete(reservations, expired_before=None):
+    """Удаляет брони и возвращает их единицы в свободный остаток. Возвращает число броней."""
+    count, totals = _remove(reservations, expired_before)
+    _release_counts(totals)
+    return count
+
+
+def _take(item_id, delta):
+    return MenuItem.objects.filter(
+        pk=item_id, in_stock=True, stock__gte=F('reserved') + delta,
+    ).update(reserved=F('reserved') + delta)
+
+
+def reserve(owners, item_id, quantity):
+    """
+    Бронь владельцев на позицию становится равной quantity (0 — снять).
+    Бронь хранится под первым ключом; брони под остальными (гостевая
+    корзина до входа) переходят к нему. False — свободного остатка
+    не хватило, бронь не изменилась.
+    """
+    owner = owners[0]
+    with transaction.atomic():
+        holds = list(StockReservation.objects.filter(owner__in=owners, menu_item_id=item_id))
+        delta = quantity - sum(hold.quantity for hold in holds)
+
+        if delta > 0 and not _take(item_id, delta):
+            # Возможно, остаток держат уже истёкшие чужие брони
+            if not release_expired(item_id, keep_owners=owners) or not _take(item_id, delta):
+                return False
+        elif delta < 0:
+            _release_counts({item_id: -delta})
+
+        StockReservation.objects.filter(owner__in=owners, menu_item_id=item_id).exclude(owner=owner).delete()
+        if quantity > 0:
+            StockReservation.objects.update_or_create(
+                owner=owner, menu_item_id=item_id,
+                defaults={'quantity': quantity, 'expires_at': timezone.now() + ttl()},
+            )
+        else:
+            StockReservation.objects.filter(owner=owner, menu_item_id=item_id).delete()
+    return True
+
+
+def extend(owners):
+    """Продлевает все брони владельцев (например, на странице оформления)."""
+    return StockReservation.objects.filter(owner__in=owners).update(expires_at=timezone.now() + ttl())
+
+
+def release(owners, item_id=None):
+    """Снимает брони владельцев (все или по одной позиции)."""
+    reservations = StockReservation.objects.filter(owner__in=owners)
+    if item_id is not None:
+        reservations = reservations.filter(menu_item_id=item_id)
+    with transaction.atomic():
+        return _delete(reservations)
+
+
+def held(owners, item_ids):
+    """{id позиции: сколько держат владельцы} — для оформления заказа."""
+    rows = (
+        StockReservation.objects.filter(owner__in=owners, menu_item_id__in=item_ids)
+        .values('menu_item_id').annotate(total=Sum('quantity')).values_list('menu_item_id', 'total')
+    )
+    return dict(rows)
+
+
+def convert(owners, sold):
+    """
+    Закрывает брони владельцев после оформления. sold — {id позиции: сколько
+    брони ушло в продажу}: эти единицы из reserved уже вычло списание,
+    остальное (бронь сверх заказа, позиции не из заказа) возвращается в остаток.
+    """
+    _, totals = _remove(StockReservation.objects.filter(owner__in=owners))
+    _release_counts({
+        item_id: quantity - sold.get(item_id, 0)
+        for item_id, quantity in totals.items()
+        if quantity > sold.get(item_id, 0)
+    })
+
+
+def release_expired(item_id, keep_owners=()):
+    now = timezone.now()
+    expired = StockReservation.objects.filter(menu_item_id=item_id, expires_at__lt=now)
+    if keep_owners:
+        expired = expired.exclude(owner__in=keep_owners)
+    with transaction.atomic():
+        return _delete(expired, expired_before=now)
+
+
+def sweep(batch_size=1000):
+    """Снимает все истёкшие брони пачками. Возвращает их число."""
+    released = 0
+    now = timezone.now()
+    while True:
+        with transaction.atomic():
+            batch = StockReservation.objects.filter(expires_at__lt=now).order_by('expires_at')[:batch_size]
+            count = _delete(batch, expired_before=now)
+        released += count
+        # Неполная пачка — истёкших больше нет (или их успели продлить)
+        if count < batch_size:
+            return released
@@ -0,0 +1,174 @@
+"""
+Сводки продаж по дням: DailyItemSales (день × позиция) и DailyCategorySales
+(день × категория).
+
+Сводки меняются инкрементально, когда заказ становится выданным или
+отменённым (или перестаёт им быть) — см. apply_transitions, сигнал в
+main/signals.py и массовые переходы в main/order_status.py. День — дата создания заказа в часовом поясе проекта,
+выручка — сумма quantity * price_per_unit. rebuild() пересчитывает
+сводки за период по сырым заказам (команда rebuild_rollups).
+Отчёты (admin/sales/) читают только сводки.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyCategorySales, DailyItemSales, Order, OrderItem
+
+COMPLETED = 'completed'
+CANCELLED = 'cancelled'
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _deltas(old_status, new_status):
+    """(±1 к выданным, ±1 к отменённым) при смене статуса."""
+    def sign(status):
+        return (old_status != status and new_status == status) - (old_status == status and new_status != status)
+    return sign(COMPLETED), sign(CANCELLED)
+
+
+def apply_transition(order, old_status, new_status):
+    """Добавляет заказ в сводки своего дня (или вычитает при откате статуса)."""
+    apply_transitions([(order.pk, order.created_at, old_status, new_status)])
+
+
+def apply_transitions(changes):
+    """
+    То же для пачки заказов: changes — [(id заказа, created_at, старый статус, новый)].
+    Позиции всех заказов читаются одним запросом, сводки каждого дня — двумя UPDATE.
+    """
+    signs = {}
+    for order_id, created_at, old_status, new_status in changes:
+        completed, cancelled = _deltas(old_status, new_status)
+        if completed or cancelled:
+            signs[order_id] = (timezone.localdate(created_at), completed, cancelled)
+    if not signs:
+        return
+
+    lines = OrderItem.objects.filter(order_id__in=signs).values_list(
+        'order_id', 'menu_item_id', 'menu_item__category_id', 'quantity', 'price_per_unit'
+    )
+    # {день: {id: [выручка, штуки, выданные заказы, отменённые заказы]}}
+    by_item = defaultdict(lambda: defaultdict(lambda: [0, 0, 0, 0]))
+    by_category = defaultdict(lambda: defaultdict(lambda: [0, 0, 0, 0]))
+    counted = set()
+    for order_id, item_id, category_id, quantity, price in lines:
+        day, completed, cancelled = signs[order_id]
+        for totals, key, pk in ((by_item, 'item', item_id), (by_category, 'category', category_id)):
+            bucket = totals[day][pk]
+            bucket[0] += quantity * price * completed
+            bucket[1] += quantity * completed
+            # Заказ считается в строке один раз, сколько бы строк с этой позицией в нём ни было
+            if (order_id, key, pk) not in counted:
+                counted.add((order_id, key, pk))
+                bucket[2] += completed
+                bucket[3] += cancelled
+
+    with transaction.atomic():
+        for day, totals in by_item.items():
+            _add(DailyItemSales, 'menu_item_id', day, totals)
+        for day, totals in by_category.items():
+            _add(DailyCategorySales, 'category_id', day, totals)
+
+
+def _add(model, key, day, totals):
+    # Строки дня создаём нулевыми (если их нет), затем одним UPDATE
+    # прибавляем к каждой её долю — как списание остатков в main/orders.py
+    model.objects.bulk_create(
+        [model(date=day, **{key: pk}) for pk in totals],
+        ignore_conflicts=True,
+    )
+
+    def per_row(field, index):
+        return Case(
+            *[When(**{key: pk}, then=F(field) + Value(values[index])) for pk, values in totals.items()],
+            output_field=MONEY if field == 'revenue' else IntegerField(),
+        )
+
+    model.objects.filter(date=day, **{f'{key}__in': list(totals)}).update(
+        revenue=per_row('revenue', 0),
+        units=per_row('units', 1),
+        orders=per_row('orders', 2),
+        cancelled_orders=per_row('cancelled_orders', 3),
+    )
+
+
+def _day_bounds(date_from, date_to):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(date_from, time.min), tz)
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def rebuild(date_from, date_to):
+    """Пересчитывает сводки за дни [date_from, date_to] по сырым заказам."""
+    start, end = _day_bounds(date_from, date_to)
+    lines = OrderItem.objects.filter(
+        order__created_at__gte=start,
+        order__created_at__lt=end,
+        order__status__in=(COMPLETED, CANCELLED),
+    ).annotate(day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone()))
+
+    completed = Q(order__status=COMPLETED)
+    aggregates = {
+        'revenue': Sum(F('quantity') * F('price_per_unit'), filter=completed, output_field=MONEY, default=0),
+        'units': Sum('quantity', filter=completed, default=0),
+        'orders': Count('order_id', filter=completed, distinct=True),
+        'cancelled_orders': Count('order_id', filter=Q(order__status=CANCELLED), distinct=True),
+    }
+
+    with transaction.atomic():
+        DailyItemSales.objects.filter(date__range=(date_from, date_to)).delete()
+        DailyCategorySales.objects.filter(date__range=(date_from, date_to)).delete()
+
+        item_rows = [
+            DailyItemSales(date=row.pop('day'), **row)
+            for row in lines.values('day', 'menu_item_id').annotate(**aggregates).order_by()
+        ]
+        category_rows = [
+            DailyCategorySales(date=row.pop('day'), category_id=row.pop('menu_item__category_id'), **row)
+            for row in lines.values('day', 'menu_item__category_id').annotate(**aggregates).order_by()
+        ]
+        DailyItemSales.objects.bulk_create(item_rows, batch_size=500)
+        DailyCategorySales.objects.bulk_create(category_rows, batch_size=500)
+    return len(item_rows), len(category_rows)
+
+
+def date_range():
+    """Первый и последний день, за которые есть заказы (для полного пересчёта)."""
+    first = Order.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    if first is None:
+        today = timezone.localdate()
+        return today, today
+    return timezone.localdate(first), timezone.localdate()
+
+
+# --- Отчёты: только по сводкам ----------------------------------------------
+
+def report(date_from, date_to):
+    """Итоги и разбивки за период — запросы только к сводкам."""
+    period = {'date__range': (date_from, date_to)}
+    totals = {'revenue': Sum('revenue'), 'units': Sum('units'), 'orders': Sum('orders'),
+              'cancelled_orders': Sum('cancelled_orders')}
+
+    # Заказы за день из сводок не сложить: заказ с позициями из двух
+    # категорий попал бы в сумму дважды. По дням — только выручка и штуки.
+    return {
+        'days': list(
+            DailyCategorySales.objects.filter(**period)
+            .values('date').annotate(revenue=Sum('revenue'), units=Sum('units')).order_by('-date')
+        ),
+        'categories': list(
+            DailyCategorySales.objects.filter(**period)
+            .values('category__name').annotate(**totals).order_by('-revenue')
+        ),
+        'items': list(
+            DailyItemSales.objects.filter(**period)
+            .values('menu_item__name', 'menu_item__category__name').annotate(**totals).order_by('-revenue')[:50]
+        ),
+    }
@@ -0,0 +1,301 @@
+"""
+Полнотекстовый поиск по меню.
+
+Индекс — виртуальная таблица SQLite FTS5 (rowid = id позиции) с тремя
+колонками: название, описание, категория. В индекс кладутся не слова,
+а их основы (стеммер Snowball для русского ниже), поэтому «капучино»
+находится по «капучиной», а последнее слово запроса ищется по префиксу —
+так работает подсказка по мере ввода. Ранжирование — bm25 с весами колонок.
+
+Индекс обновляется в той же транзакции, что и позиция (см. main/signals.py),
+и пересобирается командой rebuild_search_index. На других СУБД поиск
+откатывается к icontains.
+"""
+import re
+from functools import lru_cache
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from . import catalog
+from .models import MenuItem
+
+TABLE = 'main_menuitem_search'
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "name, description, category, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+)
+DROP_SQL = f"DROP TABLE IF EXISTS {TABLE}"
+
+# Веса колонок для bm25: название важнее категории, категория — описания
+RANK = f"bm25({TABLE}, 10.0, 1.0, 4.0)"
+
+WORD = re.compile(r'\w+')
+
+
+# --- Стеммер (Snowball, русский) -------------------------------------------
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = ({'в', 'вши', 'вшись'}, {'ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'})
+ADJECTIVE = ({
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+},)
+PARTICIPLE = ({'ем', 'нн', 'вш', 'ющ', 'щ'}, {'ивш', 'ывш', 'ующ'})
+REFLEXIVE = ({'ся', 'сь'},)
+VERB = ({
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+}, {
+    'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+    'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+})
+NOUN = ({
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий',
+    'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю',
+    'ия', 'ья', 'я',
+},)
+SUPERLATIVE = ({'ейш', 'ейше'},)
+DERIVATIONAL = {'ост', 'ость'}
+
+
+def _strip(rv, groups):
+    """
+    Отрезает самое длинное окончание из групп. Окончания первой группы
+    (если групп две) допустимы только после «а»/«я». None — не нашлось.
+    """
+    for size in range(min(len(rv), 6), 0, -1):
+        ending = rv[-size:]
+        for index, group in enumerate(groups):
+            if ending in group:
+                if len(groups) == 2 and index == 0 and rv[-size - 1:-size] not in ('а', 'я'):
+                    return None
+                return rv[:-size]
+    return None
+
+
+def _regions(word):
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+@lru_cache(maxsize=100_000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    head, s = word[:rv], word[rv:]
+
+    # Шаг 1: деепричастие, иначе возвратная частица + прилагательное/глагол/существительное
+    stripped = _strip(s, PERFECTIVE_GERUND)
+    if stripped is None:
+        stripped = _strip(s, REFLEXIVE)
+        if stripped is not None:
+            s = stripped
+        stripped = _strip(s, ADJECTIVE)
+        if stripped is not None:
+            participle = _strip(stripped, PARTICIPLE)
+            stripped = stripped if participle is None else participle
+        else:
+            stripped = _strip(s, VERB)
+            if stripped is None:
+                stripped = _strip(s, NOUN)
+    if stripped is not None:
+        s = stripped
+
+    # Шаг 2
+    if s.endswith('и'):
+        s = s[:-1]
+
+    # Шаг 3: словообразовательный суффикс, только в R2
+    for ending in DERIVATIONAL:
+        if s.endswith(ending) and len(head) + len(s) - len(ending) >= r2:
+            s = s[:-len(ending)]
+            break
+
+    # Шаг 4
+    if s.endswith('нн'):
+        s = s[:-1]
+    else:
+        stripped = _strip(s, SUPERLATIVE)
+        if stripped is not None:
+            s = stripped[:-1] if stripped.endswith('нн') else stripped
+        elif s.endswith('ь'):
+            s = s[:-1]
+
+    return head + s
+
+
+def stems(text):
+    return [stem(word) for word in WORD.findall(text or '')]
+
+
+def index_text(text):
+    return ' '.join(stems(text))
+
+
+# --- Запросы ----------------------------------------------------------------
+
+def build_match(query):
+    """
+    Запрос пользователя → выражение MATCH: все слова обязательны,
+    последнее — префиксом (его ещё допечатывают).
+    """
+    words = stems(query)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= 2:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _connection():
+    return connections[router.db_for_read(MenuItem)]
+
+
+def _uses_fts(connection):
+    return connection.vendor == 'sqlite'
+
+
+def search_ids(query, limit=50):
+    """id позиций (в том числе не в наличии) по убыванию релевантности."""
+    connection = _connection()
+    if not _uses_fts(connection):
+        return _fallback_ids(query, limit)
+
+    match = build_match(query)
+    if not match:
+        return []
+    sql = f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY {RANK}"
+    params = [match]
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def matching(queryset, query, limit=None):
+    """
+    queryset позиций, отфильтрованный по запросу. Совпадения выбирает
+    подзапрос к индексу в том же SQL, а не список id в IN (…) — на тысячах
+    совпадений он раздувал бы запрос. limit — только столько лучших совпадений.
+    """
+    connection = connections[queryset.db]
+    if not _uses_fts(connection):
+        condition = _fallback_condition(query)
+        if not condition:
+            return queryset.none()
+        ids = MenuItem.objects.filter(condition).order_by('name').values('id')
+        return queryset.filter(pk__in=ids[:limit] if limit else ids)
+
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+    sql = f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s"
+    params = [match]
+    if limit:
+        sql += f" ORDER BY {RANK} LIMIT %s"
+        params.append(limit)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def find(query, category_id=None, limit=50):
+    """Позиции в наличии по запросу, лучшие первыми. Сами позиции — из снимка каталога."""
+    ids = search_ids(query, limit=None if category_id else limit)
+    items = catalog.get_items(ids)
+    found = [items[pk] for pk in ids if pk in items]
+    if category_id is not None:
+        found = [item for item in found if item.category_id == category_id]
+    return found[:limit]
+
+
+def _fallback_condition(query):
+    condition = Q()
+    for word in WORD.findall(query or ''):
+        condition &= (
+            Q(name__icontains=word) | Q(description__icontains=word) | Q(category__name__icontains=word)
+        )
+    return condition
+
+
+def _fallback_ids(query, limit):
+    condition = _fallback_condition(query)
+    if not condition:
+        return []
+    ids = MenuItem.objects.filter(condition).order_by('name').values_list('id', flat=True)
+    return list(ids[:limit] if limit else ids)
+
+
+# --- Обновление индекса -----------------------------------------------------
+
+def _row(item, category_name):
+    return (item.pk, index_text(item.name), index_text(item.description), index_text(category_name))
+
+
+def index_items(items, using=None):
+    """Переиндексирует позиции (нужна select_related('category') или кэш категории)."""
+    connection = connections[using or router.db_for_write(MenuItem)]
+    if not _uses_fts(connection):
+        return
+    rows = [_row(item, item.category.name if item.category_id else '') for item in items]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)", rows
+        )
+
+
+def remove_items(ids, using=None):
+    connection = connections[using or router.db_for_write(MenuItem)]
+    if not _uses_fts(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(pk,) for pk in ids])
+
+
+def rebuild(items=None, using=None, batch_size=500):
+    """Пересобирает индекс целиком. Возвращает число проиндексированных позиций."""
+    connection = connections[using or router.db_for_write(MenuItem)]
+    if not _uses_fts(connection):
+        return 0
+    if items is None:
+        items = MenuItem.objects.using(connection.alias).select_related('category')
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        count = 0
+        batch = []
+        for item in items.iterator(chunk_size=batch_size):
+            batch.append(_row(item, item.category.name if item.category_id else ''))
+            if len(batch) >= batch_size:
+                count += _insert(cursor, batch)
+                batch = []
+        count += _insert(cursor, batch)
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def _insert(cursor, rows):
+    if rows:
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)", rows
+        )
+    return len(rows)
@@ -0,0 +1,251 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete, post_migrate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from coffee.cart import get_storage
+
+from . import catalog, checkout, counters, fragments, images, orders, rollups, search, tasks
+from .models import MenuItem, Category, Order, OrderItem, OrderStatusHistory
+
+
+# Любое изменение позиции или категории (в т.ч. list_editable в админке,
+# который сохраняет строки по одной) делает снимок каталога устаревшим.
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, **kwargs):
+    catalog.bump_version_on_commit()
+
+
+# Кэш фрагментов: версия позиции растёт при её изменении; переименование
+# категории меняет страницы всех её позиций
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_item_fragments(sender, instance, **kwargs):
+    fragments.bump_on_commit([instance.pk])
+
+
+# Удалённая позиция не оставляет updated_at — отмечаем изменение на её
+# категории, чтобы Last-Modified меню сдвинулся
+@receiver(post_delete, sender=MenuItem)
+def touch_category_on_item_delete(sender, instance, using=None, **kwargs):
+    Category.objects.using(using).filter(pk=instance.category_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_fragments(sender, instance, created=False, using=None, **kwargs):
+    if not created:
+        fragments.bump_on_commit(instance.menuitem_set.using(using).values_list('id', flat=True))
+
+
+# Новая картинка — нарезку ставим в очередь фоновых задач, запрос не ждёт
+@receiver(post_save, sender=MenuItem)
+def build_image_variants(sender, instance, update_fields=None, **kwargs):
+    if not instance.image:
+        return
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    name = instance.image.name
+    if not images.is_complete(images.available_widths(name)):
+        tasks.enqueue('image_variants', {'name': name})
+
+
+# Поисковый индекс обновляется в той же транзакции, что и сама позиция
+SEARCH_FIELDS = {'name', 'description', 'category', 'category_id'}
+
+
+@receiver(post_save, sender=MenuItem)
+def index_menu_item(sender, instance, update_fields=None, using=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    search.index_items([instance], using=using)
+
+
+@receiver(post_delete, sender=MenuItem)
+def unindex_menu_item(sender, instance, using=None, **kwargs):
+    search.remove_items([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Category)
+def index_category_items(sender, instance, created=False, update_fields=None, using=None, **kwargs):
+    if created or (update_fields is not None and 'name' not in update_fields):
+        return
+    items = instance.menuitem_set.using(using).all()
+    for item in items:
+        item.category = instance
+    search.index_items(items, using=using)
+
+
+# Миграция 0012 заполняет индекс текстом как есть — основы слов для него
+# считаем здесь, когда она только что применилась. Только колонки, что
+# есть уже с 0012: миграцию могли применить не до конца
+@receiver(post_migrate)
+def stem_search_index(sender, plan=None, using='default', **kwargs):
+    if sender.label != 'main' or not any(
+        migration.app_label == 'main' and migration.name == '0012_menuitem_search' and not backwards
+        for migration, backwards in plan or ()
+    ):
+        return
+    search.rebuild(
+        MenuItem.objects.using(using).select_related('category').only('name', 'description', 'category__name'),
+        using=using,
+    )
+
+
+# Заказ: при загрузке запоминаем отслеживаемые поля — одним снимком для
+# сводок продаж, журнала статусов, уведомлений и счётчиков (main/counters.py).
+# После сохранения по снимку видно, что изменилось: у счётчиков вычитаем
+# старый вклад и прибавляем новый
+ORDER_TRACKED = ('client_id', 'status', 'total')
+LINE_COUNTED = ('order_id', 'quantity')
+
+
+def _remember(instance, fields):
+    # Через __dict__: отложенное (defer/only) поле не должно грузиться ради
+    # этого — тогда дочитаем одним запросом перед сохранением
+    if not instance.pk or not all(name in instance.__dict__ for name in fields):
+        return None
+    return tuple(instance.__dict__[name] for name in fields)
+
+
+def _load(instance, fields):
+    if instance._state.adding:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(post_init, sender=Order)
+def remember_order(sender, instance, **kwargs):
+    instance._loaded = _remember(instance, ORDER_TRACKED)
+
+
+@receiver(pre_save, sender=Order)
+def load_order(sender, instance, **kwargs):
+    if instance._loaded is None:
+        instance._loaded = _load(instance, ORDER_TRACKED)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created=False, using=None, **kwargs):
+    old = None if created else instance._loaded
+    old_client_id, old_status, old_total = old or (None, None, None)
+    if old_status != instance.status:
+        rollups.apply_transition(instance, old_status, instance.status)
+        if old_status is not None:
+            OrderStatusHistory.objects.create(
+                order=instance, from_status=old_status, to_status=instance.status,
+                changed_by=getattr(instance, '_changed_by', None),
+                reason=instance.cancellation_reason if instance.status == 'cancelled' else '',
+            )
+        if instance.status == 'cancelled' and old_status is not None:
+            orders.return_stock([instance.pk], using)
+        if instance.status == 'ready':
+            tasks.enqueue('order_ready', {'order_id': instance.pk})
+
+    changes = [(instance.client_id, 1, counters.spent(instance.status, instance.total))]
+    if old:
+        changes.append((old_client_id, -1, -counters.spent(old_status, old_total)))
+    counters.add_client_orders(changes, using)
+    instance._loaded = tuple(getattr(instance, name) for name in ORDER_TRACKED)
+
+
+# Удаление выданного/отменённого заказа — вычитаем его из сводок, пока
+# позиции ещё на месте
+@receiver(pre_delete, sender=Order)
+def remove_from_sales_rollups(sender, instance, **kwargs):
+    rollups.apply_transition(instance, instance.status, None)
+
+
+# Невыданный заказ удаляют — списанное возвращается на склад (у отменённого
+# уже вернулось при отмене)
+@receiver(pre_delete, sender=Order)
+def return_stock_on_delete(sender, instance, using=None, **kwargs):
+    if instance.status not in ('completed', 'cancelled'):
+        orders.return_stock([instance.pk], using)
+
+
+@receiver(post_delete, sender=Order)
+def uncount_order(sender, instance, using=None, **kwargs):
+    counters.add_client_orders(
+        [(instance.client_id, -1, -counters.spent(instance.status, instance.total))], using,
+    )
+
+
+@receiver(post_init, sender=OrderItem)
+def remember_line_counted(sender, instance, **kwargs):
+    instance._loaded = _remember(instance, LINE_COUNTED)
+
+
+@receiver(pre_save, sender=OrderItem)
+def load_line_counted(sender, instance, **kwargs):
+    if instance._loaded is None:
+        instance._loaded = _load(instance, LINE_COUNTED)
+
+
+@receiver(post_save, sender=OrderItem)
+def count_line(sender, instance, created=False, using=None, **kwargs):
+    deltas = {instance.order_id: {'line_count': 1, 'unit_count': instance.quantity}}
+    old = None if created else instance._loaded
+    if old:
+        order_id, quantity = old
+        delta = deltas.setdefault(order_id, {'line_count': 0, 'unit_count': 0})
+        delta['line_count'] -= 1
+        delta['unit_count'] -= quantity
+    counters.add(Order, deltas, using)
+    instance._loaded = (instance.order_id, instance.quantity)
+
+
+@receiver(post_delete, sender=OrderItem)
+def uncount_line(sender, instance, origin=None, using=None, **kwargs):
+    # Строки, ушедшие вместе с заказом, считать не для кого; вместе с
+    # позицией — их вычел uncount_item_lines одним запросом
+    if not (isinstance(origin, OrderItem) or getattr(origin, 'model', None) is OrderItem):
+        return
+    counters.add(Order, {instance.order_id: {'line_count': -1, 'unit_count': -instance.quantity}}, using)
+
+
+# Позиции в категории: при смене категории — минус в старой, плюс в новой
+@receiver(pre_save, sender=MenuItem)
+def load_item_category(sender, instance, update_fields=None, **kwargs):
+    instance._loaded_category_id = None
+    if instance._state.adding or (update_fields is not None and not {'category', 'category_id'} & set(update_fields)):
+        return
+    instance._loaded_category_id = (
+        MenuItem.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=MenuItem)
+def count_item(sender, instance, created=False, using=None, **kwargs):
+    old = instance._loaded_category_id
+    if created:
+        counters.add_category_items({instance.category_id: 1}, using)
+    elif old is not None and old != instance.category_id:
+        counters.add_category_items({old: -1, instance.category_id: 1}, using)
+
+
+@receiver(pre_delete, sender=MenuItem)
+def uncount_item_lines(sender, instance, using=None, **kwargs):
+    counters.remove_item_lines(instance.pk, using)
+
+
+@receiver(post_delete, sender=MenuItem)
+def uncount_item(sender, instance, using=None, **kwargs):
+    counters.add_category_items({instance.category_id: -1}, using)
+
+
+# Вход паролем — свежее подтверждение личности: заказы в ближайшие
+# CHECKOUT_REAUTH_WINDOW секунд оформляются без повторного пароля
+@receiver(user_logged_in)
+def checkout_confirmed_on_login(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        checkout.mark_confirmed(request, user)
+
+
+# Корзина гостя при входе переходит к клиенту (если хранилище их разделяет)
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        get_storage().merge_guest(request, user)
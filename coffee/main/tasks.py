@@ -0,0 +1,191 @@
+"""
+Фоновые задачи через транзакционный outbox.
+
+enqueue() пишет строку Task в текущей транзакции: задача появится в
+очереди ровно тогда, когда закоммитятся данные, ради которых она
+поставлена (заказ, смена статуса, новое фото), и пропадёт вместе с ними
+при откате. Запрос и сохранение в админке ничего медленного не делают.
+
+Воркер (manage.py run_tasks) забирает созревшие задачи пачками, помечая
+их своим именем на время аренды (LEASE). Упавшая задача откладывается
+с экспоненциальной задержкой и после max_attempts помечается ошибкой.
+Задача, чей воркер умер, после окончания аренды снова попадает в очередь.
+
+Обработчик регистрируется декоратором @task('имя') и получает параметры
+и Batch — общий для пачки контекст: письма всей пачки уходят через одно
+SMTP-соединение.
+"""
+import logging
+import os
+import random
+import socket
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import fragments, images
+from .models import Order, Task
+
+logger = logging.getLogger(__name__)
+
+LEASE = timedelta(minutes=5)
+BACKOFF_BASE = 30          # секунд до первого повтора; дальше ×2
+BACKOFF_MAX = 60 * 60
+
+registry = {}
+
+
+def task(name):
+    def register(func):
+        registry[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, run_after=None, max_attempts=5):
+    """Ставит задачу в очередь в текущей транзакции."""
+    if name not in registry:
+        raise KeyError(f"Неизвестная задача: {name}")
+    return Task.objects.create(
+        name=name,
+        payload=payload or {},
+        run_after=run_after or timezone.now(),
+        max_attempts=max_attempts,
+    )
+
+
+def enqueue_many(name, payloads, max_attempts=5):
+    """Пачка задач одного вида — одним INSERT."""
+    if name not in registry:
+        raise KeyError(f"Неизвестная задача: {name}")
+    now = timezone.now()
+    return Task.objects.bulk_create([
+        Task(name=name, payload=payload, run_after=now, max_attempts=max_attempts) for payload in payloads
+    ])
+
+
+class Batch:
+    """Общее для пачки задач: одно SMTP-соединение, открывается при первом письме."""
+
+    def __init__(self):
+        self._mail = None
+
+    def send_mail(self, message):
+        if self._mail is None:
+            self._mail = get_connection()
+            self._mail.open()
+        message.connection = self._mail
+        message.send()
+
+    def close(self):
+        if self._mail is not None:
+            self._mail.close()
+            self._mail = None
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _due(now):
+    return Q(status='pending', run_after__lte=now) | Q(status='running', locked_until__lt=now)
+
+
+def claim(worker, batch_size=50):
+    """Забирает до batch_size созревших задач и помечает их за воркером."""
+    now = timezone.now()
+    connection = connections[router.db_for_write(Task)]
+    with transaction.atomic():
+        due = Task.objects.filter(_due(now)).order_by('run_after', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size])
+        else:
+            ids = list(due.values_list('id', flat=True)[:batch_size])
+        # Условие повторяется в UPDATE: на SQLite другой воркер мог успеть
+        # забрать часть задач между SELECT и UPDATE — их он и получит
+        Task.objects.filter(_due(now), id__in=ids).update(
+            status='running', locked_by=worker, locked_until=now + LEASE,
+        )
+    return list(Task.objects.filter(id__in=ids, status='running', locked_by=worker, locked_until=now + LEASE))
+
+
+def run_batch(tasks):
+    """Выполняет пачку. Возвращает (выполнено, отложено, провалено)."""
+    batch = Batch()
+    done, retried, failed = [], [], []
+    try:
+        for item in tasks:
+            item.attempts += 1
+            try:
+                registry[item.name](item.payload, batch)
+            except Exception as e:
+                logger.exception("Задача %s упала", item)
+                item.last_error = f"{type(e).__name__}: {e}"
+                if item.attempts >= item.max_attempts or item.name not in registry:
+                    item.status = 'failed'
+                    item.finished_at = timezone.now()
+                    failed.append(item)
+                else:
+                    item.status = 'pending'
+                    item.run_after = timezone.now() + backoff(item.attempts)
+                    retried.append(item)
+                    # Сломанное соединение не должно валить остаток пачки
+                    batch.close()
+            else:
+                item.status = 'done'
+                item.finished_at = timezone.now()
+                done.append(item)
+            item.locked_by = ''
+            item.locked_until = None
+    finally:
+        batch.close()
+        Task.objects.bulk_update(
+            done + retried + failed,
+            ['status', 'attempts', 'run_after', 'last_error', 'finished_at', 'locked_by', 'locked_until'],
+        )
+    return len(done), len(retried), len(failed)
+
+
+# --- Задачи -----------------------------------------------------------------
+
+def _order_email(order, subject, intro):
+    lines = [f"{line.menu_item.name} × {line.quantity} — {line.quantity * line.price_per_unit} ₽"
+             for line in order.items.all()]
+    body = "\n".join([f"Здравствуйте, {order.client.name}!", "", intro, "", *lines, "",
+                      f"Итого: {order.total} ₽", "", "Кофейня «НЕ ФИЛЬТР»"])
+    return EmailMessage(subject, body, to=[order.client.email])
+
+
+def _load_order(order_id):
+    return (
+        Order.objects.select_related('client').prefetch_related('items__menu_item')
+        .filter(pk=order_id, client__isnull=False).exclude(client__email='').first()
+    )
+
+
+@task('order_confirmation')
+def send_order_confirmation(payload, batch):
+    order = _load_order(payload['order_id'])
+    if order is not None:
+        batch.send_mail(_order_email(order, f"Заказ #{order.id} принят", "Мы получили ваш заказ:"))
+
+
+@task('order_ready')
+def send_order_ready(payload, batch):
+    order = _load_order(payload['order_id'])
+    if order is not None:
+        batch.send_mail(_order_email(order, f"Заказ #{order.id} готов", "Ваш заказ готов, заберите его на баре:"))
+
+
+@task('image_variants')
+def build_image_variants(payload, batch):
+    images.build_variants(payload['name'])
+    fragments.bump_image(payload['name'])
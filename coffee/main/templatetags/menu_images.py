@@ -0,0 +1,48 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from main import images
+
+register = template.Library()
+
+
+def static_storage():
+    # Копии слайдов лежат рядом с оригиналами в coffee/static
+    return FileSystemStorage(location=settings.STATICFILES_DIRS[0])
+
+
+def _picture(name, src, url, widths, alt, css_class, sizes):
+    if not widths:
+        return format_html('<img src="{}" class="{}" alt="{}">', src, css_class, alt)
+
+    def srcset(ext):
+        return format_html_join(', ', '{} {}w', (
+            (url(images.variant_name(name, width, ext)), width) for width in widths
+        ))
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}">'
+        '</picture>',
+        srcset('webp'), sizes, src, srcset('jpg'), sizes, css_class, alt,
+    )
+
+
+@register.simple_tag
+def picture(image, alt='', css_class='', sizes='100vw'):
+    """<picture> для ImageField: WebP и JPEG нужной ширины, если они уже нарезаны."""
+    if not image:
+        return ''
+    widths = images.available_widths(image.name)
+    return _picture(image.name, image.url, default_storage.url, widths, alt, css_class, sizes)
+
+
+@register.simple_tag
+def static_picture(path, alt='', css_class='', sizes='100vw'):
+    """То же для статики (слайды на главной): копии делает build_image_variants --static."""
+    widths = images.available_widths(path, static_storage())
+    return _picture(path, static(path), static, widths, alt, css_class, sizes)
@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from main import catalog, versions
+from main.models import Category, CustomUser, MenuItem
+from main.orders import place_order
+
+
+# Версии из БД сверяем один раз за тест (в setUp) — иначе число запросов
+# зависело бы от того, сколько длится тест
+@override_settings(CACHE_VERSION_CHECK_INTERVAL=3600)
+class CoffeeTestCase(TestCase):
+    """
+    Кэш (LocMem) и версии кэша (main/versions.py) живут в процессе и
+    переживают откат транзакции теста — начинаем каждый тест с чистых.
+    """
+
+    def setUp(self):
+        cache.clear()
+        versions._known.clear()
+        versions._state.update(seen=None, checked=0.0)
+        versions.get(catalog.VERSION_KEY)
+        self.client_user = CustomUser.objects.create_user(
+            username='client', email='client@example.com', password='secret-pass-1',
+        )
+        self.category = Category.objects.create(name='Кофе')
+
+    def item(self, name='Латте', price='150.00', stock=10, **fields):
+        fields.setdefault('category', self.category)
+        return MenuItem.objects.create(name=name, price=Decimal(price), stock=stock, **fields)
+
+    def order(self, *lines, owners=()):
+        return place_order(self.client_user, [{'item': item, 'quantity': quantity} for item, quantity in lines], owners)
@@ -0,0 +1,143 @@
+import json
+
+from django.test import override_settings
+from django.urls import reverse
+
+from main.models import Category, CustomUser, MenuItem, StockReservation
+
+from .base import CoffeeTestCase
+
+
+class ApiCatalogTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.items = [self.item(f"Позиция {index}", stock=5) for index in range(5)]
+        self.tea = Category.objects.create(name='Чай')
+        self.green = self.item('Зелёный', category=self.tea)
+        self.gone = self.item('Нет в наличии', in_stock=False)
+
+    def test_categories_with_etag(self):
+        response = self.client.get(reverse('api_categories'))
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': self.category.id, 'name': 'Кофе'}, {'id': self.tea.id, 'name': 'Чай'}],
+        )
+        again = self.client.get(reverse('api_categories'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    def test_menu_pages_by_cursor(self):
+        url = reverse('api_menu')
+        ids = []
+        cursor = None
+        while True:
+            params = {'limit': 2, 'fields': 'name'}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.client.get(url, params).json()
+            ids += [row['id'] for row in page['results']]
+            self.assertTrue(all(set(row) == {'id', 'name'} for row in page['results']))
+            cursor = page['next']
+            if cursor is None:
+                break
+        self.assertEqual(ids, [item.id for item in self.items] + [self.green.id])
+
+    def test_menu_category_filter(self):
+        response = self.client.get(reverse('api_menu'), {'category': self.tea.id})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.green.id])
+        self.assertEqual(response.json()['results'][0]['price'], '150.00')
+
+    def test_menu_item(self):
+        response = self.client.get(reverse('api_menu_item', args=[self.green.id]), {'fields': 'price'})
+        self.assertEqual(response.json(), {'id': self.green.id, 'price': '150.00'})
+        again = self.client.get(
+            reverse('api_menu_item', args=[self.green.id]), {'fields': 'price'},
+            headers={'if-none-match': response['ETag']},
+        )
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get(reverse('api_menu_item', args=[self.gone.id])).status_code, 404)
+
+    def test_writes_are_not_allowed_on_catalog(self):
+        self.assertEqual(self.client.post(reverse('api_menu')).status_code, 405)
+
+
+@override_settings(CHECKOUT_CONFIRMATION='recent')
+class ApiCartAndOrdersTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.latte = self.item(stock=3)
+        self.client.login(username='client', password='secret-pass-1')
+
+    def post(self, name, payload, method='post'):
+        return getattr(self.client, method)(reverse(name), json.dumps(payload), content_type='application/json')
+
+    def test_me(self):
+        response = self.client.get(reverse('api_me'))
+        self.assertEqual(response.json()['user']['username'], 'client')
+        self.assertIn('csrftoken', response.cookies)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_me')).json(), {'user': None})
+
+    def test_cart_reserves_stock(self):
+        response = self.post('api_cart', {'item_id': self.latte.id, 'quantity': 2})
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(response.json()['total'], '300.00')
+        self.assertEqual(MenuItem.objects.get(pk=self.latte.pk).reserved, 2)
+
+        self.assertEqual(self.post('api_cart', {'item_id': self.latte.id, 'quantity': 4}).status_code, 409)
+        self.assertEqual(self.post('api_cart', {'item_id': 999, 'quantity': 1}).status_code, 404)
+        self.assertEqual(self.post('api_cart', {'item_id': self.latte.id, 'quantity': 100}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_cart')).json()['count'], 2)
+
+        response = self.client.delete(reverse('api_cart'))
+        self.assertEqual(response.json()['items'], [])
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(MenuItem.objects.get(pk=self.latte.pk).reserved, 0)
+
+    def test_orders_require_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_orders')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('api_order', args=[1])).status_code, 401)
+
+    def test_create_and_read_orders(self):
+        self.assertEqual(self.post('api_orders', {}).json()['error'], "Корзина пуста")
+        self.post('api_cart', {'item_id': self.latte.id, 'quantity': 2})
+        response = self.post('api_orders', {})
+        self.assertEqual(response.status_code, 201, response.content)
+        order_id = response.json()['id']
+        self.assertEqual(self.client.get(reverse('api_cart')).json()['count'], 0)
+
+        listing = self.client.get(reverse('api_orders')).json()
+        self.assertEqual([row['id'] for row in listing['results']], [order_id])
+        self.assertEqual(listing['results'][0]['items'], [
+            {'id': self.latte.id, 'name': 'Латте', 'quantity': 2, 'price': '150.00'},
+        ])
+
+        response = self.client.get(reverse('api_order', args=[order_id]), {'fields': 'status'})
+        self.assertEqual(response.json(), {'id': order_id, 'status': 'new'})
+        again = self.client.get(
+            reverse('api_order', args=[order_id]), {'fields': 'status'}, headers={'if-none-match': response['ETag']},
+        )
+        self.assertEqual(again.status_code, 304)
+
+    def test_other_clients_order_is_404(self):
+        order = self.order((self.latte, 1))
+        CustomUser.objects.create_user(username='other', email='other@example.com', password='secret-pass-2')
+        self.client.login(username='other', password='secret-pass-2')
+        self.assertEqual(self.client.get(reverse('api_order', args=[order.id])).status_code, 404)
+
+    def test_orders_page_by_cursor(self):
+        placed = [self.order((self.latte, 1)).id for _ in range(3)]
+        first = self.client.get(reverse('api_orders'), {'limit': 2, 'fields': 'id'}).json()
+        second = self.client.get(reverse('api_orders'), {'limit': 2, 'cursor': first['next']}).json()
+        self.assertEqual([row['id'] for row in first['results'] + second['results']], placed[::-1])
+        self.assertIsNone(second['next'])
+
+    @override_settings(CHECKOUT_CONFIRMATION='password')
+    def test_password_policy(self):
+        self.post('api_cart', {'item_id': self.latte.id, 'quantity': 1})
+        response = self.post('api_orders', {})
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(response.json()['password_required'])
+        self.assertEqual(self.post('api_orders', {'password': 'secret-pass-1'}).status_code, 201)
@@ -0,0 +1,160 @@
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from coffee.cart import OWNER_COOKIE, CacheCartStorage, Cart, get_storage
+from main.checks import cart_cache_is_shared
+from main.models import SavedCart
+
+from .base import CoffeeTestCase
+
+
+class CartResolveTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.request = RequestFactory().get('/cart/')
+        self.request.user = AnonymousUser()
+        self.items = [self.item(f"Позиция {index}", price='100.00') for index in range(5)]
+        cart = Cart(self.request)
+        for item in self.items:
+            cart.add(item.id, 2)
+
+    def test_lines_and_total_in_one_query(self):
+        cart = Cart(self.request)
+        with self.assertNumQueries(1):
+            lines = list(cart)
+            total = cart.get_total_price()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(total, Decimal('1000.00'))
+        self.assertEqual(len(cart), 10)
+
+    def test_items_come_from_catalog_cache_next_time(self):
+        list(Cart(self.request))
+        cart = Cart(self.request)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_total_price(), Decimal('1000.00'))
+
+    def test_sold_out_item_drops_out_of_lines(self):
+        sold_out = self.items[0]
+        sold_out.in_stock = False
+        sold_out.save()
+        cart = Cart(self.request)
+        self.assertNotIn(sold_out, [line['item'] for line in cart])
+        self.assertEqual(cart.get_total_price(), Decimal('800.00'))
+
+
+class CartStorageTests(CoffeeTestCase):
+    """Корзина переживает запрос в каждом из хранилищ CART_STORAGE."""
+
+    def setUp(self):
+        super().setUp()
+        self.latte = self.item()
+        self.espresso = self.item('Эспрессо', price='90.00')
+
+    def guest(self, cookies=None):
+        request = RequestFactory().get('/cart/')
+        request.user = AnonymousUser()
+        request.COOKIES.update(cookies or {})
+        return request
+
+    def member(self):
+        request = self.guest()
+        request.user = self.client_user
+        return request
+
+    @override_settings(CART_STORAGE='coffee.cart.SessionCartStorage')
+    def test_session_storage(self):
+        request = self.guest()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        Cart(request).add(self.latte.id, 2)
+        self.assertEqual(request.session['cart'], {str(self.latte.id): 2})
+        self.assertEqual(Cart(request).get_quantity(self.latte.id), 2)
+
+        Cart(request).clear()
+        self.assertNotIn('cart', request.session)
+
+    @override_settings(CART_STORAGE='coffee.cart.SignedCookieCartStorage')
+    def test_signed_cookie_storage(self):
+        request = self.guest()
+        cart = Cart(request)
+        cart.add(self.latte.id, 2)
+        cart.add(self.espresso.id)
+        cookie = get_storage().process_response(request, HttpResponse()).cookies['cart']
+
+        next_request = self.guest({'cart': cookie.value})
+        self.assertEqual(Cart(next_request).get_total_price(), Decimal('390.00'))
+        # Подделанная cookie — пустая корзина, а не ошибка
+        self.assertEqual(len(Cart(self.guest({'cart': cookie.value + 'x'}))), 0)
+
+        Cart(next_request).clear()
+        response = get_storage().process_response(next_request, HttpResponse())
+        self.assertEqual(response.cookies['cart'].value, '')
+
+    @override_settings(CART_STORAGE='coffee.cart.CacheCartStorage')
+    def test_cache_storage_guest(self):
+        request = self.guest()
+        Cart(request).add(self.latte.id, 3)
+        token = request._cart_owner
+        self.assertEqual(Cart(self.guest({OWNER_COOKIE: token})).get_quantity(self.latte.id), 3)
+        self.assertEqual(len(Cart(self.guest())), 0)
+
+    @override_settings(CART_STORAGE='coffee.cart.CacheCartStorage')
+    def test_cache_storage_writes_behind_to_db(self):
+        Cart(self.member()).add(self.latte.id, 2)
+        self.assertFalse(SavedCart.objects.exists())
+
+        get_storage().flush()
+        self.assertEqual(SavedCart.objects.get(user=self.client_user).items, {str(self.latte.id): 2})
+        # Кэш потерял корзину — она поднимается из SavedCart
+        cache.clear()
+        self.assertEqual(Cart(self.member()).get_quantity(self.latte.id), 2)
+
+    @override_settings(CART_STORAGE='coffee.cart.CacheCartStorage')
+    def test_flush_writes_current_cache_value(self):
+        Cart(self.member()).add(self.latte.id, 1)
+        # Другой процесс успел поменять корзину в общем кэше
+        cache.set(f"cart:user:{self.client_user.pk}", {str(self.espresso.id): 4})
+        get_storage().flush()
+        self.assertEqual(SavedCart.objects.get(user=self.client_user).items, {str(self.espresso.id): 4})
+
+    @override_settings(CART_STORAGE='coffee.cart.CacheCartStorage')
+    def test_merge_guest_on_login(self):
+        Cart(self.member()).add(self.latte.id, 1)
+        guest = self.guest()
+        cart = Cart(guest)
+        cart.add(self.latte.id, 2)
+        cart.add(self.espresso.id)
+        token = guest._cart_owner
+
+        login = self.guest({OWNER_COOKIE: token})
+        get_storage().merge_guest(login, self.client_user)
+
+        merged = Cart(self.member())
+        self.assertEqual(merged.get_quantity(self.latte.id), 3)
+        self.assertEqual(merged.get_quantity(self.espresso.id), 1)
+        self.assertIsNone(cache.get(f"cart:anon:{token}"))
+        get_storage().flush()
+        self.assertEqual(
+            SavedCart.objects.get(user=self.client_user).items,
+            {str(self.latte.id): 3, str(self.espresso.id): 1},
+        )
+
+    def test_merge_guest_is_noop_for_shared_storages(self):
+        for path in ('coffee.cart.SessionCartStorage', 'coffee.cart.SignedCookieCartStorage'):
+            with self.settings(CART_STORAGE=path):
+                get_storage().merge_guest(self.guest(), self.client_user)
+                self.assertNotIsInstance(get_storage(), CacheCartStorage)
+
+    def test_cache_storage_requires_shared_cache(self):
+        with self.settings(CART_STORAGE='coffee.cart.CacheCartStorage'):
+            self.assertEqual([error.id for error in cart_cache_is_shared(None)], ['main.E001'])
+            redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+            with self.settings(CACHES=redis):
+                self.assertEqual(cart_cache_is_shared(None), [])
+        self.assertEqual(cart_cache_is_shared(None), [])
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from main import catalog, versions
+from main.models import CacheVersion, MenuItem
+
+from .base import CoffeeTestCase
+
+# Меню без кэша (версии уже сверены): состояние каталога (два агрегата),
+# позиции с категориями, категории
+MENU_COLD_QUERIES = 4
+
+
+class CatalogSnapshotTests(CoffeeTestCase):
+
+    def test_snapshot_is_read_from_cache(self):
+        self.item()
+        catalog.get_menu()
+        with self.assertNumQueries(0):
+            menu = catalog.get_menu()
+        self.assertEqual([item.name for item in menu['Кофе']], ['Латте'])
+
+    def test_bump_on_commit_invalidates_snapshot(self):
+        latte = self.item()
+        catalog.get_menu()
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.filter(pk=latte.pk).update(name='Флэт уайт')
+            catalog.bump_version_on_commit()
+        self.assertEqual([item.name for item in catalog.get_menu()['Кофе']], ['Флэт уайт'])
+
+    def test_sold_out_items_are_not_listed(self):
+        self.item()
+        self.item('Раф', in_stock=False)
+        self.assertEqual([item.name for item in catalog.get_menu()['Кофе']], ['Латте'])
+        self.assertEqual(set(catalog.get_items(MenuItem.objects.values_list('id', flat=True))), {
+            MenuItem.objects.get(name='Латте').pk,
+        })
+
+    @override_settings(CACHE_VERSION_CHECK_INTERVAL=0)
+    def test_version_bumped_by_another_process_is_seen(self):
+        before = catalog.get_version()
+        # Другой процесс: поднял часы и версию каталога прямо в таблице
+        clock = CacheVersion.objects.get(name=versions.CLOCK).version + 1
+        CacheVersion.objects.filter(name=versions.CLOCK).update(version=clock)
+        CacheVersion.objects.update_or_create(name=catalog.VERSION_KEY, defaults={'version': clock})
+        self.assertEqual(catalog.get_version(), clock)
+        self.assertGreater(clock, before)
+
+
+class MenuViewQueryTests(CoffeeTestCase):
+    """Сколько SQL на странице меню: рост — регрессия, а не мелочь."""
+
+    def setUp(self):
+        super().setUp()
+        for index in range(15):
+            self.item(f"Позиция {index}", stock=100)
+
+    def test_menu_from_warm_cache(self):
+        url = reverse('menu')
+        self.client.get(url)
+        # Меню, категории и карточки — из кэша
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Позиция 14')
+
+    def test_menu_does_not_grow_with_items(self):
+        url = reverse('menu')
+        with self.assertNumQueries(MENU_COLD_QUERIES):
+            self.client.get(url)
+        for index in range(15, 30):
+            self.item(f"Позиция {index}")
+        cache.clear()
+        with self.assertNumQueries(MENU_COLD_QUERIES):
+            self.client.get(url)
@@ -0,0 +1,127 @@
+import io
+import os
+import tempfile
+from decimal import Decimal
+
+from django.core.management import call_command
+
+from main import catalog_io, fragments
+from main.models import Category, MenuItem
+
+from .base import CoffeeTestCase
+
+CSV = (
+    "category,name,price,stock,in_stock,description,volume_ml,calories,is_vegan\n"
+    "Кофе,Латте,150,10,да,Эспрессо с молоком,300,,нет\n"
+    "Кофе,Раф,200.50,5,1,,,,0\n"
+    "Чай,Пуэр,120,,,,,,\n"
+    "Десерты,,,,,,,,\n"
+)
+
+
+class CatalogImportTests(CoffeeTestCase):
+
+    def run_import(self, text, fmt='csv', **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            return catalog_io.import_catalog(io.StringIO(text), fmt, **options)
+
+    def test_csv_creates_items_and_categories(self):
+        result = self.run_import(CSV)
+        self.assertEqual((result.created, result.updated, result.categories, result.errors), (3, 0, 2, []))
+        latte = MenuItem.objects.get(name='Латте')
+        self.assertEqual(
+            (latte.category, latte.price, latte.stock, latte.volume_ml, latte.calories, latte.is_vegan),
+            (self.category, Decimal('150'), 10, 300, None, False),
+        )
+        self.assertEqual(MenuItem.objects.get(name='Раф').price, Decimal('200.50'))
+        self.assertTrue(Category.objects.filter(name='Десерты', menuitem__isnull=True).exists())
+        self.assertEqual(Category.objects.get(name='Чай').item_count, 1)
+
+    def test_reimport_writes_only_changes(self):
+        self.run_import(CSV)
+        latte = MenuItem.objects.get(name='Латте')
+        version = fragments.get_versions([latte.id])[latte.id]
+
+        result = self.run_import(CSV.replace('Латте,150', 'Латте,160'))
+        self.assertEqual((result.created, result.updated, result.unchanged), (0, 1, 2))
+        latte_after = MenuItem.objects.get(pk=latte.pk)
+        self.assertEqual(latte_after.price, Decimal('160'))
+        self.assertGreater(latte_after.updated_at, latte.updated_at)
+        self.assertGreater(fragments.get_versions([latte.id])[latte.id], version)
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        text = (
+            "category,name,price,stock\n"
+            "Кофе,Латте,дорого,1\n"
+            ",Без категории,100,1\n"
+            "Кофе,Новая без цены,,1\n"
+            "Кофе,Раф,200,-5\n"
+            "Кофе,Мокко,180,3\n"
+        )
+        result = self.run_import(text)
+        self.assertEqual([number for number, _ in result.errors], [2, 3, 4, 5])
+        self.assertEqual(list(MenuItem.objects.values_list('name', flat=True)), ['Мокко'])
+
+    def test_dry_run_writes_nothing(self):
+        result = self.run_import(CSV, dry_run=True)
+        self.assertEqual((result.created, result.categories), (3, 2))
+        self.assertFalse(MenuItem.objects.exists())
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['Кофе'])
+
+    def test_small_batches(self):
+        result = self.run_import(CSV, batch_size=1)
+        self.assertEqual((result.created, result.categories), (3, 2))
+
+    def test_json_array_is_read_in_pieces(self):
+        text = '[{"category": "Кофе", "name": "Латте", "price": "150"},\n {"category": "Чай", "name": "Пуэр", "price": 120}]'
+        rows = list(catalog_io._json_array(io.StringIO(text), read_size=7))
+        self.assertEqual([number for number, _ in rows], [1, 2])
+        self.assertEqual(rows[1][1]['name'], 'Пуэр')
+        result = self.run_import(text, 'json')
+        self.assertEqual((result.created, result.errors), (2, []))
+
+    def test_broken_json_reports_and_stops(self):
+        rows = list(catalog_io._json_array(io.StringIO('[{"name": "Латте"}, {"name": oops}, {}]')))
+        self.assertEqual(rows[0], (1, {'name': 'Латте'}))
+        self.assertIsInstance(rows[1][1], ValueError)
+        self.assertEqual(len(rows), 2)
+
+    def test_jsonl(self):
+        text = '{"category": "Кофе", "name": "Латте", "price": 150}\n\nне json\n'
+        result = self.run_import(text, 'jsonl')
+        self.assertEqual(result.created, 1)
+        self.assertEqual([number for number, _ in result.errors], [3])
+
+
+class CatalogExportTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.item('Латте', description='С молоком, "пенкой"', volume_ml=300)
+        self.item('Раф', price='200.50', is_vegan=True)
+        Category.objects.create(name='Десерты')
+
+    def test_round_trip(self):
+        for fmt in catalog_io.FORMATS:
+            exported = ''.join(catalog_io.export_lines(catalog_io.export_rows(), fmt))
+            before = list(catalog_io.export_rows())
+            MenuItem.objects.all().delete()
+            Category.objects.all().delete()
+            result = catalog_io.import_catalog(io.StringIO(exported), fmt)
+            self.assertEqual((result.created, result.errors), (2, []), fmt)
+            self.assertEqual(list(catalog_io.export_rows()), before, fmt)
+
+    def test_commands(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'menu.jsonl')
+        self.addCleanup(os.rmdir, directory)
+        self.addCleanup(os.remove, path)
+
+        call_command('export_menu', format='jsonl', output=path)
+        out = io.StringIO()
+        call_command('import_menu', path, dry_run=True, stdout=out, stderr=io.StringIO())
+        self.assertIn('новых 0, обновлено 0, без изменений 2, новых категорий 0, ошибок 0', out.getvalue())
+
+        out = io.StringIO()
+        call_command('export_menu', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[0], ','.join(catalog_io.COLUMNS))
@@ -0,0 +1,67 @@
+from django.urls import reverse
+from django.utils.http import http_date
+
+from .base import CoffeeTestCase
+
+
+class ConditionalGetTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.latte = self.item()
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers=headers)
+
+    def save(self, obj, **fields):
+        for name, value in fields.items():
+            setattr(obj, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.save()
+
+    def test_menu_not_modified(self):
+        url = reverse('menu')
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Cookie', response['Vary'])
+        etag = response['ETag']
+
+        response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.get(url, if_modified_since=response['Last-Modified']).status_code, 304)
+
+    def test_menu_etag_follows_catalog_and_viewer(self):
+        url = reverse('menu')
+        etag = self.get(url)['ETag']
+        self.save(self.latte, price='170.00')
+        changed = self.get(url, if_none_match=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+        # Страница показывает вошедшего клиента — у него свой ETag
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.get(url, if_none_match=changed['ETag']).status_code, 200)
+
+    def test_item_page_not_modified(self):
+        url = reverse('menu_detail', args=[self.latte.id])
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(url, if_none_match=etag).status_code, 304)
+
+        self.save(self.category, name='Кофе с молоком')
+        self.assertEqual(self.get(url, if_none_match=etag).status_code, 200)
+
+    def test_item_page_changes_with_item(self):
+        url = reverse('menu_detail', args=[self.latte.id])
+        response = self.get(url)
+        self.save(self.latte, description='С корицей')
+        response = self.get(url, if_none_match=response['ETag'], if_modified_since=http_date(0))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'С корицей')
+
+    def test_sold_out_item_page_is_404(self):
+        self.save(self.latte, in_stock=False)
+        self.assertEqual(self.get(reverse('menu_detail', args=[self.latte.id])).status_code, 404)
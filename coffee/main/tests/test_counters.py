@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from main import counters, order_status
+from main.models import CustomUser, Order, OrderItem
+
+from .base import CoffeeTestCase
+
+
+class CounterTests(CoffeeTestCase):
+
+    def assertCountersMatchRecount(self):
+        # recount() переписывает только разошедшиеся строки — их быть не должно
+        self.assertEqual(counters.recount(), {'Order': 0, 'Category': 0, 'CustomUser': 0})
+
+    def test_incremental_counters_match_recount(self):
+        latte, raf = self.item(stock=50), self.item('Раф', price='200.00', stock=50)
+        self.item('Какао')
+        first = self.order((latte, 2), (raf, 1))
+        second = self.order((latte, 1))
+        third = self.order((raf, 4))
+
+        order_status.transition([first.pk], 'pending')
+        order_status.transition([first.pk], 'ready')
+        order_status.transition([first.pk], 'completed')
+        order_status.transition([second.pk], 'cancelled', reason='передумал')
+
+        # Одиночные сохранения и удаления — через сигналы
+        line = OrderItem.objects.get(order=third)
+        line.quantity = 2
+        line.save()
+        OrderItem.objects.create(order=third, menu_item=latte, quantity=3, price_per_unit=latte.price)
+        OrderItem.objects.filter(order=first, menu_item=raf).get().delete()
+        Order.objects.get(pk=second.pk).delete()
+        raf.delete()
+
+        self.assertCountersMatchRecount()
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.order_count, 2)
+        self.assertEqual(self.client_user.total_spent, Decimal('500.00'))
+        third.refresh_from_db()
+        self.assertEqual((third.line_count, third.unit_count), (1, 3))
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.item_count, 2)
+
+    def test_recount_repairs_drift(self):
+        latte = self.item()
+        order = self.order((latte, 2))
+        Order.objects.filter(pk=order.pk).update(line_count=7, unit_count=0)
+        CustomUser.objects.filter(pk=self.client_user.pk).update(order_count=0)
+
+        self.assertEqual(counters.recount(), {'Order': 1, 'Category': 0, 'CustomUser': 1})
+        order.refresh_from_db()
+        self.assertEqual((order.line_count, order.unit_count), (1, 2))
+        self.assertCountersMatchRecount()
+
+    def test_decrement_never_goes_below_zero(self):
+        counters.add_category_items({self.category.pk: -5})
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.item_count, 0)
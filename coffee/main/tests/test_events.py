@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.test import override_settings
+from django.urls import reverse
+
+from main import order_status
+from main.events import get_feed
+
+from .base import CoffeeTestCase
+
+
+@override_settings(ORDER_EVENTS_STREAM=True, ORDER_EVENTS_POLL_INTERVAL=0.01)
+class OrderEventsTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.placed = self.order((self.item(), 1))
+
+    async def test_anonymous_gets_401(self):
+        response = await self.async_client.get(reverse('order_events'))
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(ORDER_EVENTS_STREAM=False)
+    async def test_disabled_stream_is_404(self):
+        await self.async_client.aforce_login(self.client_user)
+        response = await self.async_client.get(reverse('order_events'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_pages_do_not_subscribe_when_disabled(self):
+        self.client.force_login(self.client_user)
+        with self.settings(ORDER_EVENTS_STREAM=False):
+            self.assertNotContains(self.client.get(reverse('my_orders')), 'subscribeOrderEvents')
+        self.assertContains(self.client.get(reverse('my_orders')), 'subscribeOrderEvents')
+
+    async def test_subscriber_receives_status_change(self):
+        await self.async_client.aforce_login(self.client_user)
+        response = await self.async_client.get(reverse('order_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        feed = get_feed()
+        try:
+            self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+            await sync_to_async(order_status.transition)([self.placed.pk], 'pending')
+
+            async def next_pending():
+                while True:
+                    chunk = (await anext(chunks)).decode()
+                    if not chunk.startswith('event: order'):
+                        continue
+                    event = json.loads(chunk.split('data: ', 1)[1])
+                    if event['status'] == 'pending':
+                        return event
+
+            event = await asyncio.wait_for(next_pending(), 5)
+            self.assertEqual(event['id'], self.placed.pk)
+            self.assertEqual(event['client_id'], self.client_user.pk)
+        finally:
+            feed.subscribers.clear()
+            feed._task.cancel()
@@ -0,0 +1,96 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import override_settings
+
+from main import fragments
+from main.models import MenuItem
+
+from .base import CoffeeTestCase
+
+
+class FragmentCacheTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.latte = self.item()
+        self.mocha = self.item('Мокко')
+
+    def card(self, item):
+        return str(fragments.cards([MenuItem.objects.get(pk=item.pk)], '/menu/')[0])
+
+    def test_card_is_served_from_cache(self):
+        self.assertIn('Латте', self.card(self.latte))
+        # UPDATE в обход сигналов: версия та же — отдаётся кэш
+        MenuItem.objects.filter(pk=self.latte.pk).update(name='Раф')
+        self.assertIn('Латте', self.card(self.latte))
+
+    def test_item_save_bumps_only_its_fragments(self):
+        self.card(self.latte)
+        before = fragments.get_versions([self.latte.id, self.mocha.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.latte.name = 'Раф'
+            self.latte.save()
+        after = fragments.get_versions([self.latte.id, self.mocha.id])
+        self.assertGreater(after[self.latte.id], before[self.latte.id])
+        self.assertEqual(after[self.mocha.id], before[self.mocha.id])
+        self.assertIn('Раф', self.card(self.latte))
+
+    def test_category_rename_bumps_item_pages(self):
+        loads = []
+
+        def load():
+            loads.append(self.latte.id)
+            return self.latte
+
+        fragments.detail(self.latte.id, load)
+        fragments.detail(self.latte.id, load)
+        self.assertEqual(len(loads), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Кофе с молоком'
+            self.category.save()
+        fragments.detail(self.latte.id, load)
+        self.assertEqual(len(loads), 2)
+
+    def test_bump_image_bumps_items_with_that_image(self):
+        MenuItem.objects.filter(pk=self.latte.pk).update(image='menu/latte.jpg')
+        before = fragments.get_versions([self.latte.id, self.mocha.id])
+        fragments.bump_image('menu/latte.jpg')
+        after = fragments.get_versions([self.latte.id, self.mocha.id])
+        self.assertGreater(after[self.latte.id], before[self.latte.id])
+        self.assertEqual(after[self.mocha.id], before[self.mocha.id])
+
+
+class BuildImageVariantsCommandTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_backfill_bumps_fragments_like_the_task(self):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'brown').save(buffer, 'JPEG')
+        name = default_storage.save('menu/latte.jpg', ContentFile(buffer.getvalue()))
+        latte = self.item()
+        MenuItem.objects.filter(pk=latte.pk).update(image=name)
+        before = fragments.get_versions([latte.id])[latte.id]
+
+        out = StringIO()
+        call_command('build_image_variants', workers=1, stdout=out)
+        self.assertIn('Готово: 6 файлов, ошибок 0', out.getvalue())
+        self.assertGreater(fragments.get_versions([latte.id])[latte.id], before)
+
+        # Повторный прогон ничего не режет — и фрагменты не трогает
+        before = fragments.get_versions([latte.id])[latte.id]
+        call_command('build_image_variants', workers=1, stdout=StringIO())
+        self.assertEqual(fragments.get_versions([latte.id])[latte.id], before)
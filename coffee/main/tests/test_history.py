@@ -0,0 +1,64 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.urls import reverse
+from django.utils import timezone
+
+from main import history
+from main.models import CustomUser, Order
+
+from .base import CoffeeTestCase
+
+
+class HistoryCursorTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Часть заказов — в одну и ту же секунду: порядок между ними решает id
+        now = timezone.now().replace(microsecond=0)
+        for index in range(25):
+            order = Order.objects.create(client=self.client_user, total=Decimal('100.00'))
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(minutes=index // 3))
+        self.expected = list(
+            Order.objects.filter(client=self.client_user).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+    def test_pages_cover_history_once_in_order(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = history.order_history(self.client_user, cursor, page_size=7)
+            seen.extend(order.id for order in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_last_full_page_has_no_cursor(self):
+        page, cursor = history.order_history(self.client_user, page_size=25)
+        self.assertEqual(len(page), 25)
+        self.assertIsNone(cursor)
+
+    def test_cursor_round_trip(self):
+        order = Order.objects.get(pk=self.expected[3])
+        self.assertEqual(history.decode_cursor(history.encode_cursor(order)), (order.created_at, order.id))
+
+    def test_tampered_cursor_starts_from_first_page(self):
+        _, cursor = history.order_history(self.client_user, page_size=5)
+        self.assertIsNone(history.decode_cursor(cursor + 'x'))
+        page, _ = history.order_history(self.client_user, cursor + 'x', page_size=5)
+        self.assertEqual([order.id for order in page], self.expected[:5])
+
+    def test_other_clients_orders_are_not_shown(self):
+        other = CustomUser.objects.create_user(username='other', email='other@example.com', password='secret-pass-2')
+        Order.objects.create(client=other, total=Decimal('1.00'))
+        page, _ = history.order_history(self.client_user, page_size=100)
+        self.assertEqual([order.id for order in page], self.expected)
+
+    def test_profile_and_more_pages(self):
+        self.client.login(username='client', password='secret-pass-1')
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order.id for order in response.context['orders']], self.expected[:20])
+
+        response = self.client.get(reverse('orders_more'), {'cursor': response.context['next_cursor']})
+        self.assertEqual([order.id for order in response.context['orders']], self.expected[20:])
+        self.assertEqual(response['X-Next-Cursor'], '')
@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+
+from main import images, tasks
+from main.models import MenuItem, Task
+from main.templatetags.menu_images import picture
+
+from .base import CoffeeTestCase
+
+
+class ImageVariantTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, width, height=300, name='menu/latte.jpg'):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'brown').save(buffer, 'JPEG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_variant_name(self):
+        self.assertEqual(images.variant_name('menu/474_kofe.jpg', 640, 'webp'), 'menu/variants/474_kofe-640.webp')
+
+    def test_target_widths_never_exceed_original(self):
+        self.assertEqual(images.target_widths(2000), [320, 640, 1024])
+        self.assertEqual(images.target_widths(1024), [320, 640, 1024])
+        self.assertEqual(images.target_widths(800), [320, 640, 800])
+        self.assertEqual(images.target_widths(200), [200])
+
+    def test_build_variants(self):
+        name = self.upload(800)
+        self.assertEqual(images.available_widths(name), [])
+        self.assertEqual(images.build_variants(name), 6)
+        self.assertEqual(images.available_widths(name), [320, 640, 800])
+        self.assertTrue(images.is_complete(images.available_widths(name)))
+        # Готовые копии не режутся заново, с force — режутся
+        self.assertEqual(images.build_variants(name), 0)
+        self.assertEqual(images.build_variants(name, force=True), 6)
+
+    def test_stale_wider_variants_are_removed(self):
+        name = self.upload(800)
+        stale = default_storage.save(images.variant_name(name, 1024, 'jpg'), ContentFile(b'old'))
+        images.build_variants(name)
+        self.assertFalse(default_storage.exists(stale))
+
+    def test_picture_tag(self):
+        name = self.upload(800)
+        item = self.item(image=name)
+        self.assertNotIn('srcset', picture(item.image))
+        images.build_variants(name)
+        html = picture(item.image, alt='Латте', sizes='50vw')
+        self.assertIn('menu/variants/latte-320.webp 320w', html)
+        self.assertIn('menu/variants/latte-800.jpg 800w', html)
+        self.assertNotIn('1024w', html)
+        self.assertEqual(picture(None), '')
+
+    def test_new_image_is_cut_by_a_background_task(self):
+        name = self.upload(500)
+        item = self.item(image=name)
+        task = Task.objects.get(name='image_variants')
+        self.assertEqual(task.payload, {'name': name})
+        before = MenuItem.objects.get(pk=item.pk)
+
+        self.assertEqual(tasks.run_batch(tasks.claim('test')), (1, 0, 0))
+        self.assertEqual(images.available_widths(name), [320, 500])
+        # Сохранение без смены картинки задачу не ставит
+        before.save(update_fields=['price'])
+        self.assertEqual(Task.objects.filter(name='image_variants').count(), 1)
@@ -0,0 +1,62 @@
+from main import order_status
+from main.models import Order, OrderStatusHistory, Task
+
+from .base import CoffeeTestCase
+
+
+class OrderStatusTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.latte = self.item(stock=5)
+        self.placed = self.order((self.latte, 2))
+
+    def status(self):
+        return Order.objects.values_list('status', flat=True).get(pk=self.placed.pk)
+
+    def test_can_transition(self):
+        self.assertTrue(order_status.can_transition('new', 'pending'))
+        self.assertTrue(order_status.can_transition('ready', 'ready'))
+        self.assertFalse(order_status.can_transition('new', 'completed'))
+        self.assertFalse(order_status.can_transition('cancelled', 'new'))
+        self.assertFalse(order_status.can_transition('completed', 'cancelled'))
+
+    def test_legal_moves_are_logged(self):
+        for status in ('pending', 'ready', 'completed'):
+            self.assertEqual(order_status.transition([self.placed.pk], status), [self.placed.pk])
+        self.assertEqual(self.status(), 'completed')
+        self.assertEqual(
+            list(OrderStatusHistory.objects.order_by('id').values_list('from_status', 'to_status')),
+            [('new', 'pending'), ('pending', 'ready'), ('ready', 'completed')],
+        )
+
+    def test_illegal_move_is_rejected(self):
+        self.assertEqual(order_status.transition([self.placed.pk], 'completed'), [])
+        self.assertEqual(self.status(), 'new')
+        self.assertFalse(OrderStatusHistory.objects.exists())
+
+    def test_no_way_back_from_cancelled(self):
+        order_status.transition([self.placed.pk], 'cancelled', reason='передумал')
+        for status in ('new', 'pending', 'ready', 'completed'):
+            self.assertEqual(order_status.transition([self.placed.pk], status), [])
+        self.assertEqual(self.status(), 'cancelled')
+
+    def test_only_matching_orders_move(self):
+        other = self.order((self.latte, 1))
+        order_status.transition([other.pk], 'pending')
+
+        self.assertEqual(order_status.transition([self.placed.pk, other.pk], 'ready'), [other.pk])
+        self.assertEqual(self.status(), 'new')
+
+    def test_cancellation_reason_is_kept(self):
+        order_status.transition([self.placed.pk], 'cancelled', reason='нет молока')
+        self.assertEqual(Order.objects.get(pk=self.placed.pk).cancellation_reason, 'нет молока')
+        self.assertEqual(OrderStatusHistory.objects.get().reason, 'нет молока')
+
+    def test_ready_enqueues_notification(self):
+        order_status.transition([self.placed.pk], 'pending')
+        order_status.transition([self.placed.pk], 'ready')
+        self.assertEqual(
+            list(Task.objects.filter(name='order_ready').values_list('payload', flat=True)),
+            [{'order_id': self.placed.pk}],
+        )
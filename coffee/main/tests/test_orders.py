@@ -0,0 +1,109 @@
+from django.test import override_settings
+from django.urls import reverse
+
+from main import order_status, reservations
+from main.models import Order, StockReservation
+from main.orders import OutOfStock
+
+from .base import CoffeeTestCase
+
+# Оформление заказа из пяти позиций: сессия, клиент, версии, корзина,
+# списание и бронь, цены, заказ, счётчик клиента, строки, письмо
+CHECKOUT_QUERIES = 14
+
+
+class PlaceOrderTests(CoffeeTestCase):
+
+    def test_writes_off_stock(self):
+        latte, raf = self.item(stock=5), self.item('Раф', stock=3)
+        order = self.order((latte, 2), (raf, 3))
+
+        latte.refresh_from_db()
+        raf.refresh_from_db()
+        self.assertEqual((latte.stock, latte.in_stock), (3, True))
+        # Последние единицы проданы — позиция снята с продажи
+        self.assertEqual((raf.stock, raf.in_stock), (0, False))
+        self.assertEqual((order.line_count, order.unit_count), (2, 5))
+        self.assertEqual(str(order.total), '750.00')
+
+    def test_oversell_rolls_back_whole_order(self):
+        latte, raf = self.item(stock=5), self.item('Раф', stock=1)
+
+        with self.assertRaises(OutOfStock) as raised:
+            self.order((latte, 2), (raf, 2))
+
+        self.assertEqual(raised.exception.names, ['Раф'])
+        self.assertFalse(Order.objects.exists())
+        latte.refresh_from_db()
+        self.assertEqual(latte.stock, 5)
+
+    def test_second_order_cannot_take_the_same_units(self):
+        latte = self.item(stock=3)
+        self.order((latte, 2))
+
+        with self.assertRaises(OutOfStock):
+            self.order((latte, 2))
+        latte.refresh_from_db()
+        self.assertEqual(latte.stock, 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_reserved_units_are_sold_only_to_their_owner(self):
+        latte = self.item(stock=3)
+        self.assertTrue(reservations.reserve(['guest:other'], latte.id, 2))
+
+        with self.assertRaises(OutOfStock):
+            self.order((latte, 2), owners=['guest:mine'])
+        self.order((latte, 2), owners=['guest:other'])
+
+        latte.refresh_from_db()
+        self.assertEqual((latte.stock, latte.reserved), (1, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class ReturnStockTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.latte = self.item(stock=2)
+        self.placed = self.order((self.latte, 2))
+
+    def test_cancel_returns_stock_and_puts_item_back_on_sale(self):
+        order_status.transition([self.placed.pk], 'cancelled', reason='нет молока')
+        self.latte.refresh_from_db()
+        self.assertEqual((self.latte.stock, self.latte.in_stock), (2, True))
+
+    def test_cancel_by_single_save_returns_stock(self):
+        order = Order.objects.get(pk=self.placed.pk)
+        order.status, order.cancellation_reason = 'cancelled', 'нет молока'
+        order.save()
+        self.latte.refresh_from_db()
+        self.assertEqual(self.latte.stock, 2)
+
+    def test_deleting_new_order_returns_stock(self):
+        Order.objects.get(pk=self.placed.pk).delete()
+        self.latte.refresh_from_db()
+        self.assertEqual(self.latte.stock, 2)
+
+    def test_deleting_completed_order_keeps_stock_sold(self):
+        for status in ('pending', 'ready', 'completed'):
+            order_status.transition([self.placed.pk], status)
+        Order.objects.get(pk=self.placed.pk).delete()
+        self.latte.refresh_from_db()
+        self.assertEqual((self.latte.stock, self.latte.in_stock), (0, False))
+
+
+@override_settings(CHECKOUT_CONFIRMATION='recent')
+class CheckoutViewTests(CoffeeTestCase):
+
+    def test_checkout_queries(self):
+        items = [self.item(f"Позиция {index}", stock=100) for index in range(5)]
+        self.client.login(username='client', password='secret-pass-1')
+        for item in items:
+            self.client.post(reverse('cart_add', args=[item.id]))
+
+        with self.assertNumQueries(CHECKOUT_QUERIES):
+            response = self.client.post(reverse('order_create'))
+        self.assertTrue(response.json()['success'], response.json())
+        order = Order.objects.get()
+        self.assertEqual((order.line_count, order.unit_count), (5, 5))
+        self.assertFalse(StockReservation.objects.exists())
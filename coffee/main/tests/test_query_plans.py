@@ -0,0 +1,14 @@
+import io
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN — только SQLite")
+class QueryPlanTests(TestCase):
+
+    def test_hot_queries_use_indexes(self):
+        # Команда падает CommandError, если какой-то запрос читает таблицу целиком
+        call_command('check_query_plans', stdout=io.StringIO())
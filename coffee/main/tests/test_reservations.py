@@ -0,0 +1,107 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from main import reservations
+from main.models import MenuItem, StockReservation
+
+from .base import CoffeeTestCase
+
+
+class ReservationTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.croissant = self.item('Круассан', stock=3)
+
+    def reserved(self):
+        return MenuItem.objects.values_list('reserved', flat=True).get(pk=self.croissant.pk)
+
+    def expire(self, owner):
+        StockReservation.objects.filter(owner=owner).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_reserve_holds_free_stock_only(self):
+        self.assertTrue(reservations.reserve(['guest:a'], self.croissant.id, 2))
+        self.assertFalse(reservations.reserve(['guest:b'], self.croissant.id, 2))
+        self.assertTrue(reservations.reserve(['guest:b'], self.croissant.id, 1))
+        self.assertEqual(self.reserved(), 3)
+
+    def test_reserve_down_and_to_zero_returns_units(self):
+        reservations.reserve(['guest:a'], self.croissant.id, 3)
+        reservations.reserve(['guest:a'], self.croissant.id, 1)
+        self.assertEqual(self.reserved(), 1)
+        reservations.reserve(['guest:a'], self.croissant.id, 0)
+        self.assertEqual(self.reserved(), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_hold_gives_way_to_other_cart(self):
+        reservations.reserve(['guest:a'], self.croissant.id, 3)
+        self.assertFalse(reservations.reserve(['guest:b'], self.croissant.id, 1))
+        self.expire('guest:a')
+        self.assertTrue(reservations.reserve(['guest:b'], self.croissant.id, 1))
+        self.assertEqual(self.reserved(), 1)
+        self.assertEqual(list(StockReservation.objects.values_list('owner', flat=True)), ['guest:b'])
+
+    def test_sweep_releases_only_expired(self):
+        reservations.reserve(['guest:a'], self.croissant.id, 1)
+        reservations.reserve(['guest:b'], self.croissant.id, 2)
+        self.expire('guest:a')
+        out = StringIO()
+        call_command('sweep_reservations', stdout=out)
+        self.assertIn('Снято истёкших броней: 1', out.getvalue())
+        self.assertEqual(self.reserved(), 2)
+        self.assertEqual(list(StockReservation.objects.values_list('owner', flat=True)), ['guest:b'])
+
+    def test_sweep_in_batches(self):
+        for owner in 'abc':
+            reservations.reserve([f"guest:{owner}"], self.croissant.id, 1)
+            self.expire(f"guest:{owner}")
+        self.assertEqual(reservations.sweep(batch_size=2), 3)
+        self.assertEqual(self.reserved(), 0)
+
+    def test_hold_extended_after_selection_survives(self):
+        reservations.reserve(['guest:a'], self.croissant.id, 2)
+        # Чистильщик выбрал бронь как истёкшую, а корзина успела её продлить
+        now = timezone.now()
+        self.assertEqual(reservations._delete(StockReservation.objects.all(), expired_before=now), 0)
+        self.assertEqual(self.reserved(), 2)
+        self.assertTrue(StockReservation.objects.exists())
+
+
+class CartReservationViewTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.croissant = self.item('Круассан', stock=3)
+        self.client.login(username='client', password='secret-pass-1')
+
+    def held(self):
+        return reservations.held([f"user:{self.client_user.pk}"], [self.croissant.id]).get(self.croissant.id, 0)
+
+    def test_add_requires_post(self):
+        response = self.client.get(reverse('cart_add', args=[self.croissant.id]))
+        self.assertEqual(response.status_code, 405)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_add_update_remove_move_the_hold(self):
+        self.client.post(reverse('cart_add', args=[self.croissant.id]))
+        self.client.post(reverse('cart_update'), {'item_id': self.croissant.id, 'action': 'inc'})
+        self.assertEqual(self.held(), 2)
+
+        self.client.post(reverse('cart_update'), {'item_id': self.croissant.id, 'action': 'dec'})
+        self.assertEqual(self.held(), 1)
+        self.assertEqual(MenuItem.objects.get(pk=self.croissant.pk).reserved, 1)
+
+        self.client.post(reverse('cart_remove', args=[self.croissant.id]))
+        self.assertEqual(self.held(), 0)
+        self.assertEqual(MenuItem.objects.get(pk=self.croissant.pk).reserved, 0)
+
+    def test_add_beyond_stock_is_refused(self):
+        for _ in range(4):
+            self.client.post(reverse('cart_add', args=[self.croissant.id]))
+        self.assertEqual(self.held(), 3)
+        response = self.client.post(reverse('cart_add', args=[self.croissant.id]), {'next': reverse('menu')})
+        self.assertRedirects(response, reverse('menu'), fetch_redirect_response=False)
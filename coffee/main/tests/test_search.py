@@ -0,0 +1,86 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main import search
+from main.models import Category, CustomUser, MenuItem
+
+from .base import CoffeeTestCase
+
+
+class StemTests(CoffeeTestCase):
+
+    def test_word_forms_share_a_stem(self):
+        self.assertEqual(search.stem('капучино'), search.stem('капучиной'))
+        self.assertEqual(search.stem('сливками'), search.stem('сливки'))
+
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual(search.build_match('ванильный лат'), f'"{search.stem("ванильный")}" "лат"*')
+        self.assertEqual(search.build_match('  !? '), '')
+
+
+@skipUnless(connection.vendor == 'sqlite', "индекс FTS5 — только на SQLite")
+class SearchTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tea = Category.objects.create(name='Чай')
+        self.latte = self.item('Латте ванильный', description='Эспрессо со сливками')
+        self.raf = self.item('Раф', description='Сливки и ваниль')
+        self.green = self.item('Зелёный чай', category=self.tea)
+        self.gone = self.item('Латте миндальный', in_stock=False)
+
+    def names(self, items):
+        return [item.name for item in items]
+
+    def test_find_ranks_name_above_description(self):
+        self.assertEqual(self.names(search.find('сливки')), ['Раф', 'Латте ванильный'])
+        self.assertEqual(self.names(search.find('ваниль')), ['Латте ванильный', 'Раф'])
+
+    def test_find_skips_sold_out_and_filters_category(self):
+        self.assertEqual(self.names(search.find('латте')), ['Латте ванильный'])
+        self.assertEqual(self.names(search.find('чай', category_id=self.tea.id)), ['Зелёный чай'])
+        self.assertEqual(search.find('чай', category_id=self.category.id), [])
+
+    def test_index_follows_saves(self):
+        self.raf.name = 'Раф лавандовый'
+        self.raf.save()
+        self.assertEqual(self.names(search.find('лаванд')), ['Раф лавандовый'])
+        self.raf.delete()
+        self.assertEqual(search.find('лаванд'), [])
+
+    def test_matching_filters_by_subquery(self):
+        with CaptureQueriesContext(connection) as queries:
+            found = list(search.matching(MenuItem.objects.order_by('id'), 'латте'))
+        self.assertEqual(self.names(found), ['Латте ванильный', 'Латте миндальный'])
+        self.assertEqual(len(queries), 1)
+        self.assertIn(f'SELECT rowid FROM {search.TABLE}', queries[0]['sql'])
+        self.assertEqual(list(search.matching(MenuItem.objects.all(), '?!')), [])
+
+    def test_matching_limit_keeps_best(self):
+        found = search.matching(MenuItem.objects.all(), 'ваниль', limit=1)
+        self.assertEqual(self.names(found), ['Латте ванильный'])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.TABLE}")
+        self.assertEqual(search.find('раф'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.names(search.find('раф')), ['Раф'])
+
+    def test_admin_search(self):
+        CustomUser.objects.create_superuser(username='boss', email='boss@example.com', password='secret-pass-2')
+        self.client.login(username='boss', password='secret-pass-2')
+        response = self.client.get(reverse('admin:main_menuitem_changelist'), {'q': 'латте'})
+        self.assertEqual(
+            sorted(item.name for item in response.context['cl'].result_list),
+            ['Латте ванильный', 'Латте миндальный'],
+        )
+
+    def test_api_search(self):
+        response = self.client.get(reverse('api_menu'), {'q': 'латте', 'fields': 'id,name'})
+        self.assertEqual(response.json()['results'], [{'id': self.latte.id, 'name': 'Латте ванильный'}])
@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.core import mail
+from django.db import transaction
+from django.utils import timezone
+
+from main import tasks
+from main.models import Task
+
+from .base import CoffeeTestCase
+
+
+class TaskQueueTests(CoffeeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+        tasks.registry['test_echo'] = lambda payload, batch: self.calls.append(payload)
+        self.addCleanup(tasks.registry.pop, 'test_echo')
+        tasks.registry['test_fail'] = self.fail_task
+        self.addCleanup(tasks.registry.pop, 'test_fail')
+
+    @staticmethod
+    def fail_task(payload, batch):
+        raise RuntimeError("нет связи")
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(KeyError):
+            tasks.enqueue('no_such_task')
+
+    def test_task_rolls_back_with_its_data(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                tasks.enqueue('test_echo', {'n': 1})
+                raise RuntimeError
+        self.assertFalse(Task.objects.exists())
+
+    def test_claim_and_run(self):
+        tasks.enqueue_many('test_echo', [{'n': 1}, {'n': 2}])
+        tasks.enqueue('test_echo', {'n': 3}, run_after=timezone.now() + timedelta(hours=1))
+
+        batch = tasks.claim('worker-1')
+        self.assertEqual([task.payload for task in batch], [{'n': 1}, {'n': 2}])
+        # Задачи под арендой другой воркер не получит
+        self.assertEqual(tasks.claim('worker-2'), [])
+
+        self.assertEqual(tasks.run_batch(batch), (2, 0, 0))
+        self.assertEqual(self.calls, [{'n': 1}, {'n': 2}])
+        self.assertEqual(
+            list(Task.objects.order_by('id').values_list('status', 'attempts', 'locked_by')),
+            [('done', 1, ''), ('done', 1, ''), ('pending', 0, '')],
+        )
+
+    def test_expired_lease_is_claimed_again(self):
+        tasks.enqueue('test_echo', {'n': 1})
+        tasks.claim('dead-worker')
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(tasks.claim('worker-2')), 1)
+
+    def test_failure_backs_off_then_fails(self):
+        tasks.enqueue('test_fail', max_attempts=2)
+
+        with self.assertLogs('main.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_batch(tasks.claim('worker')), (0, 1, 0))
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts, task.last_error), ('pending', 1, "RuntimeError: нет связи"))
+        self.assertGreater(task.run_after, timezone.now() + timedelta(seconds=20))
+        self.assertEqual(tasks.claim('worker'), [])
+
+        Task.objects.update(run_after=timezone.now())
+        with self.assertLogs('main.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_batch(tasks.claim('worker')), (0, 0, 1))
+        self.assertEqual(Task.objects.get().status, 'failed')
+
+    def test_backoff_grows_and_is_capped(self):
+        self.assertLess(tasks.backoff(1), tasks.backoff(4))
+        self.assertLessEqual(tasks.backoff(30), timedelta(seconds=tasks.BACKOFF_MAX * 1.2))
+
+
+class OrderEmailTaskTests(CoffeeTestCase):
+
+    def test_order_emails_go_through_the_outbox(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.order((self.item(), 1))
+            second = self.order((self.item('Раф'), 2))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Task.objects.filter(name='order_confirmation').count(), 2)
+
+        self.assertEqual(tasks.run_batch(tasks.claim('worker')), (2, 0, 0))
+        self.assertEqual(
+            [message.subject for message in mail.outbox],
+            [f"Заказ #{first.id} принят", f"Заказ #{second.id} принят"],
+        )
+        self.assertEqual(mail.outbox[0].to, ['client@example.com'])
+        self.assertIn('Раф × 2', mail.outbox[1].body)
+
+    def test_client_without_email_gets_nothing(self):
+        self.client_user.email = ''
+        self.client_user.save()
+        self.order((self.item(), 1))
+        self.assertEqual(tasks.run_batch(tasks.claim('worker')), (1, 0, 0))
+        self.assertEqual(mail.outbox, [])
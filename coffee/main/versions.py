@@ -0,0 +1,107 @@
+"""
+Версии кэша, общие для всех процессов.
+
+Сами данные (снимки каталога, HTML-фрагменты) лежат в кэше процесса под
+ключом с версией; версии — в таблице CacheVersion. Любое увеличение версий
+поднимает общие часы (строка CLOCK) и ставит затронутым ключам их новое
+значение — поэтому процесс догоняет чужие изменения одним запросом
+«всё, что новее виденного». Часы процесс сверяет не чаще раза в
+CACHE_VERSION_CHECK_INTERVAL секунд, свои изменения видит сразу.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from coffee import db_router
+
+from .models import CacheVersion
+
+CLOCK = 'clock'
+BASE = 'base'       # версия ключей, которые ещё ни разу не увеличивали
+RESERVED = {CLOCK, BASE}
+
+# Сколько ключей в одном запросе: у SQLite ограничено число параметров
+CHUNK = 500
+
+_lock = threading.Lock()
+_known = {}          # ключ → версия (то, что этот процесс уже видел)
+_state = {'seen': None, 'checked': 0.0}
+
+
+def _interval():
+    return getattr(settings, 'CACHE_VERSION_CHECK_INTERVAL', 1.0)
+
+
+def _clock():
+    # Часы заводим со времени, а не с нуля: после пересоздания базы версии
+    # не совпадут со снимками, которые ещё лежат в кэше
+    clock = CacheVersion.objects.filter(name=CLOCK).values_list('version', flat=True).first()
+    if clock is None:
+        start = int(time.time() * 1000)
+        CacheVersion.objects.bulk_create(
+            [CacheVersion(name=name, version=start) for name in RESERVED], ignore_conflicts=True,
+        )
+        clock = CacheVersion.objects.filter(name=CLOCK).values_list('version', flat=True).first()
+    return clock
+
+
+def _sync():
+    now = time.monotonic()
+    if _state['seen'] is not None and now - _state['checked'] < _interval():
+        return
+    # Версии читаем только из основной базы: отставшая реплика вернула бы старые
+    seen = _state['seen']
+    rows = None
+    with db_router.primary():
+        clock = _clock()
+        if clock != seen:
+            changed = CacheVersion.objects.exclude(name=CLOCK)
+            if seen is not None:
+                changed = changed.filter(version__gt=seen)
+            rows = dict(changed.values_list('name', 'version'))
+    with _lock:
+        if rows is not None:
+            _merge(rows)
+            _state['seen'] = max(clock, _state['seen'] or clock)
+        _state['checked'] = now
+
+
+def _merge(rows):
+    # Версии только растут: ответ, прочитанный до нашего же bump, не откатит его
+    for name, version in rows.items():
+        if version > _known.get(name, version - 1):
+            _known[name] = version
+
+
+def get_many(names):
+    """{ключ: версия}. Ключ, который ни разу не увеличивали, — с общей начальной версией."""
+    _sync()
+    base = _known.get(BASE, 0)
+    return {name: _known.get(name, base) for name in names}
+
+
+def get(name):
+    return get_many([name])[name]
+
+
+def bump(names):
+    """Увеличивает версии ключей (для всех процессов); возвращает новую версию."""
+    names = [name for name in dict.fromkeys(names) if name not in RESERVED]
+    if not names:
+        return None
+    with transaction.atomic():
+        _clock()
+        CacheVersion.objects.filter(name=CLOCK).update(version=F('version') + 1)
+        clock = CacheVersion.objects.filter(name=CLOCK).values_list('version', flat=True).get()
+        for start in range(0, len(names), CHUNK):
+            chunk = names[start:start + CHUNK]
+            CacheVersion.objects.filter(name__in=chunk).update(version=clock)
+            CacheVersion.objects.bulk_create(
+                [CacheVersion(name=name, version=clock) for name in chunk], ignore_conflicts=True,
+            )
+    with _lock:
+        _merge(dict.fromkeys(names, clock))
+    return clock
@@ -1,58 +1,127 @@
-from .models import MenuItem, Order, OrderItem, Category
+from .models import MenuItem, Order, OrderItem
+from . import catalog, checkout, fragments, order_export, order_status, reservations, rollups, search
+from .orders import place_order, OutOfStock
+from .history import order_history
+from django.db.models import Prefetch
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from coffee.forms import CustomUserCreationForm
 from django.contrib.auth.views import LoginView
 from django.contrib.auth import login, logout
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from coffee.cart import Cart
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.vary import vary_on_cookie
+from django.views.decorators.csrf import ensure_csrf_cookie
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+import asyncio
+import hashlib
+from datetime import date, timedelta
+from django.utils import timezone
+import json
+from .events import get_feed
+from . import perf
 
 def home(request):
     return render(request, 'home.html')
 
+# Условный GET для каталога: ETag и Last-Modified считаются без загрузки
+# позиций (main/catalog.get_state), на совпадение отдаётся 304 без рендера.
+# Страница показывает имя вошедшего клиента, поэтому в ETag есть и он.
+def _viewer(request):
+    user = request.user
+    return f"{user.pk}:{user.username}" if user.is_authenticated else 'anon'
+
+
+def _etag(*parts):
+    return hashlib.md5(':'.join(str(part) for part in parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def _menu_etag(request):
+    state = catalog.get_state()
+    return _etag(state['last_modified'], state['items'], state['categories'], _viewer(request))
+
+
+def _menu_last_modified(request):
+    return catalog.get_state()['last_modified']
+
+
+def _item_changed(request, item_id):
+    # Оба валидатора страницы позиции — из одного маленького запроса
+    if not hasattr(request, '_item_changed'):
+        request._item_changed = (
+            MenuItem.objects.filter(id=item_id, in_stock=True)
+            .values_list('updated_at', 'category__updated_at').first()
+        )
+    return request._item_changed
+
+
+def _item_etag(request, item_id):
+    changed = _item_changed(request, item_id)
+    return _etag(item_id, *changed, _viewer(request)) if changed else None
+
+
+def _item_last_modified(request, item_id):
+    changed = _item_changed(request, item_id)
+    return max(changed) if changed else None
+
+
+# Формы «Добавить» берут токен CSRF из cookie (static/js/cart_add.js) —
+# cookie ставится и на 304
+@ensure_csrf_cookie
+@vary_on_cookie
+@condition(etag_func=_menu_etag, last_modified_func=_menu_last_modified)
 def menu(request):
     category_id = request.GET.get('category')
     sort = request.GET.get('sort', '-created_at')
 
-    items = MenuItem.objects.filter(in_stock=True).select_related('category')
-
-    if category_id and category_id.isdigit():
-        items = items.filter(category_id=category_id)
-
-    # 🔹 Безопасная сортировка: разрешаем новые поля
-    valid_sorts = [
-        '-created_at', 'name', '-name',
-        'price', '-price',
-        'volume_ml', '-volume_ml',
-        'calories', '-calories',
-        'is_vegan'  # False (0) → True (1): сначала веганские
-    ]
-    if sort in valid_sorts:
-        items = items.order_by(sort)
-
-    # Группировка по категориям
-    menu_dict = {}
-    for item in items:
-        cat_name = item.category.name if item.category else "Без категории"
-        menu_dict.setdefault(cat_name, []).append(item)
-
-    categories = Category.objects.all()
+    query = request.GET.get('q', '').strip()
+
     current_category_id = int(category_id) if category_id and category_id.isdigit() else None
 
+    # Меню и категории берутся из снимка каталога: SQL только при первой
+    # сборке после изменения каталога
+    if query:
+        found = search.find(query, current_category_id)
+        menu_items = {f"Поиск: «{query}»": found} if found else {}
+    else:
+        menu_items = catalog.get_menu(current_category_id, sort)
+
+    # Карточки — готовым HTML из кэша фрагментов, рендерятся только изменившиеся
+    cards = iter(fragments.cards([item for items in menu_items.values() for item in items], request.path))
+    menu_items = {name: [next(cards) for _ in items] for name, items in menu_items.items()}
+
     return render(request, 'menu.html', {
-        'menu_items': menu_dict,
-        'categories': categories,
+        'menu_items': menu_items,
+        'categories': catalog.get_categories(),
         'current_category_id': current_category_id,
         'current_sort': sort,
+        'query': query,
     })
 
+# Подсказки по мере ввода: первые совпадения по префиксу
+def menu_suggest(request):
+    query = request.GET.get('q', '').strip()
+    items = search.find(query, limit=8) if query else []
+    return JsonResponse({'results': [
+        {'id': item.id, 'name': item.name, 'price': str(item.price), 'url': reverse('menu_detail', args=[item.id])}
+        for item in items
+    ]})
+
+@ensure_csrf_cookie
+@vary_on_cookie
+@condition(etag_func=_item_etag, last_modified_func=_item_last_modified)
 def menu_detail(request, item_id):
-    item = get_object_or_404(MenuItem, id=item_id, in_stock=True)
-    return render(request, 'menu_detail.html', {'item': item})
+    # Позиция читается из БД, только если её фрагмента нет в кэше
+    name, body = fragments.detail(
+        item_id, lambda: get_object_or_404(MenuItem.objects.select_related('category'), id=item_id, in_stock=True),
+    )
+    return render(request, 'menu_detail.html', {'name': name, 'body': body})
 
 def contacts(request):
     return render(request, 'contacts.html')
@@ -89,35 +158,44 @@ class CustomLoginView(LoginView):
         return super().form_invalid(form)
     
 def custom_logout(request):
+    # Корзина может жить вне сессии (cookie, кэш) — logout её сам не сбросит
+    cart = Cart(request)
+    reservations.release(cart.owners)
+    cart.clear()
     logout(request)
     return redirect('home')
 
 @login_required
 def my_orders(request):
-    orders = Order.objects.filter(client=request.user).order_by('-created_at')
-    return render(request, 'my_orders.html', {'orders': orders})
+    orders, next_cursor = order_history(request.user)
+    return render(request, 'my_orders.html', {'orders': orders, 'next_cursor': next_cursor})
 
 # Корзина
 def cart_detail(request):
     cart = Cart(request)
     return render(request, 'cart.html', {'cart': cart})
 
+@require_POST
 def cart_add(request, item_id):
     cart = Cart(request)
     item = get_object_or_404(MenuItem, id=item_id, in_stock=True)
-    cart.add(item_id)
-    
-    # Показываем сообщение
-    messages.success(request, f"«{item.name}» добавлен в корзину!")
+    # Пока позиция в корзине, её единицы держит бронь (main/reservations.py)
+    if reservations.reserve(cart.owners, item.id, cart.get_quantity(item_id) + 1):
+        cart.add(item_id)
+        # Показываем сообщение
+        messages.success(request, f"«{item.name}» добавлен в корзину!")
+    else:
+        messages.error(request, f"«{item.name}» закончился — больше добавить нельзя.")
     
     # Редирект туда, откуда пришёл (или в корзину)
-    next_url = request.GET.get('next') or 'cart_detail'
+    next_url = request.POST.get('next') or 'cart_detail'
     return redirect(next_url)
 
 # Удалить
 @require_POST
 def cart_remove(request, item_id):
     cart = Cart(request)
+    reservations.release(cart.owners, item_id)
     cart.remove(item_id)
     return redirect('cart_detail')
 
@@ -129,12 +207,16 @@ def cart_update(request):
     action = request.POST.get('action')
 
     item = get_object_or_404(MenuItem, id=item_id, in_stock=True)
-    qty_in_cart = cart.cart.get(str(item_id), {}).get('quantity', 0)
+    qty_in_cart = cart.get_quantity(item_id)
 
     if action == 'inc':
-        if qty_in_cart + 1 <= item.stock:
+        if qty_in_cart and reservations.reserve(cart.owners, item.id, qty_in_cart + 1):
             cart.increment(item_id)
+        elif qty_in_cart:
+            messages.error(request, f"«{item.name}» больше нет в наличии.")
     elif action == 'dec':
+        if qty_in_cart:
+            reservations.reserve(cart.owners, item.id, max(1, qty_in_cart - 1))
         cart.decrement(item_id)
 
     return redirect('cart_detail')
@@ -147,47 +229,65 @@ def order_create(request):
         return redirect('menu')
 
     if request.method == "POST":
+        # Пароль (и дорогой хеш) — только если давно не подтверждали личность
         password = request.POST.get('password')
-        if request.user.check_password(password):
-            try:
-                # Создаём заказ
-                order = Order.objects.create(
-                    client=request.user,
-                    total=cart.get_total_price(),
-                    status='new'
-                )
-                # Позиции
-                for item_data in cart:
-                    OrderItem.objects.create(
-                        order=order,
-                        menu_item=item_data['item'],
-                        quantity=item_data['quantity'],
-                        price_per_unit=item_data['item'].price
-                    )
-                cart.clear()
-                return JsonResponse({
-                    'success': True,
-                    'message': 'Заказ оформлен! Бариста уже готовит ☕',
-                    'redirect_url': '/'
-                })
-            except Exception as e:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Ошибка при создании заказа. Попробуйте позже.'
-                })
-        else:
+        if not checkout.confirm(request, password):
             return JsonResponse({
                 'success': False,
-                'error': 'Неверный пароль. Попробуйте снова.'
+                'password_required': True,
+                'error': 'Неверный пароль. Попробуйте снова.' if password else 'Введите пароль для подтверждения заказа.'
+            })
+        try:
+            # Заказ, позиции и списание остатков — одной транзакцией
+            place_order(request.user, cart, cart.owners)
+            cart.clear()
+            return JsonResponse({
+                'success': True,
+                'message': 'Заказ оформлен! Бариста уже готовит ☕',
+                'redirect_url': '/'
+            })
+        except OutOfStock as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Не хватает на складе: {", ".join(e.names)}. Измените корзину и попробуйте снова.'
+            })
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': 'Ошибка при создании заказа. Попробуйте позже.'
             })
 
-    return render(request, 'order_create.html', {'cart': cart})
+    # Пока клиент на странице оформления, бронь не истекает
+    reservations.extend(cart.owners)
+    return render(request, 'order_create.html', {
+        'cart': cart,
+        'password_required': checkout.password_required(request),
+    })
 
 @login_required
 def profile(request):
-    # Заказы пользователя, новые — сверху
-    orders = Order.objects.filter(client=request.user).order_by('-created_at')
-    return render(request, 'profile.html', {'orders': orders})
+    # Заказы пользователя, новые — сверху, первая страница
+    orders, next_cursor = order_history(request.user)
+    return render(request, 'profile.html', {
+        'orders': orders,
+        # Счётчик ведётся при записи (main/counters.py) — здесь ничего не считаем
+        'orders_count': request.user.order_count,
+        'next_cursor': next_cursor,
+    })
+
+# Подгрузка следующей страницы истории («Показать ещё»)
+HISTORY_PARTIALS = {
+    'profile': 'profile_orders.html',
+    'my_orders': 'my_orders_rows.html',
+}
+
+@login_required
+def orders_more(request):
+    template = HISTORY_PARTIALS.get(request.GET.get('view'), 'profile_orders.html')
+    orders, next_cursor = order_history(request.user, request.GET.get('cursor'))
+    response = render(request, template, {'orders': orders})
+    response['X-Next-Cursor'] = next_cursor or ''
+    return response
 
 # Удаление заказа (только новых)
 @require_POST
@@ -198,3 +298,135 @@ def delete_order(request, order_id):
         order.delete()
         return JsonResponse({'success': True})
     return JsonResponse({'success': False, 'error': 'Можно удалять только новые заказы.'}, status=400)
+
+
+# Стрим статусов заказов (SSE). Работает только через coffee.asgi.application
+# и только при ORDER_EVENTS_STREAM: соединение держит корутина. Под WSGI
+# (runserver) Django дочитывал бы бесконечный асинхронный поток синхронно —
+# запрос не закончился бы никогда и занял бы поток воркера.
+SSE_KEEPALIVE = 15
+
+async def order_events(request):
+    if not settings.ORDER_EVENTS_STREAM or not isinstance(request, ASGIRequest):
+        raise Http404("Стрим заказов выключен")
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+
+    # scope=bar — все заказы для бариста, иначе только свои
+    bar = user.is_staff and request.GET.get('scope') == 'bar'
+    feed = get_feed()
+    subscription = feed.subscribe(user.pk, bar=bar)
+
+    async def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                yield f"event: order\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            feed.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Очередь заказов для бара: активные заказы + живые обновления по SSE
+@staff_member_required
+def barista_queue(request):
+    orders = (
+        Order.objects.filter(status__in=('new', 'pending', 'ready'))
+        .select_related('client')
+        .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('menu_item')))
+        .order_by('created_at')
+    )
+    return render(request, 'barista.html', {'orders': orders})
+
+# Смена статуса отмеченных заказов одной кнопкой: один запрос, один UPDATE
+@require_POST
+@staff_member_required
+def barista_transition(request):
+    status = request.POST.get('status')
+    reason = request.POST.get('reason', '').strip()
+    if status not in order_status.TRANSITIONS:
+        messages.error(request, "Неизвестный статус.")
+        return redirect('barista_queue')
+    if status == 'cancelled' and not reason:
+        messages.error(request, "Укажите причину отмены.")
+        return redirect('barista_queue')
+    order_ids = [int(pk) for pk in request.POST.getlist('orders') if pk.isdigit()]
+    changed = order_status.transition(order_ids, status, user=request.user, reason=reason)
+    skipped = len(order_ids) - len(changed)
+    message = f"«{dict(Order.STATUS_CHOICES)[status]}»: {len(changed)}"
+    if skipped:
+        message += f", пропущено: {skipped}"
+    messages.success(request, message)
+    return redirect('barista_queue')
+
+# Скользящие замеры по view (PerformanceMiddleware), только для персонала
+@staff_member_required
+def performance_dashboard(request):
+    if request.method == 'POST':
+        perf.view_stats.reset()
+        return redirect('performance_dashboard')
+    return render(request, 'admin_performance.html', {
+        'rows': perf.view_stats.snapshot(),
+        'title': 'Производительность',
+    })
+
+
+@staff_member_required
+def sales_dashboard(request):
+    # Отчёт читает только сводки (main/rollups.py), сырые заказы не трогает
+    today = timezone.localdate()
+    try:
+        date_to = date.fromisoformat(request.GET.get('to', ''))
+    except ValueError:
+        date_to = today
+    try:
+        date_from = date.fromisoformat(request.GET.get('from', ''))
+    except ValueError:
+        date_from = date_to - timedelta(days=6)
+
+    report = rollups.report(date_from, date_to)
+    return render(request, 'admin_sales.html', {
+        **report,
+        'date_from': date_from,
+        'date_to': date_to,
+        'total_revenue': sum(row['revenue'] for row in report['days']),
+        'total_units': sum(row['units'] for row in report['days']),
+        'title': 'Продажи',
+    })
+
+
+@staff_member_required
+def orders_export(request):
+    # Без format — форма с фильтрами, с format — потоковая выгрузка
+    fmt = request.GET.get('format')
+    statuses = [code for code in request.GET.getlist('status') if code in dict(Order.STATUS_CHOICES)]
+    dates = {}
+    for name in ('from', 'to'):
+        try:
+            dates[name] = date.fromisoformat(request.GET.get(name, ''))
+        except ValueError:
+            dates[name] = None
+
+    if fmt not in order_export.FORMATS:
+        return render(request, 'admin_orders_export.html', {
+            'statuses': Order.STATUS_CHOICES,
+            'title': 'Выгрузка заказов',
+        })
+
+    queryset = order_export.orders(dates['from'], dates['to'], statuses)
+    response = StreamingHttpResponse(
+        order_export.export_lines(queryset, fmt),
+        content_type='text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson; charset=utf-8',
+    )
+    period = f"{dates['from'] or 'start'}_{dates['to'] or 'now'}"
+    response['Content-Disposition'] = f'attachment; filename="orders_{period}.{fmt}"'
+    return response